@@ -2,7 +2,7 @@ import django
 
 from django.utils.module_loading import autodiscover_modules
 
-from .documents import Document  # noqa
+from .documents import AsyncDocument, Document  # noqa
 from .indices import Index  # noqa
 from .fields import *  # noqa
 
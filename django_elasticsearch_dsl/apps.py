@@ -1,6 +1,7 @@
 from django.apps import AppConfig
 from django.conf import settings
 from django.utils.module_loading import import_string
+from elasticsearch.dsl.async_connections import connections as async_connections
 from elasticsearch.dsl.connections import connections
 
 
@@ -11,7 +12,9 @@ class DEDConfig(AppConfig):
 
     def ready(self):
         self.module.autodiscover()
-        connections.configure(**settings.ELASTICSEARCH_DSL)
+        connections.configure(**self.connections_settings())
+        # The async documents use async clients of the same connections
+        async_connections.configure(**self.connections_settings())
         # Setup the signal processor.
         if not self.signal_processor:
             signal_processor_path = getattr(
@@ -22,6 +25,27 @@ class DEDConfig(AppConfig):
             signal_processor_class = import_string(signal_processor_path)
             self.signal_processor = signal_processor_class(connections)
 
+    @classmethod
+    def connections_settings(cls):
+        """
+        Returns the connections settings, with the serializer set by
+        ELASTICSEARCH_DSL_SERIALIZER added to the connections not
+        configuring one.
+        """
+        connections_settings = settings.ELASTICSEARCH_DSL
+        serializer_path = getattr(settings, 'ELASTICSEARCH_DSL_SERIALIZER', None)
+        if not serializer_path:
+            return connections_settings
+
+        serializer = import_string(serializer_path)()
+        return {
+            alias: (
+                kwargs if 'serializer' in kwargs or 'serializers' in kwargs
+                else dict(kwargs, serializer=serializer)
+            )
+            for alias, kwargs in connections_settings.items()
+        }
+
     @classmethod
     def autosync_enabled(cls):
         return getattr(settings, 'ELASTICSEARCH_DSL_AUTOSYNC', True)
@@ -33,3 +57,54 @@ class DEDConfig(AppConfig):
     @classmethod
     def auto_refresh_enabled(cls):
         return getattr(settings, 'ELASTICSEARCH_DSL_AUTO_REFRESH', True)
+
+    @classmethod
+    def hash_cache_alias(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_HASH_CACHE', None)
+
+    @classmethod
+    def checkpoint_cache_alias(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_CHECKPOINT_CACHE', None)
+
+    @classmethod
+    def checkpoint_file(cls):
+        return getattr(
+            settings, 'ELASTICSEARCH_DSL_CHECKPOINT_FILE',
+            'search_index_checkpoints.json'
+        )
+
+    @classmethod
+    def batch_size(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_BATCH_SIZE', 500)
+
+    @classmethod
+    def batch_interval(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_BATCH_INTERVAL', 0.2)
+
+    @classmethod
+    def batch_queue_size(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_BATCH_QUEUE_SIZE', 10000)
+
+    @classmethod
+    def batch_queue_full(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_BATCH_QUEUE_FULL', 'block')
+
+    @classmethod
+    def celery_lock_cache_alias(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_CELERY_LOCK_CACHE', None)
+
+    @classmethod
+    def celery_lock_timeout(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_CELERY_LOCK_TIMEOUT', 300)
+
+    @classmethod
+    def search_cache_alias(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_SEARCH_CACHE', None)
+
+    @classmethod
+    def search_cache_timeout(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_SEARCH_CACHE_TIMEOUT', 60)
+
+    @classmethod
+    def search_cache_refresh_delay(cls):
+        return getattr(settings, 'ELASTICSEARCH_DSL_SEARCH_CACHE_REFRESH_DELAY', 1)
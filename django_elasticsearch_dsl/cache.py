@@ -0,0 +1,234 @@
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from threading import Lock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from .apps import DEDConfig
+
+
+class LocalCache(object):
+    """
+    Thread safe, in process, least recently used cache implementing the
+    part of the Django cache API used by django-elasticsearch-dsl. A
+    ``timeout`` of None keeps the values until they are evicted.
+    """
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def _get(self, key):
+        # Called with the lock held, returns a (found, value) tuple
+        try:
+            value, expires = self._data[key]
+        except KeyError:
+            return False, None
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._get(key)
+            return value if found else default
+
+    def get_many(self, keys):
+        with self._lock:
+            found = {}
+            for key in keys:
+                exists, value = self._get(key)
+                if exists:
+                    found[key] = value
+            return found
+
+    def set(self, key, value, timeout=None):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, data, timeout=None):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            for key, value in data.items():
+                self._data[key] = (value, expires)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    # The async API of the Django caches, the data is in memory
+
+    async def aget(self, key, default=None):
+        return self.get(key, default)
+
+    async def aget_many(self, keys):
+        return self.get_many(keys)
+
+    async def aset(self, key, value, timeout=None):
+        self.set(key, value, timeout)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_hash_cache = LocalCache()
+
+
+def get_hash_cache():
+    """
+    Return the cache storing the hashes of the indexed documents: the Django
+    cache named by ELASTICSEARCH_DSL_HASH_CACHE, or a cache local to the
+    process.
+    """
+    alias = DEDConfig.hash_cache_alias()
+    if alias:
+        return caches[alias]
+    return local_hash_cache
+
+
+def check_skip_unchanged():
+    """
+    Raise ImproperlyConfigured unless the hashes are stored in the cache named
+    by ELASTICSEARCH_DSL_HASH_CACHE. With the cache local to each process, a
+    process would skip a document whose hash it stored even though another
+    process indexed another version of it since.
+    """
+    if not DEDConfig.hash_cache_alias():
+        raise ImproperlyConfigured(
+            "Skipping the unchanged documents needs a cache shared by the "
+            "processes, set ELASTICSEARCH_DSL_HASH_CACHE."
+        )
+
+
+def document_hash(source):
+    """
+    Return a stable hash of the ``_source`` of a document.
+    """
+    data = json.dumps(source, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _generation_key(index_name):
+    return 'ded:generation:{}'.format(index_name)
+
+
+def get_hash_key_prefix(cache, index_name):
+    """
+    Return the prefix of the hash keys of the documents of ``index_name``.
+    It changes each time the index is reset, see reset_index_hashes().
+    """
+    generation = cache.get(_generation_key(index_name), '0')
+    return 'ded:hash:{}:{}:'.format(index_name, generation)
+
+
+def reset_index_hashes(index_name):
+    """
+    Forget the hashes of the documents of ``index_name``, to call when the
+    index is created or deleted.
+    """
+    get_hash_cache().set(_generation_key(index_name), uuid.uuid4().hex, None)
+
+
+local_search_cache = LocalCache(max_size=1000)
+
+
+def get_search_cache():
+    """
+    Return the cache storing the search responses: the Django cache named by
+    ELASTICSEARCH_DSL_SEARCH_CACHE, or a cache local to the process.
+    """
+    alias = DEDConfig.search_cache_alias()
+    if alias:
+        return caches[alias]
+    return local_search_cache
+
+
+# Name invalidated along with any index, for the searches of wildcards and
+# aliases
+ALL_INDICES = '*'
+
+
+def _search_generation_key(index_name):
+    return 'ded:search-generation:{}'.format(index_name)
+
+
+def _search_pending_key(index_name):
+    return 'ded:search-pending:{}'.format(index_name)
+
+
+def _get_search_keys(index_names):
+    return (
+        [_search_generation_key(name) for name in index_names],
+        [_search_pending_key(name) for name in index_names],
+    )
+
+
+def _build_search_cache_key(index_names, data, generation_keys, pending_keys,
+                            generations):
+    now = time.time()
+    if any(generations.get(key, 0) > now for key in pending_keys):
+        return None
+
+    key_data = json.dumps(
+        [index_names, data, [generations.get(key, '0') for key in generation_keys]],
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    return 'ded:search:{}'.format(
+        hashlib.blake2b(key_data.encode('utf-8'), digest_size=16).hexdigest()
+    )
+
+
+def get_search_cache_key(cache, index_names, data):
+    """
+    Return the key of the cached response of a search of ``index_names``
+    described by ``data``. It changes each time a document of one of the
+    indices is indexed, see invalidate_search_cache(); ALL_INDICES changes
+    each time any document is. None is returned while changes of the indices
+    may not be searchable yet, the response must not be cached.
+    """
+    generation_keys, pending_keys = _get_search_keys(index_names)
+    generations = cache.get_many(generation_keys + pending_keys)
+    return _build_search_cache_key(
+        index_names, data, generation_keys, pending_keys, generations
+    )
+
+
+async def aget_search_cache_key(cache, index_names, data):
+    """
+    Async counterpart of get_search_cache_key().
+    """
+    generation_keys, pending_keys = _get_search_keys(index_names)
+    generations = await cache.aget_many(generation_keys + pending_keys)
+    return _build_search_cache_key(
+        index_names, data, generation_keys, pending_keys, generations
+    )
+
+
+def invalidate_search_cache(index_names, delay=None):
+    """
+    Forget the cached responses of the searches of ``index_names``, and of
+    ALL_INDICES, to call when their documents change. When the changes are
+    only searchable after the next refresh of the indices, ``delay`` is the
+    number of seconds during which the responses of these searches are not
+    cached.
+    """
+    index_names = list(index_names) + [ALL_INDICES]
+    cache = get_search_cache()
+    cache.set_many({
+        _search_generation_key(name): uuid.uuid4().hex for name in index_names
+    }, None)
+    if delay:
+        until = time.time() + delay
+        cache.set_many({
+            _search_pending_key(name): until for name in index_names
+        }, delay)
@@ -0,0 +1,76 @@
+import json
+import os
+from threading import Lock
+
+from django.core.cache import caches
+
+from .apps import DEDConfig
+
+
+class FileCheckpointStore(object):
+    """
+    Store the populate checkpoints in a JSON file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+
+    def _read(self):
+        try:
+            with open(self.path) as checkpoints_file:
+                return json.load(checkpoints_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, checkpoints):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as checkpoints_file:
+            json.dump(checkpoints, checkpoints_file, default=str)
+        # Do not leave a truncated file if the process is killed
+        os.replace(tmp_path, self.path)
+
+    def get(self, name):
+        return self._read().get(name)
+
+    def set(self, name, checkpoint):
+        with self._lock:
+            checkpoints = self._read()
+            checkpoints[name] = checkpoint
+            self._write(checkpoints)
+
+    def delete(self, name):
+        with self._lock:
+            checkpoints = self._read()
+            if checkpoints.pop(name, None) is not None:
+                self._write(checkpoints)
+
+
+class CacheCheckpointStore(object):
+    """
+    Store the populate checkpoints in a Django cache.
+    """
+    key_prefix = 'ded:checkpoint:'
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def get(self, name):
+        return self.cache.get(self.key_prefix + name)
+
+    def set(self, name, checkpoint):
+        self.cache.set(self.key_prefix + name, checkpoint, None)
+
+    def delete(self, name):
+        self.cache.delete(self.key_prefix + name)
+
+
+def get_checkpoint_store():
+    """
+    Return the store of the populate checkpoints: the Django cache named by
+    ELASTICSEARCH_DSL_CHECKPOINT_CACHE if set, else the
+    ELASTICSEARCH_DSL_CHECKPOINT_FILE file.
+    """
+    alias = DEDConfig.checkpoint_cache_alias()
+    if alias:
+        return CacheCheckpointStore(caches[alias])
+    return FileCheckpointStore(DEDConfig.checkpoint_file())
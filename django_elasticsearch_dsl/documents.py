@@ -1,15 +1,32 @@
 from __future__ import unicode_literals
 
-from collections import deque
 from fnmatch import fnmatch
 from functools import partial
+from itertools import islice
 
+from asgiref.sync import sync_to_async
 from django import VERSION as DJANGO_VERSION
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.db.models import Prefetch, prefetch_related_objects
+from elasticsearch.dsl import AsyncDocument as DSLAsyncDocument
 from elasticsearch.dsl import Document as DSLDocument
-from elasticsearch.helpers import bulk, parallel_bulk
+from elasticsearch.dsl.connections import connections
+from elasticsearch.helpers import (
+    BulkIndexError,
+    async_bulk,
+    async_streaming_bulk,
+    bulk,
+    parallel_bulk,
+)
 from six import iteritems
 
+from .cache import (
+    check_skip_unchanged,
+    document_hash,
+    get_hash_cache,
+    get_hash_key_prefix,
+)
 from .exceptions import ModelFieldNotMappedError
 from .fields import (
     BooleanField,
@@ -17,14 +34,16 @@ from .fields import (
     DEDField,
     DoubleField,
     FileField,
+    FileFieldMixin,
     IntegerField,
     KeywordField,
     LongField,
+    ObjectField,
     ShortField,
     TextField,
     TimeField,
 )
-from .search import Search
+from .search import AsyncSearch, Search
 from .signals import post_index
 
 model_field_class_to_field_class = {
@@ -56,14 +75,233 @@ model_field_class_to_field_class = {
 if DJANGO_VERSION >= (3.1,):
     model_field_class_to_field_class[models.PositiveBigIntegerField] = LongField
 
+# The get_value_from_instance implementations that can be replaced by a
+# values converter, see DEDField.get_values_converter
+values_compatible_getters = (
+    DEDField.get_value_from_instance,
+    FileFieldMixin.get_value_from_instance,
+    TimeField.get_value_from_instance,
+)
+
+# Django refuses to iterate over a queryset with prefetch_related lookups
+# without an explicit chunk_size, use the same default as QuerySet.iterator().
+DEFAULT_CHUNK_SIZE = 2000
+# Number of failed items kept by DocType.parallel_bulk()
+DEFAULT_MAX_ERRORS = 1000
+
+
+def _get_relation(model, name):
+    """
+    Return the relation reached through the attribute ``name`` of ``model``,
+    or None if ``name`` is not a relation that can be loaded in advance.
+    """
+    for rel in model._meta.related_objects:
+        if rel.get_accessor_name() == name:
+            return rel
+
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+    if field.is_relation and not field.auto_created and field.related_model:
+        return field
+    return None
+
+
+def _get_new_prefetch_lookups(queryset, lookups):
+    """
+    Return the ``lookups`` which are not already prefetched by ``queryset``.
+    A lookup is left out when the queryset prefetches its path, or a path
+    through it: Django refuses a ``Prefetch`` with a queryset for a path it
+    has already seen.
+    """
+    seen = [
+        lookup if isinstance(lookup, str) else lookup.prefetch_to
+        for lookup in queryset._prefetch_related_lookups
+    ]
+    new_lookups = []
+    for lookup in lookups:
+        path = lookup if isinstance(lookup, str) else lookup.prefetch_to
+        if not any(
+            seen_path == path or seen_path.startswith(path + '__')
+            for seen_path in seen
+        ):
+            new_lookups.append(lookup)
+    return new_lookups
+
+
+def _with_related_preparer(method_name):
+    def prepare(doc, instance, related_to_ignore):
+        return getattr(doc, method_name)(
+            instance, related_to_ignore=related_to_ignore
+        )
+    return prepare
+
+
+def _method_preparer(method_name):
+    def prepare(doc, instance, related_to_ignore):
+        return getattr(doc, method_name)(instance)
+    return prepare
+
+
+def _batch_preparer(name):
+    def prepare(doc, instance, related_to_ignore):
+        values = doc._chunk_values.get(name)
+        if values is not None:
+            return values[id(instance)]
+
+        # Not prepared as part of a chunk, fall back to the per instance way
+        prep_func = getattr(doc, 'prepare_%s' % name, None)
+        if prep_func:
+            return prep_func(instance)
+        return list(getattr(doc, 'prepare_%s_batch' % name)([instance]))[0]
+    return prepare
+
+
+def _field_preparer(field):
+    def prepare(doc, instance, related_to_ignore):
+        return field.get_value_from_instance(
+            instance, field_value_to_ignore=related_to_ignore
+        )
+    return prepare
+
+
+def _converted_preparer(prepare, convert):
+    if convert is None:
+        return prepare
+
+    def prepare_converted(doc, instance, related_to_ignore):
+        return convert(prepare(doc, instance, related_to_ignore))
+    return prepare_converted
+
+
+def _compose(outer, inner):
+    if inner is None:
+        return outer
+
+    def convert(value):
+        return outer(inner(value))
+    return convert
+
+
+class _BulkResults(object):
+    """
+    Aggregate the ``(ok, item)`` results of the streaming bulk helpers into
+    the response of bulk(), keeping at most ``max_errors`` failed items or
+    passing them to ``error_callback``.
+    """
+    def __init__(self, error_callback=None, max_errors=DEFAULT_MAX_ERRORS,
+                 stats_only=False):
+        self.error_callback = error_callback
+        self.max_errors = max_errors
+        self.stats_only = stats_only
+        self.success = 0
+        self.failed = 0
+        self.errors = []
+
+    def add(self, ok, item):
+        if ok:
+            self.success += 1
+            return
+
+        self.failed += 1
+        if self.error_callback is not None:
+            self.error_callback(item)
+        elif not self.stats_only and len(self.errors) < self.max_errors:
+            self.errors.append(item)
+
+    @property
+    def response(self):
+        return self.success, self.failed if self.stats_only else self.errors
+
 
-class DocType(DSLDocument):
-    _prepared_fields = []
+async def _aiterate(objects):
+    if hasattr(objects, '__aiter__'):
+        async for object_instance in objects:
+            yield object_instance
+    else:
+        for object_instance in objects:
+            yield object_instance
+
+
+class _RelatedLookups(object):
+    """
+    Tree of the relations to load along with the instances of ``model``.
+    """
+    def __init__(self, model):
+        self.model = model
+        self.select_related = set()
+        self.prefetch_related = {}
+
+    def add_path(self, path):
+        """
+        Follow the attribute ``path`` through the model relations. The
+        forward relations are joined with select_related until a reverse
+        or many to many relation is crossed, which is prefetched and the
+        rest of the path is followed from the related model.
+        """
+        model = self.model
+        joined = []
+        for i, name in enumerate(path):
+            relation = _get_relation(model, name)
+            if relation is None:
+                break
+
+            if relation.many_to_many or relation.one_to_many:
+                lookup = '__'.join(joined + [name])
+                if lookup not in self.prefetch_related:
+                    self.prefetch_related[lookup] = _RelatedLookups(
+                        relation.related_model
+                    )
+                self.prefetch_related[lookup].add_path(path[i + 1:])
+                break
+
+            joined.append(name)
+            model = relation.related_model
+
+        if joined:
+            self.select_related.add('__'.join(joined))
+
+    def compile(self):
+        """
+        Return the select_related lookups and the prefetch_related lookups
+        (a ``Prefetch`` when the prefetched model has relations to load
+        itself).
+        """
+        prefetch_related = []
+        for lookup, related in sorted(self.prefetch_related.items()):
+            select_related, nested_prefetch = related.compile()
+            if not select_related and not nested_prefetch:
+                prefetch_related.append(lookup)
+                continue
+
+            queryset = related.model._default_manager.all()
+            if select_related:
+                queryset = queryset.select_related(*select_related)
+            if nested_prefetch:
+                queryset = queryset.prefetch_related(*nested_prefetch)
+            prefetch_related.append(Prefetch(lookup, queryset=queryset))
+
+        return sorted(self.select_related), prefetch_related
+
+
+class DEDDocumentMixin(object):
+    """
+    The django model related part of the documents, shared by the
+    synchronous and the async documents.
+    """
+    # Preparers shared by the instances of the document class, see
+    # _get_field_preparers()
+    _field_preparers = None
+    _values_fields = None
+    # Context returned by prepare_chunk() for the chunk being prepared
+    chunk_context = None
+    _chunk_values = {}
 
     def __init__(self, related_instance_to_ignore=None, **kwargs):
-        super(DocType, self).__init__(**kwargs)
+        super(DEDDocumentMixin, self).__init__(**kwargs)
         self._related_instance_to_ignore = related_instance_to_ignore
-        self._prepared_fields = self.init_prepare()
 
     def __eq__(self, other):
         return id(self) == id(other)
@@ -98,23 +336,129 @@ class DocType(DSLDocument):
         """
         return self.django.model._default_manager.all()
 
-    def get_indexing_queryset(self):
+    def _get_indexing_base_queryset(self, pk_range=None):
+        qs = self.get_queryset()
+        if pk_range is not None:
+            first_pk, end_pk = pk_range
+            qs = qs.filter(pk__gte=first_pk)
+            if end_pk is not None:
+                qs = qs.filter(pk__lt=end_pk)
+
+        if self._values_fields is not None:
+            # Read the rows as tuples, without building model instances
+            qs = qs.values_list('pk', *[
+                column for name, column, convert in self._values_fields
+            ])
+        else:
+            if self.django.select_related and qs.query.select_related is not True:
+                qs = qs.select_related(*self.django.select_related)
+            if self.django.prefetch_related:
+                qs = qs.prefetch_related(*_get_new_prefetch_lookups(
+                    qs, self.django.prefetch_related
+                ))
+        return qs
+
+    def get_indexing_queryset(self, pk_range=None):
         """
         Build queryset (iterator) for use by indexing.
+
+        ``pk_range`` is an optional ``(first_pk, end_pk)`` tuple restricting
+        the objects to the ones whose pk is in ``[first_pk, end_pk)``, without
+        upper bound if end_pk is None.
         """
-        qs = self.get_queryset()
+        if self.django.keyset_pagination:
+            return (
+                object_instance
+                for last_pk, chunk in self.get_indexing_chunks(pk_range=pk_range)
+                for object_instance in chunk
+            )
+
+        qs = self._get_indexing_base_queryset(pk_range)
         kwargs = {}
         if DJANGO_VERSION >= (2,) and self.django.queryset_pagination:
             kwargs = {'chunk_size': self.django.queryset_pagination}
+        elif self.django.prefetch_related:
+            kwargs = {'chunk_size': DEFAULT_CHUNK_SIZE}
         return qs.iterator(**kwargs)
 
-    def init_prepare(self):
+    def get_indexing_chunks(self, pk_range=None, after_pk=None):
+        """
+        Yield the objects to index by chunks of queryset_pagination size (or
+        DEFAULT_CHUNK_SIZE), as ``(last_pk, objects)`` tuples.
+
+        The chunks are read in pk order by short queries selecting the objects
+        following the last pk of the previous chunk (keyset pagination), or
+        ``after_pk`` for the first one.
+        """
+        qs = self._get_indexing_base_queryset(pk_range).order_by('pk')
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        last_pk = after_pk
+        while True:
+            chunk_qs = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+            chunk = list(chunk_qs[:chunk_size])
+            if not chunk:
+                return
+
+            last = chunk[-1]
+            last_pk = last[0] if self._values_fields is not None else last.pk
+            yield last_pk, chunk
+            if len(chunk) < chunk_size:
+                return
+
+    @classmethod
+    def get_related_lookups(cls):
+        """
+        Returns the select_related and prefetch_related lookups needed to
+        index the document fields without a query per instance. They are
+        derived from the attribute paths of the fields (and of the
+        ObjectField/NestedField properties), fields computed by a
+        prepare_field method are left out.
+
+        You may want to override this if the relations used by your
+        document can not be guessed from the fields.
         """
-        Initialise the data model preparers once here. Extracts the preparers
-        from the model and generate a list of callables to avoid doing that
-        work on every object instance over.
+        lookups = _RelatedLookups(cls.django.model)
+        fields = cls._doc_type.mapping.properties.properties.to_dict()
+        stack = [(fields, cls, [])]
+        while stack:
+            properties, doc_class, prefix = stack.pop()
+            for name, field in iteritems(properties):
+                if not isinstance(field, DEDField):
+                    continue
+                if (getattr(doc_class, 'prepare_%s' % name, None) or
+                        getattr(doc_class, 'prepare_%s_with_related' % name, None)):
+                    continue
+
+                path = prefix + (field._path or [name])
+                lookups.add_path(path)
+                if isinstance(field, ObjectField):
+                    stack.append((
+                        field._doc_class._doc_type.mapping.properties._params.get(
+                            'properties', {}),
+                        field._doc_class,
+                        path
+                    ))
+
+        return lookups.compile()
+
+    @classmethod
+    def _get_field_preparers(cls):
+        """
+        Return the (name, field, preparer) tuples of the document class,
+        building them on first use. The preparers are shared by all the
+        instances of the document: they take the document instance, the model
+        instance and the related instance to ignore as arguments.
         """
-        index_fields = getattr(self, '_fields', {})
+        if cls.__dict__.get('_field_preparers') is None:
+            cls._field_preparers = cls._build_field_preparers()
+        return cls._field_preparers
+
+    @classmethod
+    def _build_field_preparers(cls):
+        index_fields = getattr(cls, '_fields', None)
+        if index_fields is None:
+            # Not registered, read the fields from the mapping
+            index_fields = cls._doc_type.mapping.properties.properties.to_dict()
         fields = []
         for name, field in iteritems(index_fields):
             if not isinstance(field, DEDField):
@@ -123,31 +467,175 @@ class DocType(DSLDocument):
             if not field._path:
                 field._path = [name]
 
-            prep_func = getattr(self, 'prepare_%s_with_related' % name, None)
-            if prep_func:
-                fn = partial(prep_func, related_to_ignore=self._related_instance_to_ignore)
+            if getattr(cls, 'prepare_%s_with_related' % name, None):
+                fn = _with_related_preparer('prepare_%s_with_related' % name)
+            elif getattr(cls, 'prepare_%s_batch' % name, None):
+                fn = _batch_preparer(name)
+            elif getattr(cls, 'prepare_%s' % name, None):
+                fn = _method_preparer('prepare_%s' % name)
             else:
-                prep_func = getattr(self, 'prepare_%s' % name, None)
-                if prep_func:
-                    fn = prep_func
-                else:
-                    fn = partial(field.get_value_from_instance, field_value_to_ignore=self._related_instance_to_ignore)
+                fn = _field_preparer(field)
 
+            fn = _converted_preparer(fn, field.get_json_converter())
             fields.append((name, field, fn))
 
         return fields
 
+    def init_prepare(self):
+        """
+        Initialise the data model preparers of this document instance, the
+        callables of the returned (name, field, preparer) tuples take the
+        model instance as argument. They are bound from the preparers shared
+        by the document class.
+        """
+        related_to_ignore = self._related_instance_to_ignore
+        return [
+            (name, field, partial(fn, self, related_to_ignore=related_to_ignore))
+            for name, field, fn in self._get_field_preparers()
+        ]
+
+    @property
+    def _prepared_fields(self):
+        # Only built for the subclasses using the instance preparers, prepare()
+        # uses the preparers of the class otherwise
+        if '_bound_prepared_fields' not in self.__dict__:
+            self.__dict__['_bound_prepared_fields'] = self.init_prepare()
+        return self.__dict__['_bound_prepared_fields']
+
+    @_prepared_fields.setter
+    def _prepared_fields(self, value):
+        self.__dict__['_bound_prepared_fields'] = value
+
+    def _uses_class_preparers(self):
+        return (
+            '_bound_prepared_fields' not in self.__dict__ and
+            type(self).init_prepare is DEDDocumentMixin.init_prepare
+        )
+
+    @classmethod
+    def init_prepare_values(cls):
+        """
+        Build the (name, column, convert) tuples used to turn the rows of
+        ``values_list('pk', *columns)`` into documents. Returns None if the
+        document can't be built from the model columns only: a field is not
+        a plain model column or uses a prepare method, or the document
+        customizes the way the model instances are indexed.
+        """
+        for method in ('prepare', 'init_prepare', '_prepare_action',
+                       'should_index_object', 'prepare_chunk'):
+            if getattr(cls, method, None) is not getattr(DEDDocumentMixin, method, None):
+                return None
+        if getattr(cls.generate_id, '__func__', None) is not DEDDocumentMixin.generate_id.__func__:
+            return None
+
+        model = cls.django.model
+        fields = []
+        for name, field in iteritems(getattr(cls, '_fields', {})):
+            if not isinstance(field, DEDField):
+                continue
+
+            if (getattr(cls, 'prepare_%s' % name, None) or
+                    getattr(cls, 'prepare_%s_with_related' % name, None) or
+                    getattr(cls, 'prepare_%s_batch' % name, None)):
+                return None
+            if ('get_value_from_instance' in field.__dict__ or
+                    type(field).get_value_from_instance not in values_compatible_getters):
+                return None
+
+            path = field._path or [name]
+            if len(path) != 1:
+                return None
+            try:
+                model_field = model._meta.get_field(path[0])
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.is_relation:
+                return None
+
+            convert = field.get_values_converter(model_field)
+            if field.json_converter is not None:
+                convert = _compose(field.get_json_converter(), convert)
+            fields.append((name, path[0], convert))
+
+        return fields
+
+    @classmethod
+    def get_partial_fields(cls, update_fields):
+        """
+        Return the names of the document fields to prepare again when the
+        ``update_fields`` model fields of an instance are saved, or None if
+        the whole document must be prepared again.
+
+        The fields computed by a prepare method, or from an attribute which is
+        not a model field, are always prepared again as what they depend on is
+        not known.
+        """
+        if cls.prepare is not DEDDocumentMixin.prepare:
+            return None
+
+        opts = cls.django.model._meta
+        saved = set()
+        for name in update_fields:
+            try:
+                model_field = opts.get_field(name)
+            except FieldDoesNotExist:
+                saved.add(name)
+            else:
+                saved.update((model_field.name, getattr(model_field, 'attname', name)))
+
+        fields = []
+        for name, field, prep_func in cls._get_field_preparers():
+            has_prepare_method = any(
+                getattr(cls, method_name % name, None)
+                for method_name in (
+                    'prepare_%s', 'prepare_%s_batch', 'prepare_%s_with_related'
+                )
+            )
+            root = field._path[0]
+            if has_prepare_method or root in saved:
+                fields.append(name)
+                continue
+
+            try:
+                opts.get_field(root)
+            except FieldDoesNotExist:
+                fields.append(name)
+
+        return fields
+
     def prepare(self, instance):
         """
         Take a model instance, and turn it into a dict that can be serialized
         based on the fields defined on this DocType subclass
         """
+        if not self._uses_class_preparers():
+            return {
+                name: prep_func(instance)
+                for name, field, prep_func in self._prepared_fields
+            }
+
+        related_to_ignore = self._related_instance_to_ignore
         data = {
-            name: prep_func(instance)
-            for name, field, prep_func in self._prepared_fields
+            name: prep_func(self, instance, related_to_ignore)
+            for name, field, prep_func in self._get_field_preparers()
         }
         return data
 
+    def _prepare_partial(self, instance, fields):
+        if not self._uses_class_preparers():
+            return {
+                name: prep_func(instance)
+                for name, field, prep_func in self._prepared_fields
+                if name in fields
+            }
+
+        related_to_ignore = self._related_instance_to_ignore
+        return {
+            name: prep_func(self, instance, related_to_ignore)
+            for name, field, prep_func in self._get_field_preparers()
+            if name in fields
+        }
+
     @classmethod
     def get_model_field_class_to_field_class(cls):
         """
@@ -175,27 +663,55 @@ class DocType(DSLDocument):
                 "to an Elasticsearch field!".format(field_name)
             )
 
-    def bulk(self, actions, **kwargs):
-        response = bulk(client=self._get_connection(), actions=actions, **kwargs)
+    def _get_sync_connection(self):
+        return self._get_connection()
+
+    def bulk(self, actions, error_callback=None, **kwargs):
+        response = bulk(client=self._get_sync_connection(), actions=actions, **kwargs)
+        if error_callback is not None and not kwargs.get('stats_only'):
+            for item in response[1]:
+                error_callback(item)
         # send post index signal
         post_index.send(
             sender=self.__class__,
             instance=self,
             actions=actions,
-            response=response
+            response=response,
+            refresh=kwargs.get('refresh')
         )
         return response
 
-    def parallel_bulk(self, actions, **kwargs):
+    def parallel_bulk(self, actions, error_callback=None,
+                      max_errors=DEFAULT_MAX_ERRORS, **kwargs):
+        """
+        Send the actions with the parallel_bulk() helper, returning the same
+        response as bulk(): the number of successful actions and the list of
+        the failed ones (their number if stats_only is true).
+
+        The results are aggregated as they come: at most ``max_errors``
+        failed items are kept, or they are all passed to ``error_callback``
+        instead if it is set.
+        """
         if self.django.queryset_pagination and 'chunk_size' not in kwargs:
             kwargs['chunk_size'] = self.django.queryset_pagination
-        bulk_actions = parallel_bulk(client=self._get_connection(), actions=actions, **kwargs)
-        # As the `parallel_bulk` is lazy, we need to get it into `deque` to run it instantly
-        # See https://discuss.elastic.co/t/helpers-parallel-bulk-in-python-not-working/39498/2
-        deque(bulk_actions, maxlen=0)
-        # Fake return value to emulate bulk() since we don't have a result yet,
-        # the result is currently not used upstream anyway.
-        return (1, [])
+        results = _BulkResults(
+            error_callback, max_errors, kwargs.pop('stats_only', False)
+        )
+        # parallel_bulk() is lazy, its results must be consumed to run it
+        for ok, item in parallel_bulk(
+            client=self._get_sync_connection(), actions=actions, **kwargs
+        ):
+            results.add(ok, item)
+
+        response = results.response
+        post_index.send(
+            sender=self.__class__,
+            instance=self,
+            actions=actions,
+            response=response,
+            refresh=kwargs.get('refresh')
+        )
+        return response
 
     @classmethod
     def generate_id(cls, object_instance):
@@ -206,7 +722,16 @@ class DocType(DSLDocument):
         """
         return object_instance.pk
 
-    def _prepare_action(self, object_instance, action):
+    def _prepare_action(self, object_instance, action, fields=None):
+        if fields is not None:
+            # Partial update of the given fields
+            return {
+                '_op_type': 'update',
+                '_index': self._index._name,
+                '_id': self.generate_id(object_instance),
+                'doc': self._prepare_partial(object_instance, fields),
+            }
+
         return {
             '_op_type': action,
             '_index': self._index._name,
@@ -216,10 +741,93 @@ class DocType(DSLDocument):
             ),
         }
 
-    def _get_actions(self, object_list, action):
+    def _get_actions(self, object_list, action, fields=None):
+        batch_fields = [
+            name for name, field, prep_func in self._get_field_preparers()
+            if getattr(self, 'prepare_%s_batch' % name, None)
+            and (fields is None or name in fields)
+        ]
+        if action != 'delete' and (batch_fields or hasattr(self, 'prepare_chunk')):
+            for action_data in self._get_chunked_actions(
+                object_list, action, batch_fields, fields
+            ):
+                yield action_data
+            return
+
+        values_fields = self._values_fields
         for object_instance in object_list:
-            if action == 'delete' or self.should_index_object(object_instance):
-                yield self._prepare_action(object_instance, action)
+            if values_fields is not None and isinstance(object_instance, tuple):
+                # A row of the values indexing queryset
+                yield self._prepare_values_action(object_instance, action)
+            elif action == 'delete' or self.should_index_object(object_instance):
+                yield self._prepare_action(object_instance, action, fields)
+
+    def _prepare_values_action(self, row, action):
+        source = None
+        if action != 'delete':
+            source = {}
+            for index, (name, column, convert) in enumerate(self._values_fields, 1):
+                value = row[index]
+                source[name] = value if convert is None else convert(value)
+
+        return {
+            '_op_type': action,
+            '_index': self._index._name,
+            '_id': row[0],
+            '_source': source,
+        }
+
+    def _get_chunked_actions(self, object_list, action, batch_fields, fields=None):
+        """
+        Prepare the objects by chunks of queryset_pagination size, so the
+        prepare_chunk() and prepare_<field>_batch() hooks can compute their
+        data for the whole chunk at once.
+        """
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        iterator = iter(object_list)
+        try:
+            while True:
+                objects = list(islice(iterator, chunk_size))
+                if not objects:
+                    break
+
+                chunk = [
+                    object_instance for object_instance in objects
+                    if self.should_index_object(object_instance)
+                ]
+                if not chunk:
+                    continue
+
+                self._prepare_chunk(chunk, batch_fields)
+                for object_instance in chunk:
+                    yield self._prepare_action(object_instance, action, fields)
+        finally:
+            self._set_chunk(None, {})
+
+    def _prepare_chunk(self, chunk, batch_fields):
+        context = None
+        if hasattr(self, 'prepare_chunk'):
+            context = self.prepare_chunk(chunk)
+
+        # The context must be available to the prepare_<field>_batch methods
+        self._set_chunk(context, {})
+        chunk_values = {}
+        for name in batch_fields:
+            values = list(getattr(self, 'prepare_%s_batch' % name)(chunk))
+            if len(values) != len(chunk):
+                raise ValueError(
+                    "prepare_{}_batch returned {} values for {} "
+                    "objects".format(name, len(values), len(chunk))
+                )
+            chunk_values[name] = dict(zip(map(id, chunk), values))
+
+        self._set_chunk(context, chunk_values)
+
+    def _set_chunk(self, context, values):
+        # These are not document fields, do not store them in the document
+        # data as DSLDocument.__setattr__ would.
+        object.__setattr__(self, 'chunk_context', context)
+        object.__setattr__(self, '_chunk_values', values)
 
     def get_actions(self, object_list, action):
         """
@@ -242,9 +850,67 @@ class DocType(DSLDocument):
         """
         return True
 
-    def update(self, thing, refresh=None, action='index', parallel=False, **kwargs):
+    def _filter_unchanged_actions(self, actions, skip, hashes, stale_keys):
         """
-        Update each document in ES for a model, iterable of models or queryset
+        Hash the source of the index actions, dropping those whose hash is
+        the one stored when the document was last indexed if ``skip`` is
+        true. The hashes to store once the actions are sent are collected in
+        ``hashes`` and the keys to forget in ``stale_keys``.
+        """
+        cache = get_hash_cache()
+        prefix = get_hash_key_prefix(cache, self._index._name)
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        actions = iter(actions)
+        while True:
+            chunk = list(islice(actions, chunk_size))
+            if not chunk:
+                break
+
+            stored = {}
+            if skip:
+                stored = cache.get_many([
+                    prefix + str(action_data['_id']) for action_data in chunk
+                ])
+
+            for action_data in chunk:
+                key = prefix + str(action_data['_id'])
+                if action_data['_op_type'] == 'index':
+                    source_hash = document_hash(action_data['_source'])
+                    if stored.get(key) == source_hash:
+                        continue
+                    hashes[str(action_data['_id'])] = (key, source_hash)
+                else:
+                    stale_keys.append(key)
+                yield action_data
+
+    def _store_hashes(self, response, hashes, stale_keys):
+        errors = response[1] if response else []
+        if isinstance(errors, int):
+            # stats_only only gives the number of failed actions
+            if errors:
+                hashes = {}
+        else:
+            for error in errors:
+                for item in error.values():
+                    hashes.pop(str(item.get('_id')), None)
+
+        cache = get_hash_cache()
+        if hashes:
+            cache.set_many(dict(hashes.values()), None)
+        if stale_keys:
+            cache.delete_many(stale_keys)
+
+    def _forget_hashes(self, hashes, stale_keys):
+        # Some of the actions may have been sent before the bulk failed
+        get_hash_cache().delete_many(
+            [key for key, source_hash in hashes.values()] + stale_keys
+        )
+
+    def _init_update(self, thing, refresh, action, update_fields, kwargs):
+        """
+        Return the objects to update and the fields of their partial update
+        (None for a full one), and set the refresh argument of the bulk in
+        ``kwargs``.
         """
         if refresh is not None:
             kwargs['refresh'] = refresh
@@ -256,11 +922,385 @@ class DocType(DSLDocument):
         else:
             object_list = thing
 
-        return self._bulk(
-            self._get_actions(object_list, action),
-            parallel=parallel,
-            **kwargs
+        fields = None
+        if update_fields is not None and action == 'index':
+            fields = self.get_partial_fields(update_fields)
+        return object_list, fields
+
+    def update(self, thing, refresh=None, action='index', parallel=False,
+               skip_unchanged=None, update_fields=None, **kwargs):
+        """
+        Update each document in ES for a model, iterable of models or queryset
+
+        The documents whose content did not change since they were last
+        indexed are skipped if ``skip_unchanged`` is true, or if it is None
+        and the Django class enables skip_unchanged.
+
+        If ``update_fields`` (model field names, as given to Model.save()) is
+        set, the documents are partially updated with the document fields
+        depending on these model fields only.
+        """
+        object_list, fields = self._init_update(
+            thing, refresh, action, update_fields, kwargs
+        )
+        if fields is not None:
+            if not fields:
+                # None of the indexed data was saved
+                return 0, (0 if kwargs.get('stats_only') else [])
+            return self._update_partial(
+                object_list, fields, parallel, skip_unchanged, kwargs
+            )
+
+        return self._send_actions(
+            self._get_actions(object_list, action), parallel, skip_unchanged,
+            kwargs
+        )
+
+    def _get_skip_unchanged(self, skip_unchanged):
+        """
+        Return whether the unchanged documents are skipped, or None if the
+        hashes of the documents are not stored at all.
+        """
+        if not (self.django.skip_unchanged or skip_unchanged):
+            return None
+
+        if skip_unchanged is None:
+            skip_unchanged = self.django.skip_unchanged
+        if skip_unchanged:
+            check_skip_unchanged()
+        return skip_unchanged
+
+    def _send_actions(self, actions, parallel, skip_unchanged, kwargs):
+        skip_unchanged = self._get_skip_unchanged(skip_unchanged)
+        if skip_unchanged is None:
+            return self._bulk(actions, parallel=parallel, **kwargs)
+
+        hashes = {}
+        stale_keys = []
+        try:
+            response = self._bulk(
+                self._filter_unchanged_actions(
+                    actions, skip_unchanged, hashes, stale_keys
+                ),
+                parallel=parallel,
+                **kwargs
+            )
+        except Exception:
+            self._forget_hashes(hashes, stale_keys)
+            raise
+        self._store_hashes(response, hashes, stale_keys)
+        return response
+
+    def _get_missing_documents(self, object_list, errors):
+        """
+        Split the failed partial updates in the objects whose document is not
+        in the index yet and the other errors.
+        """
+        missing_ids = set()
+        other_errors = []
+        for item in errors:
+            result = item.get('update', {})
+            if result.get('status') == 404:
+                missing_ids.add(str(result.get('_id')))
+            else:
+                other_errors.append(item)
+
+        missing = [
+            object_instance for object_instance in object_list
+            if str(self.generate_id(object_instance)) in missing_ids
+        ]
+        return missing, other_errors
+
+    def _finish_partial_update(self, success, errors, raise_on_error,
+                               stats_only, error_callback):
+        if errors and raise_on_error:
+            raise BulkIndexError(
+                "%i document(s) failed to index." % len(errors), errors
+            )
+        if error_callback is not None:
+            for item in errors:
+                error_callback(item)
+        return success, len(errors) if stats_only else errors
+
+    def _update_partial(self, object_list, fields, parallel, skip_unchanged,
+                        kwargs):
+        """
+        Send the partial update actions of the objects. The update of a
+        document which is not in the index yet fails, the whole document is
+        indexed instead.
+        """
+        object_list = list(object_list)
+        raise_on_error = kwargs.pop('raise_on_error', True)
+        stats_only = kwargs.pop('stats_only', False)
+        error_callback = kwargs.pop('error_callback', None)
+        kwargs['raise_on_error'] = False
+
+        success, errors = self._send_actions(
+            self._get_actions(object_list, 'index', fields), parallel,
+            skip_unchanged, kwargs
+        )
+        missing, errors = self._get_missing_documents(object_list, errors)
+        if missing:
+            index_success, index_errors = self._send_actions(
+                self._get_actions(missing, 'index'), parallel, skip_unchanged,
+                kwargs
+            )
+            success += index_success
+            errors += index_errors
+
+        return self._finish_partial_update(
+            success, errors, raise_on_error, stats_only, error_callback
+        )
+
+
+class DocType(DEDDocumentMixin, DSLDocument):
+    pass
+
+
+class AsyncDocument(DEDDocumentMixin, DSLAsyncDocument):
+    """
+    Document using the async elasticsearch client (AsyncElasticsearch, it
+    needs the ``elasticsearch[async]`` extra) in its ``a`` prefixed methods.
+
+    The synchronous methods, used by the signal processors and the
+    search_index command, use the synchronous client of the same connection.
+    """
+
+    @classmethod
+    def search(cls, using=None, index=None):
+        return AsyncSearch(
+            using=cls._get_using(using),
+            index=cls._default_index(index),
+            doc_type=[cls],
+            model=cls.django.model
+        )
+
+    def _get_sync_connection(self):
+        return connections.get_connection(self._get_using())
+
+    def aget_indexing_queryset(self, pk_range=None):
+        """
+        Async iterator counterpart of get_indexing_queryset(), reading the
+        objects with Django's async ORM (or the keyset pagination chunks in a
+        thread).
+        """
+        if self.django.keyset_pagination:
+            return self._aget_indexing_chunks(pk_range)
+
+        qs = self._get_indexing_base_queryset(pk_range)
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        if DJANGO_VERSION < (5, 0) and qs._prefetch_related_lookups:
+            # aiterator() refuses the prefetch_related lookups before Django
+            # 5.0, they are prefetched by chunks instead.
+            return self._aiterate_prefetched(qs, chunk_size)
+        return qs.aiterator(chunk_size=chunk_size)
+
+    async def _aiterate_prefetched(self, qs, chunk_size):
+        lookups = qs._prefetch_related_lookups
+        prefetch = sync_to_async(
+            lambda chunk: prefetch_related_objects(chunk, *lookups)
+        )
+        chunk = []
+        async for object_instance in qs.prefetch_related(None).aiterator(
+                chunk_size=chunk_size):
+            chunk.append(object_instance)
+            if len(chunk) < chunk_size:
+                continue
+            await prefetch(chunk)
+            for object_instance in chunk:
+                yield object_instance
+            chunk = []
+
+        if chunk:
+            await prefetch(chunk)
+            for object_instance in chunk:
+                yield object_instance
+
+    async def _aget_indexing_chunks(self, pk_range):
+        # The chunks are read by get_indexing_chunks() in a thread
+        chunks = self.get_indexing_chunks(pk_range=pk_range)
+        get_next = sync_to_async(next)
+        while True:
+            last_chunk = await get_next(chunks, None)
+            if last_chunk is None:
+                return
+            for object_instance in last_chunk[1]:
+                yield object_instance
+
+    async def _aget_actions(self, object_list, action, fields=None):
+        """
+        Generate the actions of the objects of an iterable or an async
+        iterable. The objects are prepared by chunks in a thread, as their
+        preparation can use the (synchronous) ORM.
+        """
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        get_actions = sync_to_async(
+            lambda chunk: list(self._get_actions(chunk, action, fields))
+        )
+        chunk = []
+        async for object_instance in _aiterate(object_list):
+            chunk.append(object_instance)
+            if len(chunk) < chunk_size:
+                continue
+            for action_data in await get_actions(chunk):
+                yield action_data
+            chunk = []
+
+        if chunk:
+            for action_data in await get_actions(chunk):
+                yield action_data
+
+    async def _afilter_unchanged_actions(self, actions, skip, hashes, stale_keys):
+        """
+        Async counterpart of _filter_unchanged_actions(), the hashes of each
+        chunk of actions are read in a thread.
+        """
+        chunk_size = self.django.queryset_pagination or DEFAULT_CHUNK_SIZE
+        filter_chunk = sync_to_async(
+            lambda chunk: list(self._filter_unchanged_actions(
+                chunk, skip, hashes, stale_keys
+            ))
+        )
+        chunk = []
+        async for action_data in actions:
+            chunk.append(action_data)
+            if len(chunk) < chunk_size:
+                continue
+            for action_data in await filter_chunk(chunk):
+                yield action_data
+            chunk = []
+
+        if chunk:
+            for action_data in await filter_chunk(chunk):
+                yield action_data
+
+    async def _asend_actions(self, actions, skip_unchanged, kwargs):
+        skip_unchanged = self._get_skip_unchanged(skip_unchanged)
+        if skip_unchanged is None:
+            return await self.abulk(actions, **kwargs)
+
+        hashes = {}
+        stale_keys = []
+        try:
+            response = await self.abulk(
+                self._afilter_unchanged_actions(
+                    actions, skip_unchanged, hashes, stale_keys
+                ),
+                **kwargs
+            )
+        except Exception:
+            await sync_to_async(self._forget_hashes)(hashes, stale_keys)
+            raise
+        await sync_to_async(self._store_hashes)(response, hashes, stale_keys)
+        return response
+
+    async def abulk(self, actions, **kwargs):
+        response = await async_bulk(
+            client=self._get_connection(), actions=actions, **kwargs
         )
+        # send post index signal
+        await sync_to_async(post_index.send)(
+            sender=self.__class__,
+            instance=self,
+            actions=actions,
+            response=response,
+            refresh=kwargs.get('refresh')
+        )
+        return response
+
+    async def aupdate(self, thing, refresh=None, action='index',
+                      skip_unchanged=None, update_fields=None, **kwargs):
+        """
+        Async counterpart of update(), the actions are sent with the
+        async_bulk() helper.
+        """
+        object_list, fields = self._init_update(
+            thing, refresh, action, update_fields, kwargs
+        )
+        if fields is None:
+            return await self._asend_actions(
+                self._aget_actions(object_list, action), skip_unchanged, kwargs
+            )
+        if not fields:
+            # None of the indexed data was saved
+            return 0, (0 if kwargs.get('stats_only') else [])
+
+        # Index the whole documents which are not in the index yet, as
+        # update() does
+        if hasattr(object_list, '__aiter__'):
+            object_list = [object_instance async for object_instance in object_list]
+        else:
+            object_list = await sync_to_async(list)(object_list)
+        raise_on_error = kwargs.pop('raise_on_error', True)
+        stats_only = kwargs.pop('stats_only', False)
+        error_callback = kwargs.pop('error_callback', None)
+        kwargs['raise_on_error'] = False
+
+        success, errors = await self._asend_actions(
+            self._aget_actions(object_list, action, fields), skip_unchanged,
+            kwargs
+        )
+        missing, errors = self._get_missing_documents(object_list, errors)
+        if missing:
+            index_success, index_errors = await self._asend_actions(
+                self._aget_actions(missing, action), skip_unchanged, kwargs
+            )
+            success += index_success
+            errors += index_errors
+
+        return self._finish_partial_update(
+            success, errors, raise_on_error, stats_only, error_callback
+        )
+
+    async def apopulate(self, pk_range=None, error_callback=None,
+                        max_errors=DEFAULT_MAX_ERRORS, skip_unchanged=False,
+                        **kwargs):
+        """
+        Index the objects of aget_indexing_queryset() with the
+        async_streaming_bulk() helper, returning the same response as
+        DocType.parallel_bulk().
+
+        Like the search_index command, the unchanged documents are sent
+        unless ``skip_unchanged`` is true, their hashes are stored if the
+        Django class enables skip_unchanged.
+        """
+        if self.django.queryset_pagination and 'chunk_size' not in kwargs:
+            kwargs['chunk_size'] = self.django.queryset_pagination
+        results = _BulkResults(
+            error_callback, max_errors, kwargs.pop('stats_only', False)
+        )
+        actions = self._aget_actions(self.aget_indexing_queryset(pk_range), 'index')
+        skip_unchanged = self._get_skip_unchanged(skip_unchanged)
+        hashes = {}
+        stale_keys = []
+        if skip_unchanged is not None:
+            actions = self._afilter_unchanged_actions(
+                actions, skip_unchanged, hashes, stale_keys
+            )
+        try:
+            async for ok, item in async_streaming_bulk(
+                client=self._get_connection(), actions=actions, **kwargs
+            ):
+                if not ok:
+                    for result in item.values():
+                        hashes.pop(str(result.get('_id')), None)
+                results.add(ok, item)
+        except Exception:
+            if skip_unchanged is not None:
+                await sync_to_async(self._forget_hashes)(hashes, stale_keys)
+            raise
+        if skip_unchanged is not None:
+            await sync_to_async(self._store_hashes)(None, hashes, stale_keys)
+
+        response = results.response
+        await sync_to_async(post_index.send)(
+            sender=self.__class__,
+            instance=self,
+            actions=actions,
+            response=response,
+            refresh=kwargs.get('refresh')
+        )
+        return response
 
 
 # Alias of DocType. Need to remove DocType in 7.x
@@ -1,3 +1,7 @@
+from datetime import date
+from decimal import Decimal
+from operator import attrgetter, itemgetter
+from uuid import UUID
 from types import MethodType
 
 import django
@@ -36,10 +40,63 @@ from elasticsearch.dsl.field import (
 from .exceptions import VariableLookupError
 
 
+# Exceptions raised by a failed dict, attribute or list index lookup.
+LOOKUP_ERRORS = (TypeError, AttributeError, KeyError, ValueError, IndexError)
+
+# Marker returned by DEDField._resolve_attr when the lookup gave nothing.
+_MISSING = object()
+
+
+def _decimal_to_float(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _date_to_isoformat(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _decimal_to_int(value):
+    if isinstance(value, Decimal):
+        return int(value)
+    return value
+
+
+def _lazy_to_str(value):
+    if isinstance(value, Promise):
+        return force_str(value)
+    return value
+
+
+def _uuid_to_str(value):
+    if isinstance(value, UUID):
+        return str(value)
+    return _lazy_to_str(value)
+
+
+def _items_converter(convert):
+    def convert_value(value):
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        if isinstance(value, tuple):
+            return tuple(convert(item) for item in value)
+        return convert(value)
+    return convert_value
+
+
 class DEDField(Field):
+    # Converts the prepared values to JSON native types for the mapping
+    # type, so the serializer does not have to fall back to its slow path.
+    json_converter = None
+
     def __init__(self, attr=None, **kwargs):
         super(DEDField, self).__init__(**kwargs)
         self._path = attr.split('.') if attr else []
+        # Compiled lookups keyed by (instance class, attr), see _resolve_attr.
+        self._accessors = {}
 
     def __setattr__(self, key, value):
         if key == 'get_value_from_instance':
@@ -47,6 +104,50 @@ class DEDField(Field):
         else:
             super(DEDField, self).__setattr__(key, value)
 
+    def _resolve_attr(self, instance, attr):
+        """
+        Look up ``attr`` on ``instance`` using Django template semantics
+        (dict lookup, attribute lookup, list index lookup) and remember
+        which lookup succeeded for the class of ``instance``, so the
+        following instances of that class skip the failing attempts.
+        Return ``_MISSING`` when nothing could be found.
+        """
+        accessor = None
+        try:
+            value = instance[attr]
+        except LOOKUP_ERRORS as exc:
+            # A TypeError means the class does not accept string keys at
+            # all, so trying the item lookup again on its instances is moot.
+            type_level = isinstance(exc, TypeError)
+            try:
+                value = getattr(instance, attr)
+            except ObjectDoesNotExist:
+                return _MISSING
+            except (TypeError, AttributeError):
+                try:
+                    value = instance[int(attr)]
+                except (
+                    IndexError, ValueError,
+                    KeyError, TypeError
+                ):
+                    if self._required:
+                        raise VariableLookupError(
+                            "Failed lookup for key [{}] in "
+                            "{!r}".format(attr, instance)
+                        )
+                    return _MISSING
+                if type_level:
+                    accessor = itemgetter(int(attr))
+            else:
+                if type_level:
+                    accessor = attrgetter(attr)
+        else:
+            accessor = itemgetter(attr)
+
+        if accessor is not None:
+            self._accessors[(instance.__class__, attr)] = accessor
+        return value
+
     def get_value_from_instance(self, instance, field_value_to_ignore=None):
         """
         Given an model instance to index with ES, return the value that
@@ -55,32 +156,24 @@ class DEDField(Field):
         if not instance:
             return None
 
+        accessors = self._accessors
         for attr in self._path:
-            try:
-                instance = instance[attr]
-            except (
-                TypeError, AttributeError,
-                KeyError, ValueError, IndexError
-            ):
+            accessor = accessors.get((instance.__class__, attr))
+            if accessor is None:
+                instance = self._resolve_attr(instance, attr)
+            else:
                 try:
-                    instance = getattr(instance, attr)
+                    instance = accessor(instance)
                 except ObjectDoesNotExist:
                     return None
-                except (TypeError, AttributeError):
-                    try:
-                        instance = instance[int(attr)]
-                    except (
-                        IndexError, ValueError,
-                        KeyError, TypeError
-                    ):
-                        if self._required:
-                            raise VariableLookupError(
-                                "Failed lookup for key [{}] in "
-                                "{!r}".format(attr, instance)
-                            )
-                        return None
-
-            if isinstance(instance, models.manager.Manager):
+                except LOOKUP_ERRORS:
+                    # This instance does not behave like the first one of
+                    # its class, go through the full lookup chain.
+                    instance = self._resolve_attr(instance, attr)
+
+            if instance is _MISSING:
+                return None
+            elif isinstance(instance, models.manager.Manager):
                 instance = instance.all()
             elif callable(instance):
                 instance = instance()
@@ -96,29 +189,62 @@ class DEDField(Field):
 
         return instance
 
+    def get_json_converter(self):
+        """
+        Return a callable applying json_converter to a value prepared for
+        this field, or to each item of a list of values, or None if the field
+        has no json_converter.
+        """
+        if self.json_converter is None:
+            return None
+        return _items_converter(self.json_converter)
+
+    def get_values_converter(self, model_field):
+        """
+        Return a callable converting the value of ``model_field`` read with
+        ``QuerySet.values_list()`` into the value get_value_from_instance()
+        returns for the model instance, or None if they are the same.
+        """
+        return None
+
 
 class ObjectField(DEDField, Object):
-    def _get_inner_field_data(self, obj, field_value_to_ignore=None):
-        data = {}
+    _inner_fields = None
+
+    def _get_inner_fields(self):
+        """
+        Return the (name, field, prep_func, convert) tuples used to build the
+        data of the inner objects. They are extracted from the properties once, on
+        first use, and reused for every object.
+        """
+        inner_fields = self._inner_fields
+        if inner_fields is None:
+            inner_fields = []
+            doc_instance = self._doc_class()
+            for name, field in self._doc_class._doc_type.mapping.properties._params.get(
+                'properties', {}).items():  # noqa
+                if not isinstance(field, DEDField):
+                    continue
 
-        doc_instance = self._doc_class()
-        for name, field in self._doc_class._doc_type.mapping.properties._params.get(
-            'properties', {}).items():  # noqa
-            if not isinstance(field, DEDField):
-                continue
+                if field._path == []:
+                    field._path = [name]
 
-            if field._path == []:
-                field._path = [name]
+                # This allows for retrieving data from an InnerDoc with prepare_field_name functions.
+                prep_func = getattr(doc_instance, 'prepare_%s' % name, None)
+                inner_fields.append((name, field, prep_func, field.get_json_converter()))
 
-            # This allows for retrieving data from an InnerDoc with prepare_field_name functions.
-            prep_func = getattr(doc_instance, 'prepare_%s' % name, None)
+            self._inner_fields = inner_fields
+        return inner_fields
+
+    def _get_inner_field_data(self, obj, field_value_to_ignore=None):
+        data = {}
 
+        for name, field, prep_func, convert in self._get_inner_fields():
             if prep_func:
-                data[name] = prep_func(obj)
+                value = prep_func(obj)
             else:
-                data[name] = field.get_value_from_instance(
-                    obj, field_value_to_ignore
-                )
+                value = field.get_value_from_instance(obj, field_value_to_ignore)
+            data[name] = value if convert is None else convert(value)
 
         # This allows for ObjectFields to be indexed from dicts with
         # dynamic keys (i.e. keys/fields not defined in 'properties')
@@ -171,7 +297,7 @@ class BooleanField(DEDField, Boolean):
 
 
 class ByteField(DEDField, Byte):
-    pass
+    json_converter = staticmethod(_decimal_to_int)
 
 
 class CompletionField(DEDField, Completion):
@@ -179,19 +305,19 @@ class CompletionField(DEDField, Completion):
 
 
 class DateField(DEDField, Date):
-    pass
+    json_converter = staticmethod(_date_to_isoformat)
 
 
 class DoubleField(DEDField, Double):
-    pass
+    json_converter = staticmethod(_decimal_to_float)
 
 
 class FloatField(DEDField, Float):
-    pass
+    json_converter = staticmethod(_decimal_to_float)
 
 
 class ScaledFloatField(DEDField, ScaledFloat):
-    pass
+    json_converter = staticmethod(_decimal_to_float)
 
 
 class GeoPointField(DEDField, GeoPoint):
@@ -203,7 +329,7 @@ class GeoShapeField(DEDField, GeoShape):
 
 
 class IntegerField(DEDField, Integer):
-    pass
+    json_converter = staticmethod(_decimal_to_int)
 
 
 class IpField(DEDField, Ip):
@@ -211,7 +337,7 @@ class IpField(DEDField, Ip):
 
 
 class LongField(DEDField, Long):
-    pass
+    json_converter = staticmethod(_decimal_to_int)
 
 
 class NestedField(Nested, ObjectField):
@@ -219,19 +345,19 @@ class NestedField(Nested, ObjectField):
 
 
 class ShortField(DEDField, Short):
-    pass
+    json_converter = staticmethod(_decimal_to_int)
 
 
 class KeywordField(DEDField, Keyword):
-    pass
+    json_converter = staticmethod(_uuid_to_str)
 
 
 class TextField(DEDField, Text):
-    pass
+    json_converter = staticmethod(_lazy_to_str)
 
 
 class SearchAsYouTypeField(DEDField, SearchAsYouType):
-    pass
+    json_converter = staticmethod(_lazy_to_str)
 
 
 class FileFieldMixin(object):
@@ -243,6 +369,13 @@ class FileFieldMixin(object):
             return _file.url if _file else ''
         return _file if _file else ''
 
+    def get_values_converter(self, model_field):
+        storage = model_field.storage
+
+        def convert(name):
+            return storage.url(name) if name else ''
+        return convert
+
 
 class FileField(FileFieldMixin, DEDField, Text):
     pass
@@ -255,3 +388,9 @@ class TimeField(KeywordField):
 
         if time:
             return time.isoformat()
+
+    def get_values_converter(self, model_field):
+        def convert(time):
+            if time:
+                return time.isoformat()
+        return convert
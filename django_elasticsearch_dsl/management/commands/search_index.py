@@ -1,21 +1,95 @@
 from __future__ import absolute_import, unicode_literals
 
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import islice
 
+import django
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from elasticsearch.dsl import connections
+from elasticsearch.dsl import AsyncIndex, connections
 from six.moves import input
 
+from ...apps import DEDConfig
+from ...cache import invalidate_search_cache, reset_index_hashes
+from ...checkpoints import get_checkpoint_store
+from ...documents import DEDDocumentMixin
 from ...registries import registry
 
 
+def _get_pk_ranges(queryset, workers):
+    """
+    Split the objects of ``queryset`` in at most ``workers`` ranges of pks
+    of about the same number of objects.
+    """
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    count = pks.count()
+    if not count:
+        return []
+
+    size = -(-count // workers)
+    # Read the pks in a single pass rather than with a query by range
+    starts = list(islice(pks.iterator(chunk_size=2000), 0, None, size))
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def _get_stats(result):
+    """
+    Return the (success, failed) numbers of the result of Document.update(),
+    or None if an overridden update() does not return them.
+    """
+    if isinstance(result, tuple) and len(result) == 2:
+        success, failed = result
+        if isinstance(success, int):
+            return success, failed if isinstance(failed, int) else len(failed)
+    return None
+
+
+def _add_stats(stats, result):
+    result = _get_stats(result)
+    if stats is None or result is None:
+        return None
+    return stats[0] + result[0], stats[1] + result[1]
+
+
+def _get_label(doc):
+    return '{}.{}'.format(doc.__module__, doc.__name__)
+
+
+def _get_document(label):
+    for doc in registry.get_documents():
+        if _get_label(doc) == label:
+            return doc
+    raise CommandError("Unknown document '{}'".format(label))
+
+
+def _init_worker():
+    # The workers are spawned, they have their own database and
+    # elasticsearch connections.
+    django.setup()
+
+
+def _populate_pk_range(label, index_name, pk_range, update_kwargs):
+    doc = _get_document(label)
+    # The worker set up its own registry, the index of a rebuild with
+    # '--use-alias' is only renamed in the parent process.
+    doc._index._name = index_name
+    doc_instance = doc()
+    qs = doc_instance.get_indexing_queryset(pk_range=pk_range)
+    return doc_instance.update(qs, **update_kwargs)
+
+
 class Command(BaseCommand):
     help = 'Manage elasticsearch index.'
 
     def __init__(self, *args, **kwargs):
         super(Command, self).__init__(*args, **kwargs)
         self.es_conn = connections.get_connection()
+        self.checkpoints = None
+        # Indices a resumed rebuild continues to populate
+        self.resumed_indices = set()
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -71,6 +145,28 @@ class Command(BaseCommand):
             dest='parallel',
             help='Run populate/rebuild update single threaded'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            dest='workers',
+            help='Run populate/rebuild in the given number of processes, '
+                 'each one indexing a range of the objects'
+        )
+        parser.add_argument(
+            '--ignore-errors',
+            action='store_false',
+            dest='raise_on_error',
+            help='Keep on populating when documents fail to be indexed, '
+                 'only reporting their number'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            help='Record the progress of populate/rebuild and continue it '
+                 'where a previous run with --resume stopped'
+        )
         parser.add_argument(
             '--use-alias',
             action='store_true',
@@ -130,12 +226,29 @@ class Command(BaseCommand):
 
         return set(models)
 
+    def _create_index(self, index):
+        if isinstance(index, AsyncIndex):
+            # The index of an AsyncDocument, the command is synchronous
+            self.es_conn.indices.create(index=index._name, **index.to_dict())
+        else:
+            index.create()
+
+    def _delete_index(self, index):
+        if isinstance(index, AsyncIndex):
+            self.es_conn.options(ignore_status=404).indices.delete(index=index._name)
+        else:
+            index.delete(ignore=404)
+
     def _create(self, models, aliases, options):
         for index in registry.get_indices(models):
             alias_exists = index._name in aliases
-            if not alias_exists:
+            if index._name in self.resumed_indices:
+                self.stdout.write("Resuming index '{}'".format(index._name))
+            elif not alias_exists:
                 self.stdout.write("Creating index '{}'".format(index._name))
-                index.create()
+                self._create_index(index)
+                reset_index_hashes(index._name)
+                invalidate_search_cache([index._name])
             elif options['action'] == 'create':
                 self.stdout.write(
                     "'{}' already exists as an alias. Run '--delete' with"
@@ -144,15 +257,150 @@ class Command(BaseCommand):
                 )
 
     def _populate(self, models, options):
+        if options.get('workers', 1) > 1:
+            return self._populate_with_workers(models, options)
+
         parallel = options['parallel']
         for doc in registry.get_documents(models):
+            if self.checkpoints is not None:
+                self._populate_resumable(doc, options)
+                continue
+
+            doc_instance = doc()
             self.stdout.write("Indexing {} '{}' objects {}".format(
-                doc().get_queryset().count() if options['count'] else "all",
+                doc_instance.get_queryset().count() if options['count'] else "all",
                 doc.django.model.__name__,
                 "(parallel)" if parallel else "")
             )
-            qs = doc().get_indexing_queryset()
-            doc().update(qs, parallel=parallel, refresh=options['refresh'])
+            qs = doc_instance.get_indexing_queryset()
+            start = time.monotonic()
+            result = doc_instance.update(qs, **self._get_update_kwargs(doc, options))
+            self._write_stats(doc, _get_stats(result), time.monotonic() - start)
+
+    def _get_update_kwargs(self, doc, options):
+        kwargs = {
+            'parallel': options['parallel'],
+            'refresh': options['refresh'],
+        }
+        if doc.update is not DEDDocumentMixin.update:
+            # An overridden update() may not accept the other arguments
+            if not options.get('raise_on_error', True):
+                kwargs['raise_on_error'] = False
+            return kwargs
+
+        kwargs.update({
+            # The index content is not known, send every document
+            'skip_unchanged': False,
+            'stats_only': True,
+            'raise_on_error': options.get('raise_on_error', True),
+        })
+        return kwargs
+
+    def _write_stats(self, doc, stats, duration):
+        if stats is None:
+            self.stdout.write("Indexed '{}' objects in {:.1f}s".format(
+                doc.django.model.__name__, duration
+            ))
+            return
+
+        success, failed = stats
+        self.stdout.write(
+            "Indexed {} '{}' objects in {:.1f}s ({:.0f} docs/s), {} failed".format(
+                success, doc.django.model.__name__, duration,
+                success / duration if duration else 0, failed
+            )
+        )
+
+    def _populate_resumable(self, doc, options):
+        """
+        Index the objects by chunks in pk order, recording the last pk of
+        each indexed chunk to be able to continue from it.
+        """
+        label = _get_label(doc)
+        index_name = doc._index._name
+        checkpoint = self.checkpoints.get(label) or {}
+        if checkpoint.get('index') != index_name:
+            checkpoint = {}
+        if checkpoint.get('done'):
+            self.stdout.write("'{}' objects are already indexed".format(
+                doc.django.model.__name__
+            ))
+            return
+
+        doc_instance = doc()
+        after_pk = checkpoint.get('last_pk')
+        self.stdout.write("Indexing '{}' objects {}".format(
+            doc.django.model.__name__,
+            "after pk {}".format(after_pk) if after_pk is not None else ""
+        ))
+        update_kwargs = self._get_update_kwargs(doc, options)
+        stats = (0, 0)
+        start = time.monotonic()
+        for last_pk, chunk in doc_instance.get_indexing_chunks(after_pk=after_pk):
+            stats = _add_stats(stats, doc_instance.update(chunk, **update_kwargs))
+            self.checkpoints.set(label, {'index': index_name, 'last_pk': last_pk})
+            after_pk = last_pk
+
+        self.checkpoints.set(
+            label, {'index': index_name, 'last_pk': after_pk, 'done': True}
+        )
+        self._write_stats(doc, stats, time.monotonic() - start)
+
+    def _get_resumed_indices(self, models, use_alias):
+        """
+        Return the concrete names of the indices of the rebuild recorded in
+        the checkpoints, by index name: a new index behind the alias with
+        ``use_alias``, else the index itself. The checkpoints of the indices
+        which can not be resumed are deleted, they are created again.
+        """
+        resumed = {}
+        for doc in registry.get_documents(models):
+            label = _get_label(doc)
+            checkpoint = self.checkpoints.get(label)
+            if not checkpoint:
+                continue
+            index_name = checkpoint['index']
+            if (index_name != doc._index._name) == use_alias \
+                    and self.es_conn.indices.exists(index=index_name):
+                resumed[doc._index._name] = index_name
+            else:
+                self.checkpoints.delete(label)
+        return resumed
+
+    def _clear_checkpoints(self, models, checkpoints):
+        for doc in registry.get_documents(models):
+            checkpoints.delete(_get_label(doc))
+
+    def _populate_with_workers(self, models, options):
+        parallel = options['parallel']
+        workers = options['workers']
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+        ) as executor:
+            for doc in registry.get_documents(models):
+                doc_instance = doc()
+                pk_ranges = _get_pk_ranges(doc_instance.get_queryset(), workers)
+                self.stdout.write("Indexing {} '{}' objects in {} processes {}".format(
+                    doc_instance.get_queryset().count() if options['count'] else "all",
+                    doc.django.model.__name__,
+                    len(pk_ranges),
+                    "(parallel)" if parallel else "")
+                )
+                label = _get_label(doc)
+                start = time.monotonic()
+                results = executor.map(
+                    _populate_pk_range,
+                    [label] * len(pk_ranges),
+                    [doc._index._name] * len(pk_ranges),
+                    pk_ranges,
+                    [self._get_update_kwargs(doc, options)] * len(pk_ranges),
+                )
+                stats = (0, 0)
+                for result in results:
+                    stats = _add_stats(stats, result)
+                self._write_stats(doc, stats, time.monotonic() - start)
 
     def _get_alias_indices(self, alias):
         alias_indices = self.es_conn.indices.get_alias(name=alias)
@@ -193,9 +441,11 @@ class Command(BaseCommand):
         else:
             for index in registry.get_indices(models):
                 alias_exists = index._name in aliases
+                if index._name in self.resumed_indices:
+                    continue
                 if not alias_exists:
                     self.stdout.write("Deleting index '{}'".format(index._name))
-                    index.delete(ignore=404)
+                    self._delete_index(index)
                 elif options['action'] == 'rebuild':
                     self._delete_alias_indices(index._name)
                 elif options['action'] == 'delete':
@@ -206,6 +456,9 @@ class Command(BaseCommand):
                     )
                     return False
 
+        for index in index_names:
+            reset_index_hashes(index)
+        invalidate_search_cache(index_names)
         return True
 
     def _update_alias(self, alias, new_index, alias_exists, options):
@@ -234,6 +487,11 @@ class Command(BaseCommand):
             ]
 
         self.es_conn.indices.update_aliases(actions=alias_actions)
+        reset_index_hashes(alias)
+        invalidate_search_cache(
+            [alias],
+            None if options['refresh'] else DEDConfig.search_cache_refresh_delay()
+        )
         if delete_existing_index:
              self.stdout.write("Deleted index '{}'".format(alias))
 
@@ -255,6 +513,11 @@ class Command(BaseCommand):
                     self.stdout.write("Deleted index '{}'".format(index))
 
     def _rebuild(self, models, aliases, options):
+        resumed = {}
+        if self.checkpoints is not None:
+            resumed = self._get_resumed_indices(models, options['use_alias'])
+            self.resumed_indices = set(resumed.values())
+
         if (not options['use_alias']
             and not self._delete(models, aliases, options)):
             return
@@ -269,7 +532,7 @@ class Command(BaseCommand):
                 # name needs to be limited to 255 characters, of which
                 # 21 will always be taken by the suffix, leaving 234
                 # characters from the original index name value.
-                new_index = index._name[:234] + index_suffix
+                new_index = resumed.get(index._name) or index._name[:234] + index_suffix
                 alias_index_pairs.append(
                     {'alias': index._name, 'index': new_index}
                 )
@@ -286,6 +549,9 @@ class Command(BaseCommand):
                     alias, alias_index_pair['index'], alias_exists, options
                 )
 
+        if self.checkpoints is not None:
+            self._clear_checkpoints(models, self.checkpoints)
+
     def handle(self, *args, **options):
         if not options['action']:
             raise CommandError(
@@ -295,6 +561,17 @@ class Command(BaseCommand):
 
         action = options['action']
         models = self._get_models(options['models'])
+        if options.get('resume'):
+            if options.get('workers', 1) > 1:
+                raise CommandError("'--resume' can not be used with '--workers'")
+            self.checkpoints = get_checkpoint_store()
+        if options.get('workers', 1) > 1 and not settings.SETTINGS_MODULE:
+            # The spawned workers set Django up from DJANGO_SETTINGS_MODULE,
+            # they don't see the settings given to settings.configure()
+            raise CommandError(
+                "'--workers' needs the settings to be loaded from the "
+                "DJANGO_SETTINGS_MODULE environment variable"
+            )
 
         # We need to know if and which aliases exist to mitigate naming
         # conflicts with indices, therefore this is needed regardless
@@ -303,10 +580,17 @@ class Command(BaseCommand):
         for index in self.es_conn.indices.get_alias().values():
             aliases += index['aliases'].keys()
 
+        if self.checkpoints is None:
+            # The indices are changed without recording the progress, a later
+            # run with '--resume' must not continue a run recorded before.
+            self._clear_checkpoints(models, get_checkpoint_store())
+
         if action == 'create':
             self._create(models, aliases, options)
         elif action == 'populate':
             self._populate(models, options)
+            if self.checkpoints is not None:
+                self._clear_checkpoints(models, self.checkpoints)
         elif action == 'delete':
             self._delete(models, aliases, options)
         elif action == 'rebuild':
@@ -3,6 +3,8 @@ from copy import deepcopy
 from itertools import chain
 
 from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.db.models import Model
+from django.dispatch import Signal
 from elasticsearch.dsl import AttrDict
 from six import iteritems, iterkeys, itervalues
 
@@ -10,6 +12,13 @@ from django_elasticsearch_dsl.exceptions import RedeclaredFieldError
 
 from .apps import DEDConfig
 
+# How the indexing queryset is read, see Django.indexing_mode
+INDEXING_MODES = ('instances', 'values', 'auto')
+
+# Sent after a document is registered, so that the signal processors listen
+# to the models it uses
+document_registered = Signal()
+
 
 class DocumentRegistry(object):
     """
@@ -19,20 +28,26 @@ class DocumentRegistry(object):
         self._indices = defaultdict(set)
         self._models = defaultdict(set)
         self._related_models = defaultdict(set)
+        # Lookup tables kept up to date by register(), so that the signal
+        # handlers do not scan the registry
+        self._index_names = {}
+        self._model_indices = defaultdict(set)
+        self._related_docs = defaultdict(tuple)
 
     def register(self, index, doc_class):
         """Register the model with the registry"""
-        self._models[doc_class.django.model].add(doc_class)
+        model = doc_class.django.model
+        self._models[model].add(doc_class)
 
         for related in doc_class.django.related_models:
-            self._related_models[related].add(doc_class.django.model)
-
-        for idx, docs in iteritems(self._indices):
-            if index._name == idx._name:
-                docs.add(doc_class)
-                return
+            self._related_models[related].add(model)
+            if doc_class not in self._related_docs[related]:
+                self._related_docs[related] += (doc_class,)
 
+        # The documents of indices with the same name share the first one
+        index = self._index_names.setdefault(index._name, index)
         self._indices[index].add(doc_class)
+        self._model_indices[model].add(index)
 
     def register_document(self, document):
         django_meta = getattr(document, 'Django')
@@ -69,6 +84,16 @@ class DocumentRegistry(object):
                                            "auto_refresh", DEDConfig.auto_refresh_enabled())
         django_attr.related_models = getattr(django_meta, "related_models", [])
         django_attr.queryset_pagination = getattr(django_meta, "queryset_pagination", None)
+        django_attr.keyset_pagination = getattr(django_meta, "keyset_pagination", False)
+        django_attr.select_related = getattr(django_meta, "select_related", None)
+        django_attr.prefetch_related = getattr(django_meta, "prefetch_related", None)
+        django_attr.skip_unchanged = getattr(django_meta, "skip_unchanged", False)
+        django_attr.partial_updates = getattr(django_meta, "partial_updates", False)
+        django_attr.indexing_mode = getattr(django_meta, "indexing_mode", "instances")
+        if django_attr.indexing_mode not in INDEXING_MODES:
+            raise ImproperlyConfigured(
+                "indexing_mode must be one of {}".format(", ".join(INDEXING_MODES))
+            )
 
         # Add django attribute in the document class with all the django attribute
         setattr(document, 'django', django_attr)
@@ -77,20 +102,40 @@ class DocumentRegistry(object):
         fields = document._doc_type.mapping.properties.properties.to_dict()
         setattr(document, '_fields', fields)
 
+        # Build the preparers once, they are shared by the document instances
+        setattr(document, '_field_preparers', document._build_field_preparers())
+
+        values_fields = None
+        if django_attr.indexing_mode != 'instances':
+            values_fields = document.init_prepare_values()
+            if values_fields is None and django_attr.indexing_mode == 'values':
+                raise ImproperlyConfigured(
+                    "{} can not be indexed with the 'values' indexing_mode, "
+                    "its fields must all be plain model fields".format(document.__name__)
+                )
+        setattr(document, '_values_fields', values_fields)
+
+        # Derive the relations to load while indexing from the fields, unless
+        # the Django class declares them
+        if django_attr.select_related is None or django_attr.prefetch_related is None:
+            select_related, prefetch_related = document.get_related_lookups()
+            if django_attr.select_related is None:
+                django_attr.select_related = select_related
+            if django_attr.prefetch_related is None:
+                django_attr.prefetch_related = prefetch_related
+
         # Update settings of the document index
         default_index_settings = deepcopy(DEDConfig.default_index_settings())
         document._index.settings(**default_index_settings)
 
         # Register the document and index class to our registry
         self.register(index=document._index, doc_class=document)
+        document_registered.send(sender=self.__class__, registry=self, document=document)
 
         return document
 
     def _get_related_doc(self, instance):
-        for model in self._related_models.get(instance.__class__, []):
-            for doc in self._models[model]:
-                if instance.__class__ in doc.django.related_models:
-                    yield doc
+        return self._related_docs.get(instance.__class__, ())
 
     def update_related(self, instance, **kwargs):
         """
@@ -126,19 +171,101 @@ class DocumentRegistry(object):
             if related is not None:
                 doc_instance.update(related, **kwargs)
 
-    def update(self, instance, **kwargs):
+    def update(self, instance, update_fields=None, **kwargs):
         """
         Update all the elasticsearch documents attached to this model (if their
         ignore_signals flag allows it)
+
+        The documents enabling partial_updates are only updated with the fields
+        depending on ``update_fields`` when it is set.
         """
         if not DEDConfig.autosync_enabled():
             return
 
         if instance.__class__ in self._models:
             for doc in self._models[instance.__class__]:
-                if not doc.django.ignore_signals:
+                if doc.django.ignore_signals:
+                    continue
+                if update_fields is not None and doc.django.partial_updates:
+                    doc().update(instance, update_fields=update_fields, **kwargs)
+                else:
                     doc().update(instance, **kwargs)
 
+    def _get_m2m_accessors(self, instance, model, reverse, through):
+        """
+        Return the names of the ``through`` many to many relation on the model
+        of ``instance`` and on ``model``.
+        """
+        owner = model if reverse else instance.__class__
+        for field in owner._meta.many_to_many:
+            if field.remote_field.through is through:
+                accessors = (field.name, field.remote_field.get_accessor_name())
+                return accessors[::-1] if reverse else accessors
+        return None, None
+
+    def _uses_relation(self, doc, accessor):
+        return (
+            not doc.django.ignore_signals and
+            (accessor is None or doc.get_partial_fields([accessor]) != [])
+        )
+
+    def get_m2m_changes(self, instance, model, pk_set, reverse, through):
+        """
+        Yield the ``(doc, objects)`` to index when the ``pk_set`` objects of
+        ``model`` are added to or removed from the ``through`` many to many
+        relation of ``instance``.
+
+        Only the documents whose fields use the relation are indexed:
+        ``instance`` in the documents of its model, and the ``pk_set`` objects
+        in the documents of ``model``. The documents of other models declaring
+        one of them in their related_models are indexed too.
+        """
+        instance_accessor, model_accessor = self._get_m2m_accessors(
+            instance, model, reverse, through
+        )
+        objects = None
+        for doc in self._models.get(instance.__class__, ()):
+            if self._uses_relation(doc, instance_accessor):
+                yield doc, [instance]
+        if pk_set:
+            for doc in self._models.get(model, ()):
+                if self._uses_relation(doc, model_accessor):
+                    yield doc, doc().get_queryset().filter(pk__in=pk_set)
+            if model in self._related_models:
+                objects = model._default_manager.filter(pk__in=pk_set)
+
+        sides = [[instance], objects or []]
+        related = defaultdict(dict)
+        for related_instance in chain.from_iterable(sides):
+            for doc in self._get_related_doc(related_instance):
+                if doc.django.model in (instance.__class__, model):
+                    continue
+                try:
+                    found = doc().get_instances_from_related(related_instance)
+                except ObjectDoesNotExist:
+                    found = None
+                if found is None:
+                    continue
+                if isinstance(found, Model):
+                    found = [found]
+                for obj in found:
+                    related[doc][obj.pk] = obj
+        for doc, found in iteritems(related):
+            yield doc, list(itervalues(found))
+
+    def update_m2m(self, instance, model, pk_set, reverse, through, **kwargs):
+        """
+        Update the documents using the ``through`` many to many relation of
+        ``instance`` once the ``pk_set`` objects of ``model`` are added to or
+        removed from it, see get_m2m_changes.
+        """
+        if not DEDConfig.autosync_enabled():
+            return
+
+        for doc, objects in self.get_m2m_changes(
+                instance, model, pk_set, reverse, through):
+            doc().update(objects, **kwargs)
+
     def delete(self, instance, **kwargs):
         """
         Delete all the elasticsearch documents attached to this model (if their
@@ -166,13 +293,29 @@ class DocumentRegistry(object):
         Get all indices in the registry or the indices for a list of models
         """
         if models is not None:
-            return set(
-                indice for indice, docs in iteritems(self._indices)
-                for doc in docs if doc.django.model in models
-            )
+            return set(chain.from_iterable(
+                self._model_indices[model] for model in models
+                if model in self._model_indices
+            ))
 
         return set(iterkeys(self._indices))
 
+    def get_signal_senders(self):
+        """
+        Return the models whose changes must be handled: the models of the
+        documents, their related models and the ``through`` models of their
+        many to many relations.
+        """
+        models = set(self._models) | set(self._related_models)
+        senders = set(models)
+        for model in models:
+            for field in model._meta.many_to_many:
+                senders.add(field.remote_field.through)
+            for rel in model._meta.related_objects:
+                if rel.many_to_many:
+                    senders.add(rel.through)
+        return senders
+
     def __contains__(self, model):
         """
         Checks that model is in registry
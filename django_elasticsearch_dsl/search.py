@@ -1,45 +1,199 @@
-from django.db.models import Case, When
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Case, F, Func, Value, When
 from django.db.models.fields import IntegerField
+from django.db.models.query import ModelIterable
+from elasticsearch.dsl import AsyncSearch as DSLAsyncSearch
 from elasticsearch.dsl import Search as DSLSearch
+from elasticsearch.dsl.utils import ObjectBase
 
+from .apps import DEDConfig
+from .cache import (
+    ALL_INDICES,
+    aget_search_cache_key,
+    get_search_cache,
+    get_search_cache_key,
+)
+from .exceptions import ReadOnlyInstanceError
+from .fields import FileFieldMixin
+from .registries import registry
 
-class Search(DSLSearch):
+
+class _ArrayPosition(Func):
+    """
+    Position of the ``pk`` column in an array of primary keys, ordering a
+    queryset with a single parameter on PostgreSQL.
+    """
+    output_field = IntegerField()
+
+    def __init__(self, pks, db_type):
+        super(_ArrayPosition, self).__init__(F('pk'))
+        self.pks = pks
+        self.db_type = db_type
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = compiler.compile(self.source_expressions[0])
+        return (
+            'array_position(%%s::%s[], %s)' % (self.db_type, sql),
+            [self.pks] + list(params)
+        )
+
+
+def _refuse_write(*args, **kwargs):
+    raise ReadOnlyInstanceError(
+        "The instances built from the search results can not be saved or deleted"
+    )
+
+
+class _SearchOrderIterable(ModelIterable):
+    """
+    Yield the model instances in the order of the search hits, sorting them
+    once read from the database. Subclassed with the ``positions`` of the
+    primary keys for each search.
+    """
+    positions = {}
+
+    def __iter__(self):
+        query = self.queryset.query
+        if query.low_mark or query.high_mark is not None:
+            # The database would slice the rows before they are sorted
+            raise TypeError(
+                "A queryset ordered like the search hits in python can not "
+                "be sliced"
+            )
+        instances = list(super(_SearchOrderIterable, self).__iter__())
+        instances.sort(key=lambda instance: self.positions.get(instance.pk, 0))
+        return iter(instances)
+
+
+class DEDSearchMixin(object):
+    """
+    The django model related part of the searches, shared by the
+    synchronous and the async searches.
+    """
     def __init__(self, **kwargs):
         self._model = kwargs.pop('model', None)
-        super(Search, self).__init__(**kwargs)
+        self._cache_enabled = False
+        self._cache_timeout = None
+        super(DEDSearchMixin, self).__init__(**kwargs)
 
     def _clone(self):
-        s = super(Search, self)._clone()
+        s = super(DEDSearchMixin, self)._clone()
         s._model = self._model
+        s._cache_enabled = self._cache_enabled
+        s._cache_timeout = self._cache_timeout
         return s
 
-    def filter_queryset(self, queryset, keep_search_order=True):
+    def cache(self, timeout=None):
         """
-        Filter an existing django queryset using the elasticsearch result.
-        It costs a query to the sql db.
+        Return a copy of the search whose response is cached for ``timeout``
+        seconds (ELASTICSEARCH_DSL_SEARCH_CACHE_TIMEOUT by default), or until
+        a document of its indices is indexed.
         """
-        s = self
-        if s._model is not queryset.model:
+        s = self._clone()
+        s._cache_enabled = True
+        s._cache_timeout = timeout
+        return s
+
+    def _get_cache_key_args(self):
+        """
+        Return the index names whose invalidation forgets the cached response
+        of the search, and the data describing the search. The searches of
+        wildcards, aliases or indices of no registered document depend on
+        the invalidation of any index.
+        """
+        index_names = list(self._index or [ALL_INDICES])
+        using = self._using if isinstance(self._using, str) else None
+        data = [index_names, using, self.to_dict(), self._params]
+        registered = {index._name for index in registry.get_indices()}
+        if all(name in registered for name in index_names):
+            return index_names, data
+        return [ALL_INDICES], data
+
+    def _get_cache_key(self, cache):
+        return get_search_cache_key(cache, *self._get_cache_key_args())
+
+    async def _aget_cache_key(self, cache):
+        return await aget_search_cache_key(cache, *self._get_cache_key_args())
+
+    def _get_cache_timeout(self):
+        if self._cache_timeout is None:
+            return DEDConfig.search_cache_timeout()
+        return self._cache_timeout
+
+    def _set_cached_response(self, data):
+        if data is None:
+            return None
+        self._response = self._response_class(self, data)
+        return self._response
+
+    def _check_queryset_model(self, queryset):
+        if self._model is not queryset.model:
             raise TypeError(
                 'Unexpected queryset model '
-                '(should be: %s, got: %s)' % (s._model, queryset.model)
+                '(should be: %s, got: %s)' % (self._model, queryset.model)
             )
 
-        # Do not query again if the es result is already cached
-        if not hasattr(self, '_response'):
-            # We only need the meta fields with the models ids
-            s = self.source(excludes=['*'])
-            s = s.execute()
+    # Names of the methods ordering a queryset like the search hits
+    ordering_strategies = {
+        'case': '_order_by_case',
+        'array_position': '_order_by_array_position',
+        'field': '_order_by_field',
+        'python': '_order_in_python',
+    }
 
-        pks = [result.meta.id for result in s]
+    def get_ordering_strategy(self, queryset, pks):
+        """
+        Return the name of the strategy keeping the order of the search hits,
+        chosen from the database backend. The ``python`` strategy is never
+        chosen, its queryset can not be sliced (or paginated).
+        """
+        vendor = connections[queryset.db].vendor
+        if vendor == 'postgresql':
+            return 'array_position'
+        if vendor == 'mysql':
+            return 'field'
+        return 'case'
+
+    def _order_by_case(self, queryset, pks):
+        preserved_order = Case(
+            *[When(pk=pk, then=pos) for pos, pk in enumerate(pks)],
+            output_field=IntegerField()
+        )
+        return queryset.order_by(preserved_order)
+
+    def _order_by_array_position(self, queryset, pks):
+        db_type = queryset.model._meta.pk.cast_db_type(connections[queryset.db])
+        return queryset.order_by(_ArrayPosition(pks, db_type))
+
+    def _order_by_field(self, queryset, pks):
+        return queryset.order_by(
+            Func(F('pk'), *[Value(pk) for pk in pks], function='FIELD')
+        )
+
+    def _order_in_python(self, queryset, pks):
+        """
+        Sort the instances once read, the queryset must not be sliced as the
+        database does not order it.
+        """
+        iterable_class = type('SearchOrderIterable', (_SearchOrderIterable,), {
+            'positions': {pk: pos for pos, pk in enumerate(pks)}
+        })
+        queryset = queryset.order_by()
+        queryset._iterable_class = iterable_class
+        return queryset
+
+    def _filter_queryset_by_pks(self, queryset, pks, keep_search_order):
+        pk_field = queryset.model._meta.pk
+        pks = [pk_field.to_python(pk) for pk in pks]
         queryset = queryset.filter(pk__in=pks)
 
         if keep_search_order:
-            preserved_order = Case(
-                *[When(pk=pk, then=pos) for pos, pk in enumerate(pks)],
-                output_field=IntegerField()
-            )
-            queryset = queryset.order_by(preserved_order)
+            strategy = keep_search_order
+            if strategy is True:
+                strategy = self.get_ordering_strategy(queryset, pks)
+            queryset = getattr(self, self.ordering_strategies[strategy])(queryset, pks)
 
         return queryset
 
@@ -49,6 +203,131 @@ class Search(DSLSearch):
         """
         return self._model._default_manager.all()
 
+    def _get_source_fields(self):
+        """
+        Return the model fields read from the ``_source`` of the hits, by
+        name of document field: the fields of the document mapped to a
+        concrete model field which is not a relation, and not computed by a
+        prepare method. The fields indexing another value than the column
+        (the url of a file for instance) are left out.
+        """
+        opts = self._model._meta
+        docs = [doc for doc in self._doc_type if hasattr(doc, '_get_field_preparers')]
+        if not docs:
+            return {
+                field.name: field for field in opts.concrete_fields
+                if not field.is_relation
+            }
+
+        doc = docs[0]
+        fields = {}
+        for name, field, prep_func in doc._get_field_preparers():
+            has_prepare_method = any(
+                getattr(doc, method_name % name, None)
+                for method_name in (
+                    'prepare_%s', 'prepare_%s_batch', 'prepare_%s_with_related'
+                )
+            )
+            if has_prepare_method or len(field._path) != 1:
+                continue
+            try:
+                model_field = opts.get_field(field._path[0])
+            except FieldDoesNotExist:
+                continue
+            if not model_field.concrete or model_field.is_relation:
+                continue
+            if (isinstance(field, FileFieldMixin) or
+                    field.get_values_converter(model_field) is not None):
+                continue
+            fields[name] = model_field
+        return fields
+
+    def _get_page_search(self, chunk_size):
+        # Only the ids are needed, by pages of chunk_size hits. The pages of
+        # a point in time are not worth caching.
+        s = self.source(excludes=['*'])[:chunk_size]
+        s._cache_enabled = False
+        return s
+
+    def _build_instances(self, hits, fallback_to_db):
+        """
+        Build read-only model instances from the ``_source`` of the hits.
+        """
+        opts = self._model._meta
+        db = self._get_queryset().db
+        source_fields = self._get_source_fields()
+        instances = []
+        for hit in hits:
+            if isinstance(hit, ObjectBase):
+                source = hit.to_dict(skip_empty=False)
+            else:
+                source = hit.to_dict()
+            data = {opts.pk.attname: opts.pk.to_python(hit.meta.id)}
+            for name, model_field in source_fields.items():
+                if name in source:
+                    data[model_field.attname] = model_field.to_python(source[name])
+
+            field_names = []
+            values = []
+            for field in opts.concrete_fields:
+                if field.attname in data:
+                    value = data[field.attname]
+                elif fallback_to_db:
+                    # Deferred, loaded from the database when accessed
+                    continue
+                else:
+                    value = field.get_default()
+                field_names.append(field.attname)
+                values.append(value)
+
+            instance = self._model.from_db(db, field_names, values)
+            instance.save = instance.delete = _refuse_write
+            instances.append(instance)
+        return instances
+
+
+class Search(DEDSearchMixin, DSLSearch):
+    def execute(self, ignore_cache=False):
+        """
+        Execute the search, reading the response from the search cache when
+        enabled with cache().
+        """
+        if ignore_cache or not self._cache_enabled or hasattr(self, '_response'):
+            return super(Search, self).execute(ignore_cache)
+
+        cache = get_search_cache()
+        key = self._get_cache_key(cache)
+        if key is None:
+            # The response may not include the last changes of the indices
+            return super(Search, self).execute(ignore_cache)
+
+        response = self._set_cached_response(cache.get(key))
+        if response is None:
+            response = super(Search, self).execute(ignore_cache)
+            cache.set(key, response.to_dict(), self._get_cache_timeout())
+        return response
+
+    def filter_queryset(self, queryset, keep_search_order=True):
+        """
+        Filter an existing django queryset using the elasticsearch result.
+        It costs a query to the sql db.
+
+        ``keep_search_order`` can also be the name of one of the
+        ``ordering_strategies``, it is chosen by get_ordering_strategy() when
+        True.
+        """
+        self._check_queryset_model(queryset)
+
+        s = self
+        # Do not query again if the es result is already cached
+        if not hasattr(self, '_response'):
+            # We only need the meta fields with the models ids
+            s = self.source(excludes=['*'])
+            s = s.execute()
+
+        pks = [result.meta.id for result in s]
+        return self._filter_queryset_by_pks(queryset, pks, keep_search_order)
+
     def to_queryset(self, keep_order=True):
         """
         Return a django queryset from the elasticsearch result.
@@ -56,3 +335,119 @@ class Search(DSLSearch):
         """
         qs = self._get_queryset()
         return self.filter_queryset(qs, keep_order)
+
+    def iterate_instances(self, chunk_size=1000, keep_alive='1m', queryset=None):
+        """
+        Yield the model instances of all the hits, in the order of the
+        search, with a memory use bounded by ``chunk_size``.
+
+        The hits are read by pages of ``chunk_size`` ids within a point in
+        time, each page costs a query to the sql db filtering ``queryset``
+        (all the instances of the model by default) on its ids.
+        """
+        if queryset is None:
+            queryset = self._get_queryset()
+        self._check_queryset_model(queryset)
+
+        with self._get_page_search(chunk_size).point_in_time(keep_alive) as s:
+            while True:
+                response = s.execute()
+                pks = [hit.meta.id for hit in response]
+                if pks:
+                    for instance in self._filter_queryset_by_pks(
+                            queryset, pks, 'python'):
+                        yield instance
+                if len(pks) < chunk_size:
+                    break
+                s = s.search_after()
+
+    def to_instances(self, fallback_to_db=False):
+        """
+        Return a list of model instances built from the ``_source`` of the
+        elasticsearch result, without querying the sql db. The instances can
+        not be saved or deleted.
+
+        The model fields missing from the documents are set to their default
+        value, or loaded from the sql db when accessed if ``fallback_to_db``
+        is True (a query per instance).
+        """
+        s = self
+        if not hasattr(self, '_response'):
+            s = self.execute()
+        return self._build_instances(s, fallback_to_db)
+
+
+class AsyncSearch(DEDSearchMixin, DSLAsyncSearch):
+    async def execute(self, ignore_cache=False):
+        """
+        Async counterpart of Search.execute().
+        """
+        if ignore_cache or not self._cache_enabled or hasattr(self, '_response'):
+            return await super(AsyncSearch, self).execute(ignore_cache)
+
+        cache = get_search_cache()
+        key = await self._aget_cache_key(cache)
+        if key is None:
+            # The response may not include the last changes of the indices
+            return await super(AsyncSearch, self).execute(ignore_cache)
+
+        response = self._set_cached_response(await cache.aget(key))
+        if response is None:
+            response = await super(AsyncSearch, self).execute(ignore_cache)
+            await cache.aset(key, response.to_dict(), self._get_cache_timeout())
+        return response
+
+    async def afilter_queryset(self, queryset, keep_search_order=True):
+        """
+        Async counterpart of Search.filter_queryset(), awaiting the
+        elasticsearch result. The returned queryset is not evaluated.
+        """
+        self._check_queryset_model(queryset)
+
+        s = self
+        # Do not query again if the es result is already cached
+        if not hasattr(self, '_response'):
+            # We only need the meta fields with the models ids
+            s = await self.source(excludes=['*']).execute()
+
+        pks = [result.meta.id for result in s]
+        return self._filter_queryset_by_pks(queryset, pks, keep_search_order)
+
+    async def ato_queryset(self, keep_order=True):
+        """
+        Async counterpart of Search.to_queryset().
+        """
+        qs = self._get_queryset()
+        return await self.afilter_queryset(qs, keep_order)
+
+    async def aiterate_instances(self, chunk_size=1000, keep_alive='1m', queryset=None):
+        """
+        Async counterpart of Search.iterate_instances(), an async generator.
+        """
+        if queryset is None:
+            queryset = self._get_queryset()
+        self._check_queryset_model(queryset)
+
+        page_search = self._get_page_search(chunk_size)
+        async with page_search.point_in_time(keep_alive) as s:
+            while True:
+                response = await s.execute()
+                pks = [hit.meta.id for hit in response]
+                if pks:
+                    instances = await sync_to_async(list)(
+                        self._filter_queryset_by_pks(queryset, pks, 'python')
+                    )
+                    for instance in instances:
+                        yield instance
+                if len(pks) < chunk_size:
+                    break
+                s = s.search_after()
+
+    async def ato_instances(self, fallback_to_db=False):
+        """
+        Async counterpart of Search.to_instances().
+        """
+        s = self
+        if not hasattr(self, '_response'):
+            s = await self.execute()
+        return self._build_instances(s, fallback_to_db)
@@ -0,0 +1,35 @@
+import django
+from django.utils.functional import Promise
+from elasticsearch.serializer import JsonSerializer
+
+if django.VERSION < (4, 0):
+    from django.utils.encoding import force_text as force_str
+else:
+    from django.utils.encoding import force_str
+
+
+class DjangoJsonSerializer(JsonSerializer):
+    """
+    JSON serializer also handling Django lazy objects (like lazy
+    translations).
+    """
+    def default(self, data):
+        if isinstance(data, Promise):
+            return force_str(data)
+        return super(DjangoJsonSerializer, self).default(data)
+
+
+try:
+    from elasticsearch.serializer import OrjsonSerializer as ESOrjsonSerializer
+except ImportError:
+    pass
+else:
+    class OrjsonSerializer(ESOrjsonSerializer):
+        """
+        Faster JSON serializer relying on the orjson package, also handling
+        Django lazy objects. Only available if orjson is installed.
+        """
+        def default(self, data):
+            if isinstance(data, Promise):
+                return force_str(data)
+            return super(OrjsonSerializer, self).default(data)
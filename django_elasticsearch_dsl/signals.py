@@ -6,15 +6,41 @@ cause things to index.
 
 from __future__ import absolute_import
 
-from django.db import models
+import atexit
+import logging
+import queue
+import threading
+import time
+import weakref
+from collections import defaultdict
+from functools import partial
+
+from django.db import close_old_connections, models, transaction
 from django.apps import apps
 from django.dispatch import Signal
-from .registries import registry
-from django.core.exceptions import ObjectDoesNotExist
+from .apps import DEDConfig
+from .cache import invalidate_search_cache
+from .registries import document_registered, registry
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from importlib import import_module
 # Sent after document indexing is completed
 post_index = Signal()
 
+
+def invalidate_index_searches(sender, instance, refresh=None, **kwargs):
+    """Forget the cached searches of the index of the indexed documents."""
+    delay = None
+    if refresh not in (True, 'true', 'wait_for'):
+        # The documents are searchable after the next refresh of the index
+        delay = DEDConfig.search_cache_refresh_delay()
+    invalidate_search_cache([instance._index._name], delay)
+
+
+post_index.connect(invalidate_index_searches)
+
+logger = logging.getLogger(__name__)
+
 class BaseSignalProcessor(object):
     """Base signal processor.
 
@@ -47,10 +73,27 @@ class BaseSignalProcessor(object):
         # Do nothing.
 
     def handle_m2m_changed(self, sender, instance, action, **kwargs):
-        if action in ('post_add', 'post_remove', 'post_clear'):
-            self.handle_save(sender, instance)
-        elif action in ('pre_remove', 'pre_clear'):
-            self.handle_pre_delete(sender, instance)
+        # With a pk_set, post_remove indexes both sides of the relation once
+        # the objects are removed, which pre_remove did for the related side.
+        if action in ('post_add', 'post_remove') and 'pk_set' in kwargs:
+            self.handle_m2m_pk_set(
+                sender, instance, kwargs['model'], kwargs['pk_set'],
+                reverse=kwargs.get('reverse', False), using=kwargs.get('using')
+            )
+        elif action in ('post_add', 'post_remove', 'post_clear'):
+            self.handle_save(sender, instance, using=kwargs.get('using'))
+        elif action == 'pre_clear' or (
+                action == 'pre_remove' and 'pk_set' not in kwargs):
+            self.handle_pre_delete(sender, instance, using=kwargs.get('using'))
+
+    def handle_m2m_pk_set(self, sender, instance, model, pk_set, reverse=False, **kwargs):
+        """Handle the objects added to or removed from a many to many relation.
+
+        Given the ``pk_set`` objects of ``model`` added to or removed from the
+        ``sender`` relation of ``instance``, update the documents using the
+        relation on either side.
+        """
+        registry.update_m2m(instance, model, pk_set, reverse, sender)
 
     def handle_save(self, sender, instance, **kwargs):
         """Handle save.
@@ -58,7 +101,7 @@ class BaseSignalProcessor(object):
         Given an individual model instance, update the object in the index.
         Update the related objects either.
         """
-        registry.update(instance)
+        registry.update(instance, update_fields=kwargs.get('update_fields'))
         registry.update_related(instance)
 
     def handle_pre_delete(self, sender, instance, **kwargs):
@@ -84,20 +127,522 @@ class RealTimeSignalProcessor(BaseSignalProcessor):
     """
 
     def setup(self):
-        # Listen to all model saves.
-        models.signals.post_save.connect(self.handle_save)
-        models.signals.post_delete.connect(self.handle_delete)
+        # Listen to the changes of the registered models only, and to the
+        # models of the documents registered later on.
+        self._senders = set()
+        self.connect_senders()
+        document_registered.connect(self.handle_document_registered)
+
+    def teardown(self):
+        document_registered.disconnect(self.handle_document_registered)
+        for sender in self._senders:
+            models.signals.post_save.disconnect(self.handle_save, sender=sender)
+            models.signals.post_delete.disconnect(self.handle_delete, sender=sender)
+            models.signals.m2m_changed.disconnect(self.handle_m2m_changed, sender=sender)
+            models.signals.pre_delete.disconnect(self.handle_pre_delete, sender=sender)
+        self._senders = set()
+
+    def connect_senders(self):
+        """Connect the handlers to the signals of the registered models."""
+        for sender in registry.get_signal_senders() - self._senders:
+            models.signals.post_save.connect(self.handle_save, sender=sender)
+            models.signals.post_delete.connect(self.handle_delete, sender=sender)
+
+            # Use to manage related objects update
+            models.signals.m2m_changed.connect(self.handle_m2m_changed, sender=sender)
+            models.signals.pre_delete.connect(self.handle_pre_delete, sender=sender)
+            self._senders.add(sender)
+
+    def handle_document_registered(self, sender, **kwargs):
+        self.connect_senders()
+
+
+def _get_related_objects(doc, instance):
+    """Return the objects of ``doc`` related to ``instance`` as a list."""
+    try:
+        related = doc().get_instances_from_related(instance)
+    except ObjectDoesNotExist:
+        related = None
+    if related is None:
+        return []
+    if isinstance(related, models.Model):
+        return [related]
+    return related
+
+
+def _get_indexed_objects(doc_instance, changes, pks):
+    """
+    Return the objects of ``pks`` read with the indexing queryset. The objects
+    get_queryset() does not return are indexed anyway, as
+    RealTimeSignalProcessor does: from their saved instance, or from their
+    row when there is none.
+    """
+    objects = list(doc_instance._get_indexing_base_queryset().filter(pk__in=pks))
+    missing = set(pks).difference(obj.pk for obj in objects)
+    unread = []
+    for pk in pks:
+        if pk in missing:
+            instance = changes[pk][1]
+            if instance is None:
+                unread.append(pk)
+            else:
+                objects.append(instance)
+    if unread:
+        model = doc_instance.django.model
+        objects.extend(model._base_manager.filter(pk__in=unread))
+    return objects
 
-        # Use to manage related objects update
-        models.signals.m2m_changed.connect(self.handle_m2m_changed)
-        models.signals.pre_delete.connect(self.handle_pre_delete)
+
+def _send_changes(documents, related):
+    """
+    Send coalesced changes, ``documents`` being ``{doc: {pk: (action,
+    instance)}}`` and ``related`` the saved instances whose related documents
+    must be indexed. The indexed objects are read from the database with one
+    query and sent with one bulk request by Document class.
+    """
+    for instance in related:
+        for doc in registry._get_related_doc(instance):
+            for obj in _get_related_objects(doc, instance):
+                documents[doc].setdefault(obj.pk, ('index', obj))
+
+    for doc, changes in documents.items():
+        pks = []
+        deleted = []
+        for pk, (action, instance) in changes.items():
+            if action == 'delete':
+                deleted.append(instance)
+            else:
+                pks.append(pk)
+
+        doc_instance = doc()
+        if pks:
+            doc_instance.update(_get_indexed_objects(doc_instance, changes, pks))
+        if deleted:
+            doc_instance.update(deleted, action='delete', raise_on_error=False)
+
+
+class _PendingChange(object):
+    """
+    Changes registered by a signal in a transaction, and the on_commit()
+    callback sending them. Django discards the callback when the savepoint
+    of the changes is rolled back, and calls it once they are committed.
+    """
+    # True once a change registered later is sure to be committed along with
+    # this one, and sends it.
+    covered = False
+
+    def __init__(self, processor, pending, savepoints):
+        self.processor = processor
+        self.pending = pending
+        self.savepoints = savepoints
+        # [(document, pk, action, instance)]
+        self.documents = []
+        # (action, instance) of the instance whose related documents are
+        # indexed on 'index', or no longer on 'delete'
+        self.related = None
+
+    def __call__(self):
+        self.pending.committed.append(self)
+        if not self.covered:
+            self.processor._flush(self.pending)
+
+
+class _PendingChanges(object):
+    """
+    The changes registered on a database connection, waiting for the commit
+    of their transaction. Only Django holds the callbacks of the changes until
+    they are committed, the changes it discards on a rollback are forgotten
+    along with them.
+    """
+
+    def __init__(self):
+        # The committed changes, in order, to send
+        self.committed = []
+        # Weak references to the changes whose callback has to send the
+        # committed changes
+        self.uncovered = []
+
+
+class TransactionSignalProcessor(RealTimeSignalProcessor):
+    """Transaction aware signal processor.
+
+    Collects the changes made in a transaction, and sends them once it is
+    committed, each document being indexed once from its final database row
+    with a bulk request by Document class. The changes made in a savepoint
+    which is rolled back are discarded. Outside of a transaction, the changes
+    are sent right away like RealTimeSignalProcessor.
+
+    Each change registers its own on_commit() callback, the callback of the
+    last change sends all of them. A change registered in a savepoint is only
+    sure to be committed along with the changes registered after it in the
+    enclosing savepoints, so the changes of sibling savepoints which are not
+    followed by a change in their parent are sent by one bulk request each.
+    """
+
+    def setup(self):
+        self._local = threading.local()
+        super(TransactionSignalProcessor, self).setup()
+
+    def _add_change(self, using):
+        """
+        Register a change on the commit of the transaction in progress on the
+        ``using`` database.
+        """
+        connection = transaction.get_connection(using)
+        pending_by_db = getattr(self._local, 'pending', None)
+        if pending_by_db is None:
+            pending_by_db = self._local.pending = {}
+        pending = pending_by_db.get(connection.alias)
+        if pending is None:
+            pending = pending_by_db[connection.alias] = _PendingChanges()
+
+        savepoints = tuple(connection.savepoint_ids)
+        change = _PendingChange(self, pending, savepoints)
+        # The callback of the new change runs after the callbacks of the
+        # changes made since its savepoint began, and whenever they run.
+        uncovered = pending.uncovered
+        while uncovered:
+            previous = uncovered[-1]()
+            if previous is not None:
+                if previous.savepoints[:len(savepoints)] != savepoints:
+                    break
+                previous.covered = True
+            uncovered.pop()
+        uncovered.append(weakref.ref(change))
+        transaction.on_commit(change, using=connection.alias)
+        return change
+
+    def _add_documents(self, instance, action, change):
+        for doc in registry.get_documents([instance.__class__]):
+            if not doc.django.ignore_signals:
+                change.documents.append((doc, instance.pk, action, instance))
+
+    def handle_save(self, sender, instance, **kwargs):
+        """Handle save.
+
+        Register the instance and its related objects to be indexed once
+        the transaction is committed.
+        """
+        connection = transaction.get_connection(kwargs.get('using'))
+        if not connection.in_atomic_block:
+            return super(TransactionSignalProcessor, self).handle_save(
+                sender, instance, **kwargs
+            )
+
+        if not DEDConfig.autosync_enabled() or instance.__class__ not in registry:
+            return
+        change = self._add_change(kwargs.get('using'))
+        self._add_documents(instance, 'index', change)
+        change.related = ('index', instance)
+
+    def handle_pre_delete(self, sender, instance, **kwargs):
+        """Handle removing of instance object from related models instance.
+
+        The related objects are selected before the delete, and indexed once
+        the transaction is committed, without the deleted instance.
+        """
+        connection = transaction.get_connection(kwargs.get('using'))
+        if not connection.in_atomic_block:
+            return super(TransactionSignalProcessor, self).handle_pre_delete(
+                sender, instance, **kwargs
+            )
+
+        if not DEDConfig.autosync_enabled():
+            return
+        change = self._add_change(kwargs.get('using'))
+        change.related = ('delete', instance)
+        for doc in registry._get_related_doc(instance):
+            for related in _get_related_objects(doc, instance):
+                change.documents.append((doc, related.pk, 'index', related))
+
+    def handle_m2m_pk_set(self, sender, instance, model, pk_set, reverse=False, **kwargs):
+        """Handle the objects added to or removed from a many to many relation.
+
+        Register the objects whose documents use the relation to be indexed
+        once the transaction is committed.
+        """
+        connection = transaction.get_connection(kwargs.get('using'))
+        if not connection.in_atomic_block:
+            return super(TransactionSignalProcessor, self).handle_m2m_pk_set(
+                sender, instance, model, pk_set, reverse=reverse, **kwargs
+            )
+
+        if not DEDConfig.autosync_enabled():
+            return
+        change = self._add_change(kwargs.get('using'))
+        for doc, objects in registry.get_m2m_changes(
+                instance, model, pk_set, reverse, sender):
+            for obj in objects:
+                change.documents.append((doc, obj.pk, 'index', obj))
+
+    def handle_delete(self, sender, instance, **kwargs):
+        """Handle delete.
+
+        Register the instance to be deleted from the index once the
+        transaction is committed.
+        """
+        connection = transaction.get_connection(kwargs.get('using'))
+        if not connection.in_atomic_block:
+            return super(TransactionSignalProcessor, self).handle_delete(
+                sender, instance, **kwargs
+            )
+
+        if DEDConfig.autosync_enabled():
+            self._add_documents(instance, 'delete', self._add_change(kwargs.get('using')))
+
+    def _flush(self, pending):
+        """
+        Send the committed changes, in the order they were made.
+        """
+        committed, pending.committed = pending.committed, []
+        documents = defaultdict(dict)
+        related = {}
+        for change in committed:
+            for doc, pk, action, instance in change.documents:
+                documents[doc][pk] = (action, instance)
+            if change.related is not None:
+                action, instance = change.related
+                key = (instance.__class__, instance.pk)
+                if action == 'index':
+                    related[key] = instance
+                else:
+                    related.pop(key, None)
+        self._send_committed(documents, list(related.values()))
+
+    def _send_committed(self, documents, related):
+        """
+        Send the committed ``documents`` changes, a ``{document: {pk:
+        (action, instance)}}`` dict, and the ``related`` instances whose
+        related documents are indexed, reading the rows of the indexed objects
+        once.
+        """
+        _send_changes(documents, related)
+
+
+class _Batch(object):
+    """
+    Changes drained from the queue of a BatchingSignalProcessor, coalesced
+    by document and object.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.started = time.monotonic()
+        # {document: {pk: (action, instance)}}
+        self.documents = defaultdict(dict)
+        # Saved instances whose related documents are indexed, {(model, pk): instance}
+        self.related = {}
+
+    def add(self, item):
+        if not self.size:
+            self.started = time.monotonic()
+        self.size += 1
+        action, instance = item[0], item[-1]
+        if action == 'index':
+            self.documents[item[1]][instance.pk] = ('index', instance)
+            return
+
+        key = (instance.__class__, instance.pk)
+        for doc in registry.get_documents([instance.__class__]):
+            if not doc.django.ignore_signals:
+                self.documents[doc][instance.pk] = (
+                    'delete' if action == 'delete' else 'index', instance
+                )
+        if action == 'delete':
+            self.related.pop(key, None)
+        else:
+            self.related[key] = instance
+
+
+class BatchingSignalProcessor(RealTimeSignalProcessor):
+    """Background batching signal processor.
+
+    Pushes the changes onto a bounded in-memory queue, drained by a
+    background thread which coalesces them and sends them with bulk
+    requests every ``ELASTICSEARCH_DSL_BATCH_SIZE`` changes or
+    ``ELASTICSEARCH_DSL_BATCH_INTERVAL`` seconds. The changes made in a
+    transaction are queued once it is committed, and the queue is flushed
+    when the process exits.
+
+    When the queue is full, ``ELASTICSEARCH_DSL_BATCH_QUEUE_FULL`` chooses
+    between waiting for room (``'block'``), sending the change from the
+    calling thread (``'sync'``) or keeping it aside, coalesced, until the
+    background thread picks it up (``'spill'``). The changes made from the
+    background thread, by a ``post_index`` receiver, are sent right away
+    rather than blocked, and at most as many objects as the queue holds are
+    kept aside, the others being sent right away too.
+    """
+    queue_full_policies = ('block', 'sync', 'spill')
+
+    def setup(self):
+        self.batch_size = DEDConfig.batch_size()
+        self.batch_interval = DEDConfig.batch_interval()
+        self.queue_full_policy = DEDConfig.batch_queue_full()
+        if self.queue_full_policy not in self.queue_full_policies:
+            raise ImproperlyConfigured(
+                "ELASTICSEARCH_DSL_BATCH_QUEUE_FULL must be one of {}".format(
+                    ", ".join(self.queue_full_policies)
+                )
+            )
+        self._queue = queue.Queue(maxsize=DEDConfig.batch_queue_size())
+        self._spilled = {}
+        self._lock = threading.Lock()
+        self._worker = None
+        self._stop = object()
+        atexit.register(self.stop)
+        super(BatchingSignalProcessor, self).setup()
 
     def teardown(self):
-        # Listen to all model saves.
-        models.signals.post_save.disconnect(self.handle_save)
-        models.signals.post_delete.disconnect(self.handle_delete)
-        models.signals.m2m_changed.disconnect(self.handle_m2m_changed)
-        models.signals.pre_delete.disconnect(self.handle_pre_delete)
+        super(BatchingSignalProcessor, self).teardown()
+        self.stop()
+
+    def handle_save(self, sender, instance, **kwargs):
+        """Handle save.
+
+        Queue the instance and its related objects to be indexed once the
+        transaction is committed.
+        """
+        if DEDConfig.autosync_enabled() and instance.__class__ in registry:
+            transaction.on_commit(
+                partial(self._put, ('save', instance)), using=kwargs.get('using')
+            )
+
+    def handle_pre_delete(self, sender, instance, **kwargs):
+        """Handle removing of instance object from related models instance.
+
+        The related objects are selected before the delete, and queued to be
+        indexed once the transaction is committed.
+        """
+        if not DEDConfig.autosync_enabled():
+            return
+        for doc in registry._get_related_doc(instance):
+            for related in _get_related_objects(doc, instance):
+                transaction.on_commit(
+                    partial(self._put, ('index', doc, related)),
+                    using=kwargs.get('using')
+                )
+
+    def handle_m2m_pk_set(self, sender, instance, model, pk_set, reverse=False, **kwargs):
+        """Handle the objects added to or removed from a many to many relation.
+
+        Queue the objects whose documents use the relation to be indexed once
+        the transaction is committed.
+        """
+        if not DEDConfig.autosync_enabled():
+            return
+        for doc, objects in registry.get_m2m_changes(
+                instance, model, pk_set, reverse, sender):
+            for obj in objects:
+                transaction.on_commit(
+                    partial(self._put, ('index', doc, obj)),
+                    using=kwargs.get('using')
+                )
+
+    def handle_delete(self, sender, instance, **kwargs):
+        """Handle delete.
+
+        Queue the instance to be deleted from the index once the transaction
+        is committed.
+        """
+        if DEDConfig.autosync_enabled() and instance.__class__ in registry:
+            transaction.on_commit(
+                partial(self._put, ('delete', instance)), using=kwargs.get('using')
+            )
+
+    def _put(self, item):
+        self._start()
+        # A change made by a post_index receiver runs on the background thread,
+        # which would wait for itself to make room in the queue
+        on_worker = threading.current_thread() is self._worker
+        if self.queue_full_policy == 'block' and not on_worker:
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.queue_full_policy != 'spill' or not self._spill(item):
+                batch = _Batch()
+                batch.add(item)
+                self._send(batch)
+
+    def _spill(self, item):
+        """
+        Keep the change aside until the background thread picks it up, unless
+        as many objects as the queue holds are already kept aside.
+        """
+        instance = item[-1]
+        key = item[:-1] + (instance.__class__, instance.pk)
+        with self._lock:
+            if key not in self._spilled and len(self._spilled) >= self._queue.maxsize:
+                return False
+            self._spilled[key] = item
+        return True
+
+    def _start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._work, name='ded-batching-signal-processor'
+                )
+                self._worker.daemon = True
+                self._worker.start()
+
+    def flush(self):
+        """Send the queued changes and wait for them to be sent."""
+        if self._worker is not None and self._worker.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+    def stop(self):
+        """Send the queued changes and stop the background thread."""
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None and worker.is_alive():
+            self._queue.put(self._stop)
+            worker.join()
+
+    def _pop_spilled(self):
+        with self._lock:
+            spilled, self._spilled = self._spilled, {}
+        return spilled.values()
+
+    def _work(self):
+        batch = _Batch()
+        while True:
+            timeout = None
+            if batch.size:
+                timeout = max(batch.started + self.batch_interval - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            for spilled in self._pop_spilled():
+                batch.add(spilled)
+
+            if item is not None and not isinstance(item, threading.Event) \
+                    and item is not self._stop:
+                batch.add(item)
+                if batch.size < self.batch_size:
+                    continue
+
+            self._send(batch)
+            batch = _Batch()
+            close_old_connections()
+            if item is self._stop:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _send(self, batch):
+        if not batch.size:
+            return
+        try:
+            _send_changes(batch.documents, batch.related.values())
+        except Exception:
+            # Keep the background thread alive
+            logger.exception("Failed to send %d changes to elasticsearch", batch.size)
+
 
 try:
     from celery import shared_task
@@ -137,6 +682,19 @@ else:
             """
             self.prepare_registry_delete_related_task(instance)
 
+        def handle_m2m_pk_set(self, sender, instance, model, pk_set, reverse=False, **kwargs):
+            """Handle the objects added to or removed from a many to many
+            relation with a Celery task.
+
+            The task updates the documents using the relation, see
+            ``DocumentRegistry.update_m2m``.
+            """
+            self.registry_update_m2m_task.delay(
+                instance.pk, instance._meta.app_label, instance.__class__.__name__,
+                list(pk_set or ()), model._meta.app_label, model.__name__,
+                reverse, sender._meta.app_label, sender.__name__
+            )
+
         def handle_delete(self, sender, instance, **kwargs):
             """Handle delete.
 
@@ -209,6 +767,23 @@ else:
                     model.objects.get(pk=pk)
                 )
 
+        @shared_task()
+        def registry_update_m2m_task(pk, app_label, model_name, pk_set,
+                                     related_app_label, related_model_name,
+                                     reverse, through_app_label, through_name):
+            """Handle the many to many update on the registry as a Celery task."""
+            try:
+                model = apps.get_model(app_label, model_name)
+                related_model = apps.get_model(related_app_label, related_model_name)
+                through = apps.get_model(through_app_label, through_name)
+            except LookupError:
+                pass
+            else:
+                registry.update_m2m(
+                    model.objects.get(pk=pk), related_model, set(pk_set),
+                    reverse, through
+                )
+
         @shared_task()
         def registry_update_related_task(pk, app_label, model_name):
             """Handle the related update on the registry as a Celery task."""
@@ -220,3 +795,139 @@ else:
                 registry.update_related(
                     model.objects.get(pk=pk)
                 )
+
+    def _get_lock_cache():
+        alias = DEDConfig.celery_lock_cache_alias()
+        return caches[alias] if alias else None
+
+    def _get_lock_key(model, pk):
+        return 'ded:queued:{}.{}:{}'.format(
+            model._meta.app_label, model.__name__, pk
+        )
+
+    class BatchedCelerySignalProcessor(TransactionSignalProcessor):
+        """Batched Celery signal processor.
+
+        Collects the objects saved in a transaction and, once it is committed,
+        queues one Celery task by model with the list of their primary keys.
+        The task reads the rows with one query and sends them with one bulk
+        request by Document class, along with their related documents.
+
+        When ``ELASTICSEARCH_DSL_CELERY_LOCK_CACHE`` names a cache shared with
+        the workers, an object already waiting in a task is not queued again.
+
+        Deletes are sent on commit from the calling process, like the
+        ``TransactionSignalProcessor`` does.
+        """
+
+        def handle_save(self, sender, instance, **kwargs):
+            """Handle save.
+
+            Outside of a transaction the instance is queued right away.
+            """
+            connection = transaction.get_connection(kwargs.get('using'))
+            if connection.in_atomic_block:
+                return super(BatchedCelerySignalProcessor, self).handle_save(
+                    sender, instance, **kwargs
+                )
+
+            if DEDConfig.autosync_enabled() and instance.__class__ in registry:
+                self.queue_updates({instance.__class__: {instance.pk}})
+
+        def handle_pre_delete(self, sender, instance, **kwargs):
+            """Handle removing of instance object from related models instance.
+
+            Outside of a transaction the related objects are queued right away.
+            """
+            connection = transaction.get_connection(kwargs.get('using'))
+            if connection.in_atomic_block:
+                return super(BatchedCelerySignalProcessor, self).handle_pre_delete(
+                    sender, instance, **kwargs
+                )
+
+            if not DEDConfig.autosync_enabled():
+                return
+            pks = defaultdict(set)
+            for doc in registry._get_related_doc(instance):
+                for related in _get_related_objects(doc, instance):
+                    pks[related.__class__].add(related.pk)
+            self.queue_updates(pks)
+
+        def handle_m2m_pk_set(self, sender, instance, model, pk_set, reverse=False, **kwargs):
+            """Handle the objects added to or removed from a many to many relation.
+
+            Outside of a transaction the objects whose documents use the
+            relation are queued right away.
+            """
+            connection = transaction.get_connection(kwargs.get('using'))
+            if connection.in_atomic_block:
+                return super(BatchedCelerySignalProcessor, self).handle_m2m_pk_set(
+                    sender, instance, model, pk_set, reverse=reverse, **kwargs
+                )
+
+            if not DEDConfig.autosync_enabled():
+                return
+            pks = defaultdict(set)
+            for doc, objects in registry.get_m2m_changes(
+                    instance, model, pk_set, reverse, sender):
+                for obj in objects:
+                    pks[obj.__class__].add(obj.pk)
+            self.queue_updates(pks)
+
+        def _send_committed(self, documents, related):
+            """Send the committed deletes and queue the committed updates."""
+            pks = defaultdict(set)
+            deleted = defaultdict(list)
+            for doc, changes in documents.items():
+                for pk, (action, instance) in changes.items():
+                    if action == 'delete':
+                        deleted[doc].append(instance)
+                    else:
+                        pks[instance.__class__].add(pk)
+            for instance in related:
+                pks[instance.__class__].add(instance.pk)
+
+            for doc, instances in deleted.items():
+                doc().update(instances, action='delete', raise_on_error=False)
+            self.queue_updates(pks)
+
+        def queue_updates(self, pks):
+            """
+            Queue a task by model of ``pks``, a ``{model: pks}`` dict, skipping
+            the objects already waiting in a task.
+            """
+            cache = _get_lock_cache()
+            timeout = DEDConfig.celery_lock_timeout()
+            for model, model_pks in pks.items():
+                if cache is not None:
+                    model_pks = [
+                        pk for pk in model_pks
+                        if cache.add(_get_lock_key(model, pk), 1, timeout)
+                    ]
+                if model_pks:
+                    self.registry_update_batch_task.delay(
+                        list(model_pks), model._meta.app_label, model.__name__
+                    )
+
+        @shared_task()
+        def registry_update_batch_task(pks, app_label, model_name):
+            """Handle the update of a list of objects as a Celery task."""
+            try:
+                model = apps.get_model(app_label, model_name)
+            except LookupError:
+                return
+
+            cache = _get_lock_cache()
+            if cache is not None:
+                # Released before reading the rows, so a change committed
+                # meanwhile is queued again
+                cache.delete_many([_get_lock_key(model, pk) for pk in pks])
+
+            documents = defaultdict(dict)
+            for doc in registry.get_documents([model]):
+                if not doc.django.ignore_signals:
+                    documents[doc] = {pk: ('index', None) for pk in pks}
+            related = []
+            if model in registry._related_models:
+                related = model._default_manager.filter(pk__in=pks)
+            _send_changes(documents, related)
@@ -68,5 +68,6 @@ setup(
     ],
     extras_require={
         'celery':  ["celery>=5.5.3"],
+        'async': ["elasticsearch[async]>=9.0.0,<10.0.0"],
     }
 )
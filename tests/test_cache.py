@@ -0,0 +1,118 @@
+from unittest import TestCase
+
+from django.test import override_settings
+from mock import patch
+
+from django_elasticsearch_dsl.cache import (
+    LocalCache,
+    document_hash,
+    get_hash_cache,
+    get_hash_key_prefix,
+    get_search_cache,
+    get_search_cache_key,
+    invalidate_search_cache,
+    reset_index_hashes,
+)
+
+
+class LocalCacheTestCase(TestCase):
+    def test_get_set(self):
+        cache = LocalCache()
+        cache.set('a', 1)
+        cache.set_many({'b': 2, 'c': 3})
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('d', 4), 4)
+        self.assertEqual(cache.get_many(['a', 'c', 'd']), {'a': 1, 'c': 3})
+
+        cache.delete_many(['a', 'd'])
+        self.assertIsNone(cache.get('a'))
+
+    def test_least_recently_used_evicted(self):
+        cache = LocalCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    @patch('django_elasticsearch_dsl.cache.time.monotonic')
+    def test_timeout(self, monotonic):
+        monotonic.return_value = 100
+        cache = LocalCache()
+        cache.set('a', 1, 10)
+        cache.set('b', 2)
+        monotonic.return_value = 109
+        self.assertEqual(cache.get('a'), 1)
+        monotonic.return_value = 110
+        self.assertEqual(cache.get_many(['a', 'b']), {'b': 2})
+
+
+class HashCacheTestCase(TestCase):
+    def test_document_hash(self):
+        self.assertEqual(
+            document_hash({'name': 'Type 57', 'price': 5400000.0}),
+            document_hash({'price': 5400000.0, 'name': 'Type 57'}),
+        )
+        self.assertNotEqual(
+            document_hash({'name': 'Type 57'}),
+            document_hash({'name': 'Type 42'}),
+        )
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'indexing': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }, ELASTICSEARCH_DSL_HASH_CACHE='indexing')
+    def test_django_cache(self):
+        from django.core.cache import caches
+        self.assertIs(get_hash_cache(), caches['indexing'])
+
+    def test_reset_index_hashes(self):
+        with patch('django_elasticsearch_dsl.cache.local_hash_cache', LocalCache()):
+            cache = get_hash_cache()
+            prefix = get_hash_key_prefix(cache, 'cars')
+            reset_index_hashes('cars')
+            self.assertNotEqual(get_hash_key_prefix(cache, 'cars'), prefix)
+            self.assertEqual(
+                get_hash_key_prefix(cache, 'manufacturers'),
+                get_hash_key_prefix(LocalCache(), 'manufacturers')
+            )
+
+
+class SearchCacheTestCase(TestCase):
+    def test_search_cache_key(self):
+        cache = LocalCache()
+        key = get_search_cache_key(cache, ['cars'], {'query': {'match_all': {}}})
+        self.assertEqual(
+            key, get_search_cache_key(cache, ['cars'], {'query': {'match_all': {}}})
+        )
+        self.assertNotEqual(
+            key, get_search_cache_key(cache, ['ads'], {'query': {'match_all': {}}})
+        )
+
+    def test_invalidate_search_cache(self):
+        cache = get_search_cache()
+        data = {'size': 10}
+        cars_key = get_search_cache_key(cache, ['cars'], data)
+        both_key = get_search_cache_key(cache, ['cars', 'ads'], data)
+        ads_key = get_search_cache_key(cache, ['ads'], data)
+
+        invalidate_search_cache(['cars'])
+        self.assertNotEqual(cars_key, get_search_cache_key(cache, ['cars'], data))
+        self.assertNotEqual(both_key, get_search_cache_key(cache, ['cars', 'ads'], data))
+        self.assertEqual(ads_key, get_search_cache_key(cache, ['ads'], data))
+
+    @patch('django_elasticsearch_dsl.cache.time.time')
+    def test_invalidate_search_cache_delay(self, now):
+        now.return_value = 1000.0
+        cache = get_search_cache()
+        data = {'size': 10}
+        ads_key = get_search_cache_key(cache, ['ads'], data)
+
+        invalidate_search_cache(['cars'], delay=2)
+        # The changes may not be searchable yet
+        self.assertIsNone(get_search_cache_key(cache, ['cars'], data))
+        self.assertIsNone(get_search_cache_key(cache, ['cars', 'ads'], data))
+        self.assertEqual(ads_key, get_search_cache_key(cache, ['ads'], data))
+
+        now.return_value = 1002.5
+        self.assertIsNotNone(get_search_cache_key(cache, ['cars'], data))
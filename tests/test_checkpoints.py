@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from django.core.cache import caches
+from django.test import override_settings
+
+from django_elasticsearch_dsl.checkpoints import (
+    CacheCheckpointStore,
+    FileCheckpointStore,
+    get_checkpoint_store,
+)
+
+
+class FileCheckpointStoreTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'checkpoints.json')
+
+    def test_get_set_delete(self):
+        store = FileCheckpointStore(self.path)
+        self.assertIsNone(store.get('tests.documents.CarDocument'))
+
+        store.set('tests.documents.CarDocument', {'index': 'cars', 'last_pk': 42})
+        store.set('tests.documents.AdDocument', {'index': 'ads', 'last_pk': 7})
+        # Read back by another store, as by the next run of the command
+        store = FileCheckpointStore(self.path)
+        self.assertEqual(
+            store.get('tests.documents.CarDocument'),
+            {'index': 'cars', 'last_pk': 42}
+        )
+
+        store.delete('tests.documents.CarDocument')
+        self.assertIsNone(store.get('tests.documents.CarDocument'))
+        self.assertEqual(
+            store.get('tests.documents.AdDocument'),
+            {'index': 'ads', 'last_pk': 7}
+        )
+
+    def test_invalid_file(self):
+        with open(self.path, 'w') as checkpoints_file:
+            checkpoints_file.write('{"tests.documents.CarDocument": ')
+        self.assertIsNone(FileCheckpointStore(self.path).get('tests.documents.CarDocument'))
+
+
+class CheckpointStoreTestCase(TestCase):
+    @override_settings(ELASTICSEARCH_DSL_CHECKPOINT_FILE='/tmp/checkpoints.json')
+    def test_file_store(self):
+        store = get_checkpoint_store()
+        self.assertIsInstance(store, FileCheckpointStore)
+        self.assertEqual(store.path, '/tmp/checkpoints.json')
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        'checkpoints': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }, ELASTICSEARCH_DSL_CHECKPOINT_CACHE='checkpoints')
+    def test_cache_store(self):
+        store = get_checkpoint_store()
+        self.assertIsInstance(store, CacheCheckpointStore)
+        self.assertIs(store.cache, caches['checkpoints'])
+
+        store.set('tests.documents.CarDocument', {'index': 'cars', 'last_pk': 42})
+        self.assertEqual(
+            store.get('tests.documents.CarDocument'),
+            {'index': 'cars', 'last_pk': 42}
+        )
+        store.delete('tests.documents.CarDocument')
+        self.assertIsNone(store.get('tests.documents.CarDocument'))
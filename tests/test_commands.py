@@ -1,4 +1,8 @@
-from mock import DEFAULT, Mock, patch
+import os
+import shutil
+import tempfile
+
+from mock import DEFAULT, MagicMock, Mock, call, patch
 from unittest import TestCase
 
 from django.core.management.base import CommandError
@@ -6,7 +10,14 @@ from django.core.management import call_command
 from six import StringIO
 
 from django_elasticsearch_dsl import Index
-from django_elasticsearch_dsl.management.commands.search_index import Command
+from django_elasticsearch_dsl.checkpoints import FileCheckpointStore
+from django_elasticsearch_dsl.documents import DEDDocumentMixin
+from django_elasticsearch_dsl.management.commands.search_index import (
+    Command,
+    _get_label,
+    _get_pk_ranges,
+    _populate_pk_range,
+)
 from django_elasticsearch_dsl.registries import DocumentRegistry
 
 from .fixtures import WithFixturesMixin
@@ -123,6 +134,25 @@ class SearchIndexTestCase(WithFixturesMixin, TestCase):
         assert self.doc_c1.get_queryset.call_count == 2
         self.doc_c1.update.assert_called_once_with(self.doc_c1_qs.iterator(), **expected_kwargs)
 
+    def test_populate_overridden_update(self):
+        # The update() of the fixtures is a Mock, it does not return stats
+        options = {'parallel': False, 'refresh': None, 'count': False,
+                   'raise_on_error': False}
+        Command(stdout=self.out)._populate([self.ModelC], options)
+        self.doc_c1.update.assert_called_once_with(
+            self.doc_c1_qs.iterator(), parallel=False, refresh=None,
+            raise_on_error=False
+        )
+        self.assertIn("Indexed 'ModelC' objects in", self.out.getvalue())
+
+    def test_update_kwargs(self):
+        options = {'parallel': False, 'refresh': None, 'raise_on_error': True}
+        with patch.object(self.doc_a1, 'update', DEDDocumentMixin.update):
+            self.assertEqual(Command()._get_update_kwargs(self.doc_a1, options), {
+                'parallel': False, 'refresh': None, 'skip_unchanged': False,
+                'stats_only': True, 'raise_on_error': True,
+            })
+
     def test_populate_all_doc_type_refresh(self):
         call_command('search_index', stdout=self.out, action='populate', refresh=True)
         expected_kwargs = {'parallel': False, 'refresh': True}
@@ -152,3 +182,244 @@ class SearchIndexTestCase(WithFixturesMixin, TestCase):
             handles['_delete'].assert_called()
             handles['_create'].assert_not_called()
             handles['_populate'].assert_not_called()
+
+    def test_populate_with_workers(self):
+        class InlineExecutor(object):
+            def __init__(self, **kwargs):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def map(self, fn, *iterables):
+                return map(fn, *iterables)
+
+        module = 'django_elasticsearch_dsl.management.commands.search_index'
+        # The index renamed by a rebuild with '--use-alias'
+        self.index_b._name = 'bar-20260101000000000000'
+        options = {'parallel': False, 'refresh': None, 'workers': 2,
+                   'count': False}
+        with patch(module + '.ProcessPoolExecutor', InlineExecutor), \
+                patch(module + '._get_pk_ranges',
+                      return_value=[(1, 5), (5, None)]), \
+                patch(module + '._populate_pk_range',
+                      side_effect=[(4, 0), (3, 1)]) as populate_pk_range:
+            Command(stdout=self.out)._populate_with_workers(
+                [self.ModelC], options
+            )
+
+        update_kwargs = Command()._get_update_kwargs(self.doc_c1, options)
+        label = _get_label(self.doc_c1)
+        self.assertEqual(populate_pk_range.call_args_list, [
+            call(label, 'bar-20260101000000000000', (1, 5), update_kwargs),
+            call(label, 'bar-20260101000000000000', (5, None), update_kwargs),
+        ])
+        self.assertIn("Indexed 7 'ModelC' objects", self.out.getvalue())
+        self.assertIn("1 failed", self.out.getvalue())
+
+    def test_populate_pk_range_sets_index_name(self):
+        index_names = []
+        self.doc_c1.update.side_effect = (
+            lambda qs, **kwargs: index_names.append(self.doc_c1._index._name)
+            or (2, 0)
+        )
+        with patch(
+            'django_elasticsearch_dsl.management.commands.search_index._get_document',
+            return_value=self.doc_c1
+        ):
+            response = _populate_pk_range(
+                _get_label(self.doc_c1), 'bar-20260101000000000000',
+                (1, None), {'refresh': None}
+            )
+
+        self.assertEqual(response, (2, 0))
+        self.assertEqual(index_names, ['bar-20260101000000000000'])
+        self.doc_c1_qs.filter.assert_called_once_with(pk__gte=1)
+
+
+class ResumeTestCase(WithFixturesMixin, TestCase):
+    def setUp(self):
+        self.out = StringIO()
+        self.registry = DocumentRegistry()
+        self.index = Index('bar')
+        self.doc = self._generate_doc_mock(self.ModelC, self.index)
+        self.label = _get_label(self.doc)
+        self.chunks = patch.object(
+            self.doc, 'get_indexing_chunks',
+            return_value=iter([(7, ['a', 'b']), (9, ['c'])])
+        ).start()
+        patch(
+            'django_elasticsearch_dsl.management.commands.search_index.registry',
+            self.registry
+        ).start()
+        patch.object(self.index, 'create').start()
+        patch.object(self.index, 'delete').start()
+        self.addCleanup(patch.stopall)
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.checkpoints = FileCheckpointStore(
+            os.path.join(tmp_dir, 'checkpoints.json')
+        )
+
+        self.cmd = Command(stdout=self.out)
+        self.cmd.es_conn = Mock()
+        self.cmd.es_conn.indices.get_alias.return_value = {}
+        self.options = {
+            'models': None, 'parallel': False, 'refresh': None, 'workers': 1,
+            'count': False, 'force': True, 'use_alias': False,
+            'use_alias_keep_index': False, 'raise_on_error': True,
+        }
+
+    def _handle(self, action, **options):
+        with patch(
+            'django_elasticsearch_dsl.management.commands.search_index.'
+            'get_checkpoint_store',
+            return_value=self.checkpoints
+        ):
+            self.cmd.handle(action=action, **dict(self.options, **options))
+
+    def test_workers_need_settings_module(self):
+        # The test settings are given to settings.configure()
+        with self.assertRaises(CommandError):
+            self._handle('populate', workers=2)
+        self.doc.update.assert_not_called()
+
+    def test_populate_resume_after_checkpoint(self):
+        self.checkpoints.set(self.label, {'index': 'bar', 'last_pk': 5})
+        recorded = []
+        self.doc.update.side_effect = lambda chunk, **kwargs: (
+            recorded.append(self.checkpoints.get(self.label)) or (len(chunk), 0)
+        )
+        self.cmd.checkpoints = self.checkpoints
+        self.cmd._populate([self.ModelC], self.options)
+
+        self.chunks.assert_called_once_with(after_pk=5)
+        self.assertEqual(
+            [update_call[0][0] for update_call in self.doc.update.call_args_list],
+            [['a', 'b'], ['c']]
+        )
+        # The checkpoint is moved forward once each chunk is indexed
+        self.assertEqual(recorded, [
+            {'index': 'bar', 'last_pk': 5},
+            {'index': 'bar', 'last_pk': 7},
+        ])
+        self.assertEqual(
+            self.checkpoints.get(self.label),
+            {'index': 'bar', 'last_pk': 9, 'done': True}
+        )
+        self.assertIn("Indexed 3 'ModelC' objects", self.out.getvalue())
+
+    def test_populate_resume_done(self):
+        self.checkpoints.set(
+            self.label, {'index': 'bar', 'last_pk': 9, 'done': True}
+        )
+        self.cmd.checkpoints = self.checkpoints
+        self.cmd._populate([self.ModelC], self.options)
+
+        self.assertFalse(self.doc.update.called)
+        self.assertIn("'ModelC' objects are already indexed", self.out.getvalue())
+
+    def test_populate_resume_other_index(self):
+        self.checkpoints.set(self.label, {'index': 'bar-old', 'last_pk': 5})
+        self.cmd.checkpoints = self.checkpoints
+        self.cmd._populate([self.ModelC], self.options)
+
+        self.chunks.assert_called_once_with(after_pk=None)
+
+    def test_populate_resume_clears_checkpoints(self):
+        self.checkpoints.set(self.label, {'index': 'bar', 'last_pk': 5})
+        self._handle('populate', resume=True)
+
+        self.chunks.assert_called_once_with(after_pk=5)
+        self.assertIsNone(self.checkpoints.get(self.label))
+
+    def test_rebuild_resume(self):
+        self.checkpoints.set(self.label, {'index': 'bar', 'last_pk': 5})
+        self.cmd.es_conn.indices.exists.return_value = True
+        self._handle('rebuild', resume=True)
+
+        # The index being populated is neither deleted nor created again
+        self.assertFalse(self.index.delete.called)
+        self.assertFalse(self.index.create.called)
+        self.assertIn("Resuming index 'bar'", self.out.getvalue())
+        self.chunks.assert_called_once_with(after_pk=5)
+        self.assertIsNone(self.checkpoints.get(self.label))
+
+    def test_rebuild_resume_use_alias(self):
+        self.checkpoints.set(
+            self.label, {'index': 'bar-20260101000000000000', 'last_pk': 5}
+        )
+        self.cmd.es_conn.indices.exists.return_value = True
+        self.cmd.es_conn.indices.get_alias.side_effect = lambda name=None: (
+            {'bar-20250101000000000000': {}} if name
+            else {'bar-20250101000000000000': {'aliases': {'bar': {}}}}
+        )
+        self._handle('rebuild', resume=True, use_alias=True)
+
+        # The new index of the interrupted rebuild is populated and aliased
+        self.assertFalse(self.index.create.called)
+        self.assertEqual(self.index._name, 'bar-20260101000000000000')
+        self.chunks.assert_called_once_with(after_pk=5)
+        self.assertEqual(
+            self.cmd.es_conn.indices.update_aliases.call_args_list[0][1]['actions'],
+            [
+                {'add': {'alias': 'bar', 'index': 'bar-20260101000000000000'}},
+                {'remove': {'alias': 'bar',
+                            'indices': ['bar-20250101000000000000']}},
+            ]
+        )
+        self.assertIsNone(self.checkpoints.get(self.label))
+
+    def test_rebuild_resume_missing_index(self):
+        self.checkpoints.set(self.label, {'index': 'bar', 'last_pk': 5})
+        self.cmd.es_conn.indices.exists.return_value = False
+        self._handle('rebuild', resume=True)
+
+        self.index.delete.assert_called_once()
+        self.index.create.assert_called_once()
+        self.chunks.assert_called_once_with(after_pk=None)
+
+    def test_run_without_resume_clears_checkpoints(self):
+        self.checkpoints.set(
+            self.label, {'index': 'bar', 'last_pk': 9, 'done': True}
+        )
+        self._handle('rebuild', resume=False)
+        self.assertIsNone(self.checkpoints.get(self.label))
+        self.doc.update.assert_called_once()
+
+        # A later run with '--resume' indexes the objects again
+        self._handle('populate', resume=True)
+        self.chunks.assert_called_once_with(after_pk=None)
+
+
+class PkRangesTestCase(TestCase):
+    def _mock_queryset(self, pks):
+        pks_qs = MagicMock()
+        pks_qs.count.return_value = len(pks)
+        pks_qs.iterator.side_effect = lambda chunk_size: iter(pks)
+        qs = Mock()
+        qs.order_by.return_value.values_list.return_value = pks_qs
+        return qs
+
+    def test_get_pk_ranges(self):
+        qs = self._mock_queryset([1, 2, 5, 8, 9, 12, 13])
+        self.assertEqual(
+            _get_pk_ranges(qs, 3), [(1, 8), (8, 13), (13, None)]
+        )
+        self.assertEqual(_get_pk_ranges(qs, 1), [(1, None)])
+
+    def test_get_pk_ranges_single_pass(self):
+        qs = self._mock_queryset(list(range(1, 101)))
+        self.assertEqual(
+            _get_pk_ranges(qs, 4), [(1, 26), (26, 51), (51, 76), (76, None)]
+        )
+        pks_qs = qs.order_by.return_value.values_list.return_value
+        pks_qs.iterator.assert_called_once_with(chunk_size=2000)
+        pks_qs.__getitem__.assert_not_called()
+
+    def test_get_pk_ranges_empty(self):
+        self.assertEqual(_get_pk_ranges(self._mock_queryset([]), 4), [])
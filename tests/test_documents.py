@@ -1,8 +1,15 @@
+import asyncio
 import json
+from datetime import date
+from decimal import Decimal
 from unittest import SkipTest, TestCase
 
 import django
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
 from django.db import models
+from django.db.models import Prefetch
+from django.test import override_settings
 
 if django.VERSION < (4, 0):
     from django.utils.translation import ugettext_lazy as _
@@ -10,18 +17,27 @@ else:
     from django.utils.translation import gettext_lazy as _
 
 from elasticsearch.dsl import GeoPoint, InnerDoc
+from elasticsearch.dsl.connections import connections
+from elasticsearch.helpers import BulkIndexError
 from mock import Mock, patch
 
 from django_elasticsearch_dsl import fields
-from django_elasticsearch_dsl.documents import DocType
+from django_elasticsearch_dsl.documents import AsyncDocument, DocType
 from django_elasticsearch_dsl.exceptions import (
     ModelFieldNotMappedError,
     RedeclaredFieldError,
 )
 from django_elasticsearch_dsl.registries import registry
+from django_elasticsearch_dsl.search import AsyncSearch
 from tests import ES_MAJOR_VERSION
 
-from .models import Article
+from .models import Ad, Article
+from .models import Car as TestCar
+
+HASH_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    'indexing': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}
 
 
 class Car(models.Model):
@@ -401,6 +417,498 @@ class BaseDocTypeTestCase(object):
             self.assertEqual(mock_bulk.call_count, 0, "bulk is not called")
             self.assertEqual(mock_parallel_bulk.call_count, 1, "parallel bulk is called")
 
+    def test_parallel_bulk_response(self):
+        results = [
+            (True, {'index': {'_id': 1}}),
+            (False, {'index': {'_id': 2, 'status': 400}}),
+            (True, {'index': {'_id': 3}}),
+            (False, {'index': {'_id': 4, 'status': 400}}),
+        ]
+        doc = CarDocument()
+        with patch('django_elasticsearch_dsl.documents.parallel_bulk',
+                   return_value=iter(results)):
+            self.assertEqual(
+                doc.parallel_bulk([], max_errors=1),
+                (2, [{'index': {'_id': 2, 'status': 400}}])
+            )
+
+        with patch('django_elasticsearch_dsl.documents.parallel_bulk',
+                   return_value=iter(results)):
+            self.assertEqual(doc.parallel_bulk([], stats_only=True), (2, 2))
+
+        errors = []
+        with patch('django_elasticsearch_dsl.documents.parallel_bulk',
+                   return_value=iter(results)):
+            self.assertEqual(
+                doc.parallel_bulk([], error_callback=errors.append), (2, [])
+            )
+        self.assertEqual([error['index']['_id'] for error in errors], [2, 4])
+
+    def test_get_indexing_queryset_pk_range(self):
+        doc = CarDocument()
+        qs = Mock()
+        with patch.object(CarDocument, 'get_queryset', return_value=qs):
+            doc.get_indexing_queryset(pk_range=(10, 20))
+            qs.filter.assert_called_once_with(pk__gte=10)
+            qs.filter.return_value.filter.assert_called_once_with(pk__lt=20)
+
+            qs.reset_mock()
+            doc.get_indexing_queryset(pk_range=(20, None))
+            qs.filter.assert_called_once_with(pk__gte=20)
+            self.assertFalse(qs.filter.return_value.filter.called)
+
+    def test_get_indexing_chunks(self):
+        class Queryset(object):
+            def __init__(self, objects):
+                self.objects = objects
+                self.queries = 0
+
+            def order_by(self, *fields):
+                return self
+
+            def filter(self, pk__gt):
+                queryset = Queryset([car for car in self.objects if car.pk > pk__gt])
+                self.queries += 1
+                return queryset
+
+            def __getitem__(self, item):
+                return self.objects[item]
+
+        cars = [Car(pk=pk) for pk in (1, 3, 4, 7, 8)]
+        qs = Queryset(cars)
+        doc = CarDocument()
+        with patch.object(CarDocument, '_get_indexing_base_queryset', return_value=qs), \
+                patch.object(doc.django, 'queryset_pagination', 2):
+            self.assertEqual(
+                list(doc.get_indexing_chunks()),
+                [(3, cars[:2]), (7, cars[2:4]), (8, cars[4:])]
+            )
+            self.assertEqual(qs.queries, 2)
+            self.assertEqual(
+                list(doc.get_indexing_chunks(after_pk=4)),
+                [(8, cars[3:])]
+            )
+
+            with patch.object(doc.django, 'keyset_pagination', True):
+                self.assertEqual(list(doc.get_indexing_queryset()), cars)
+
+    def test_related_lookups_derived_from_fields(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            manufacturer = fields.ObjectField(properties={
+                'name': fields.TextField(),
+                'country': fields.TextField(),
+            })
+            ads = fields.NestedField(properties={
+                'title': fields.TextField(),
+                'car_name': fields.TextField(attr='car.manufacturer.name'),
+            })
+            category_titles = fields.TextField(multi=True)
+
+            class Django:
+                model = TestCar
+                fields = ['name']
+
+            def prepare_category_titles(self, instance):
+                return [category.title for category in instance.categories.all()]
+
+        self.assertEqual(CarDocument2.django.select_related, ['manufacturer'])
+        self.assertEqual(len(CarDocument2.django.prefetch_related), 1)
+        prefetch = CarDocument2.django.prefetch_related[0]
+        self.assertEqual(prefetch.prefetch_through, 'ads')
+        self.assertEqual(prefetch.queryset.model, Ad)
+        self.assertEqual(
+            prefetch.queryset.query.select_related,
+            {'car': {'manufacturer': {}}}
+        )
+
+    def test_related_lookups_override(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            categories = fields.NestedField(properties={
+                'title': fields.TextField(),
+            })
+
+            class Django:
+                model = TestCar
+                select_related = ['manufacturer']
+                prefetch_related = []
+
+        self.assertEqual(CarDocument2.django.select_related, ['manufacturer'])
+        self.assertEqual(CarDocument2.django.prefetch_related, [])
+
+    def test_get_indexing_queryset_related_lookups(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            categories = fields.NestedField(properties={
+                'title': fields.TextField(),
+            })
+
+            class Django:
+                model = TestCar
+
+        qs = Mock(_prefetch_related_lookups=())
+        with patch.object(CarDocument2, 'get_queryset', return_value=qs):
+            CarDocument2().get_indexing_queryset()
+
+        qs.prefetch_related.assert_called_once_with('categories')
+        qs.prefetch_related().iterator.assert_called_once_with(chunk_size=2000)
+
+    def test_get_indexing_queryset_lookups_of_get_queryset(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            manufacturer = fields.ObjectField(properties={
+                'name': fields.TextField(),
+            })
+            ads = fields.NestedField(properties={
+                'car_name': fields.TextField(attr='car.manufacturer.name'),
+            })
+            categories = fields.NestedField(properties={
+                'title': fields.TextField(),
+            })
+
+            class Django:
+                model = TestCar
+
+            def get_queryset(self):
+                return TestCar.objects.select_related().prefetch_related(
+                    'ads__car', Prefetch('categories')
+                )
+
+        # The derived lookups would conflict with the ones of get_queryset
+        self.assertEqual(CarDocument2.django.select_related, ['manufacturer'])
+        self.assertEqual(
+            [getattr(lookup, 'prefetch_to', lookup)
+             for lookup in CarDocument2.django.prefetch_related],
+            ['ads', 'categories']
+        )
+        qs = CarDocument2()._get_indexing_base_queryset()
+        self.assertIs(qs.query.select_related, True)
+        self.assertEqual(
+            [getattr(lookup, 'prefetch_to', lookup)
+             for lookup in qs._prefetch_related_lookups],
+            ['ads__car', 'categories']
+        )
+
+    def test_prepare_batch(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            color = fields.TextField()
+            rank = fields.IntegerField()
+
+            class Django:
+                model = Car
+                fields = ['name']
+                queryset_pagination = 2
+
+            def prepare_chunk(self, instances):
+                return {car.pk: car.pk * 10 for car in instances}
+
+            def prepare_color_batch(self, instances):
+                return ["blue" for car in instances]
+
+            def prepare_rank(self, instance):
+                return self.chunk_context[instance.pk]
+
+        cars = [Car(pk=pk, name="Car %s" % pk) for pk in (1, 2, 3)]
+        doc = CarDocument2()
+        with patch.object(
+            CarDocument2, 'prepare_color_batch', autospec=True,
+            side_effect=CarDocument2.prepare_color_batch
+        ) as mock_batch:
+            actions = list(doc.get_actions(cars, 'index'))
+
+        self.assertEqual(
+            [call[0][1] for call in mock_batch.call_args_list],
+            [cars[:2], cars[2:]]
+        )
+        self.assertEqual([action['_source'] for action in actions], [
+            {'color': "blue", 'rank': 10, 'name': "Car 1"},
+            {'color': "blue", 'rank': 20, 'name': "Car 2"},
+            {'color': "blue", 'rank': 30, 'name': "Car 3"},
+        ])
+        self.assertIsNone(doc.chunk_context)
+
+    def test_prepare_methods_values_converted(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            released = fields.DateField()
+            dates = fields.DateField()
+            price = fields.FloatField()
+            ratio = fields.FloatField()
+
+            class Django:
+                model = Car
+
+            def prepare_released(self, instance):
+                return date(2010, 9, 9)
+
+            def prepare_dates_batch(self, instances):
+                return [[date(2010, 9, 9), date(2011, 9, 9)] for car in instances]
+
+            def prepare_price_with_related(self, instance, related_to_ignore):
+                return Decimal('1.5')
+
+            def prepare_ratio(self, instance):
+                return (Decimal('0.5'), None)
+
+        doc = CarDocument2()
+        expected = {
+            'released': '2010-09-09',
+            'dates': ['2010-09-09', '2011-09-09'],
+            'price': 1.5,
+            'ratio': (0.5, None),
+        }
+        self.assertEqual(doc.prepare(Car(pk=1)), expected)
+        actions = list(doc.get_actions([Car(pk=1)], 'index'))
+        self.assertEqual(actions[0]['_source'], expected)
+        self.assertIsInstance(actions[0]['_source']['price'], float)
+
+    def test_prepare_batch_fallback(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            color = fields.TextField()
+
+            class Django:
+                model = Car
+
+            def prepare_color_batch(self, instances):
+                return ["blue" for car in instances]
+
+        self.assertEqual(CarDocument2().prepare(Car()), {'color': "blue"})
+
+    def test_values_indexing_mode(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                fields = ['name', 'price']
+                indexing_mode = 'values'
+
+        self.assertEqual(
+            [(name, column) for name, column, convert in CarDocument2._values_fields],
+            [('name', 'name'), ('price', 'price')]
+        )
+
+        qs = Mock()
+        doc = CarDocument2()
+        with patch.object(CarDocument2, 'get_queryset', return_value=qs):
+            doc.get_indexing_queryset()
+        qs.values_list.assert_called_once_with('pk', 'name', 'price')
+
+        car = Car(pk=3, name="Type 42", price=50000.0)
+        actions = list(doc.get_actions([(2, "Type 57", 5400000.0), car], 'index'))
+        self.assertEqual(actions, [{
+            '_op_type': 'index',
+            '_index': CarDocument2._index._name,
+            '_id': 2,
+            '_source': {'name': "Type 57", 'price': 5400000.0},
+        }, {
+            '_op_type': 'index',
+            '_index': CarDocument2._index._name,
+            '_id': 3,
+            '_source': {'name': "Type 42", 'price': 50000.0},
+        }])
+
+    def test_values_indexing_mode_not_possible(self):
+        with self.assertRaises(ImproperlyConfigured):
+            @registry.register_document
+            class CarDocument2(DocType):
+                type = fields.TextField()
+
+                class Django:
+                    model = Car
+                    fields = ['name']
+                    indexing_mode = 'values'
+
+        @registry.register_document
+        class CarDocument3(DocType):
+            color = fields.TextField()
+
+            class Django:
+                model = Car
+                fields = ['name']
+                indexing_mode = 'auto'
+
+            def prepare_color(self, instance):
+                return "blue"
+
+        self.assertIsNone(CarDocument3._values_fields)
+
+    @override_settings(CACHES=HASH_CACHES, ELASTICSEARCH_DSL_HASH_CACHE='indexing')
+    def test_skip_unchanged(self):
+        caches['indexing'].clear()
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                fields = ['name', 'price']
+                skip_unchanged = True
+
+        def consume_actions(client, actions, **kwargs):
+            sent.append(list(actions))
+            return len(sent[-1]), []
+
+        car1 = Car(pk=1, name="Type 57", price=5400000.0)
+        car2 = Car(pk=2, name="Type 42", price=50000.0)
+        doc = CarDocument2()
+        with patch('django_elasticsearch_dsl.documents.bulk', side_effect=consume_actions):
+            sent = []
+            doc.update([car1, car2])
+            car2.price = 60000.0
+            doc.update([car1, car2])
+            doc.update([car1, car2], skip_unchanged=False)
+            doc.update(car1, action='delete')
+            doc.update([car1, car2])
+
+        self.assertEqual(
+            [[action['_id'] for action in actions] for actions in sent],
+            [[1, 2], [2], [1, 2], [1], [1]]
+        )
+
+    @override_settings(CACHES=HASH_CACHES, ELASTICSEARCH_DSL_HASH_CACHE='indexing')
+    def test_skip_unchanged_failed_actions(self):
+        caches['indexing'].clear()
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                fields = ['name']
+                skip_unchanged = True
+
+        def consume_actions(client, actions, **kwargs):
+            sent.append([action['_id'] for action in actions])
+            return 1, [{'index': {'_id': '2', 'status': 429}}]
+
+        car1 = Car(pk=1, name="Type 57")
+        car2 = Car(pk=2, name="Type 42")
+        doc = CarDocument2()
+        with patch('django_elasticsearch_dsl.documents.bulk', side_effect=consume_actions):
+            sent = []
+            doc.update([car1, car2], raise_on_error=False)
+            doc.update([car1, car2], raise_on_error=False)
+
+        self.assertEqual(sent, [[1, 2], [2]])
+
+    def test_skip_unchanged_needs_shared_cache(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                fields = ['name']
+                skip_unchanged = True
+
+        doc = CarDocument2()
+        with patch('django_elasticsearch_dsl.documents.bulk') as mock_bulk:
+            with self.assertRaises(ImproperlyConfigured):
+                doc.update([Car(pk=1, name="Type 57")])
+            doc.update([Car(pk=1, name="Type 57")], skip_unchanged=False)
+        mock_bulk.assert_called_once()
+
+    def test_get_partial_fields(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            manufacturer = fields.ObjectField(properties={
+                'name': fields.TextField(),
+            })
+            type = fields.TextField()
+            color = fields.TextField()
+
+            class Django:
+                model = Car
+                fields = ['name', 'price']
+
+            def prepare_color(self, instance):
+                return "blue"
+
+        self.assertCountEqual(
+            CarDocument2.get_partial_fields(['price']),
+            ['type', 'color', 'price']
+        )
+        self.assertCountEqual(
+            CarDocument2.get_partial_fields(['manufacturer_id']),
+            ['manufacturer', 'type', 'color']
+        )
+
+        class CarDocument3(CarDocument2):
+            def prepare(self, instance):
+                return {}
+
+        self.assertIsNone(CarDocument3.get_partial_fields(['price']))
+
+    def test_update_partial(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            manufacturer = fields.ObjectField(properties={
+                'name': fields.TextField(),
+            })
+
+            class Django:
+                model = Car
+                fields = ['name', 'price']
+
+        car = Car(pk=1, name="Type 57", price=5400000.0)
+        doc = CarDocument2()
+        with patch('django_elasticsearch_dsl.documents.bulk',
+                   return_value=(1, [])) as mock_bulk, \
+                patch.object(fields.ObjectField, 'get_value_from_instance') as mock_get:
+            doc.update(car, update_fields=['price'])
+            self.assertEqual(
+                list(mock_bulk.call_args[1]['actions']),
+                [{
+                    '_op_type': 'update',
+                    '_index': CarDocument2._index._name,
+                    '_id': 1,
+                    'doc': {'price': 5400000.0},
+                }]
+            )
+            self.assertFalse(mock_get.called)
+
+            mock_bulk.reset_mock()
+            doc.update(car, update_fields=['not_indexed'])
+            self.assertFalse(mock_bulk.called)
+
+    def test_update_partial_missing_document(self):
+        @registry.register_document
+        class CarDocument2(DocType):
+            class Django:
+                model = Car
+                fields = ['name', 'price']
+
+        car = Car(pk=1, name="Type 57", price=5400000.0)
+        doc = CarDocument2()
+        missing = {'update': {
+            '_id': '1', 'status': 404,
+            'error': {'type': 'document_missing_exception'},
+        }}
+        with patch('django_elasticsearch_dsl.documents.bulk',
+                   side_effect=[(0, [missing]), (1, [])]) as mock_bulk:
+            response = doc.update(car, update_fields=['price'])
+
+        self.assertEqual(response, (1, []))
+        self.assertEqual(mock_bulk.call_count, 2)
+        self.assertFalse(mock_bulk.call_args_list[0][1]['raise_on_error'])
+        # The whole document is indexed instead
+        self.assertEqual(list(mock_bulk.call_args[1]['actions']), [{
+            '_op_type': 'index',
+            '_index': CarDocument2._index._name,
+            '_id': 1,
+            '_source': {'name': "Type 57", 'price': 5400000.0},
+        }])
+
+        failed = {'update': {'_id': '1', 'status': 400}}
+        with patch('django_elasticsearch_dsl.documents.bulk',
+                   return_value=(0, [failed])) as mock_bulk:
+            with self.assertRaises(BulkIndexError):
+                doc.update(car, update_fields=['price'])
+            self.assertEqual(mock_bulk.call_count, 1)
+
+            response = doc.update(
+                car, update_fields=['price'], raise_on_error=False,
+                stats_only=True
+            )
+            self.assertEqual(response, (0, 1))
+
     def test_init_prepare_correct(self):
         """Does init_prepare() run and collect the right preparation functions?"""
 
@@ -408,22 +916,75 @@ class BaseDocTypeTestCase(object):
         self.assertEqual(len(d._prepared_fields), 4)
 
         expect = {
-            'color': ("<class 'django_elasticsearch_dsl.fields.TextField'>",
-                      ("<class 'method'>", "<type 'instancemethod'>")),  # py3, py2
-            'type': ("<class 'django_elasticsearch_dsl.fields.TextField'>",
-                     ("<class 'functools.partial'>", "<type 'functools.partial'>")),
-            'name': ("<class 'django_elasticsearch_dsl.fields.TextField'>",
-                     ("<class 'functools.partial'>", "<type 'functools.partial'>")),
-            'price': ("<class 'django_elasticsearch_dsl.fields.DoubleField'>",
-                      ("<class 'functools.partial'>", "<type 'functools.partial'>")),
+            'color': "<class 'django_elasticsearch_dsl.fields.TextField'>",
+            'type': "<class 'django_elasticsearch_dsl.fields.TextField'>",
+            'name': "<class 'django_elasticsearch_dsl.fields.TextField'>",
+            'price': "<class 'django_elasticsearch_dsl.fields.DoubleField'>",
         }
 
         for name, field, prep in d._prepared_fields:
-            e = expect[name]
-            self.assertEqual(str(type(field)), e[0], 'field type should be copied over')
+            self.assertEqual(str(type(field)), expect[name], 'field type should be copied over')
             self.assertTrue('__call__' in dir(prep), 'prep function should be callable')
-            self.assertTrue(str(type(prep)) in e[1],
-                            'prep function is correct partial or method')
+
+    def test_init_prepare_shared(self):
+        """Is the preparation built once per document class?"""
+        car = Car(name="Type 57")
+        with patch.object(CarDocument, '_build_field_preparers') as mock_build:
+            CarDocument().prepare(car)
+            CarDocument(related_instance_to_ignore=Car()).prepare(car)
+            mock_build.assert_not_called()
+
+    def test_prepare_unregistered_document(self):
+        class UnregisteredCarDocument(DocType):
+            name = fields.TextField()
+
+            class Django:
+                model = Car
+
+        car = Car(name="Type 57")
+        self.assertEqual(UnregisteredCarDocument().prepare(car), {'name': "Type 57"})
+
+    def test_prepare_with_overridden_init_prepare(self):
+        class CarDocument2(CarDocument):
+            def init_prepare(self):
+                fields = super(CarDocument2, self).init_prepare()
+                return [
+                    (name, field, prep_func)
+                    for name, field, prep_func in fields
+                    if name != 'color'
+                ]
+
+        car = Car(name="Type 57", price=100)
+        d = CarDocument2()
+        expected = CarDocument().prepare(car)
+        del expected['color']
+        self.assertEqual(d.prepare(car), expected)
+        self.assertEqual(
+            {name: prep_func(car) for name, field, prep_func in d._prepared_fields},
+            d.prepare(car)
+        )
+
+    def test_prepare_related_instance_to_ignore(self):
+        manufacturer = Manufacturer(name="Bugatti")
+
+        @registry.register_document
+        class CarDocument2(DocType):
+            manufacturer = fields.ObjectField(properties={
+                'name': fields.TextField(),
+            })
+
+            class Django:
+                model = Car
+
+        car = Car(name="Type 57", manufacturer=manufacturer)
+        self.assertEqual(
+            CarDocument2().prepare(car),
+            {'manufacturer': {'name': "Bugatti"}}
+        )
+        self.assertEqual(
+            CarDocument2(related_instance_to_ignore=manufacturer).prepare(car),
+            {'manufacturer': {}}
+        )
 
     def test_init_prepare_results(self):
         """Are the results from init_prepare() actually used in prepare()?"""
@@ -564,3 +1125,200 @@ class RealTimeDocTypeTestCase(BaseDocTypeTestCase, TestCase):
 
 class CeleryDocTypeTestCase(BaseDocTypeTestCase, TestCase):
     TARGET_PROCESSOR = 'django_elasticsearch_dsl.signals.CelerySignalProcessor'
+
+
+@registry.register_document
+class CarAsyncDocument(AsyncDocument):
+    class Django:
+        model = Car
+        fields = ['name', 'price']
+        queryset_pagination = 2
+
+    class Index:
+        name = 'car_async_index'
+
+
+class AsyncDocumentTestCase(TestCase):
+    def setUp(self):
+        # Creating an AsyncElasticsearch client needs aiohttp
+        patcher = patch.object(CarAsyncDocument, '_get_connection')
+        self.async_client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_aupdate(self):
+        sent = []
+
+        async def consume_actions(client, actions, **kwargs):
+            async for action_data in actions:
+                sent.append(action_data)
+            return len(sent), []
+
+        cars = [Car(pk=pk, name="Car {}".format(pk), price=10.0 * pk) for pk in (1, 2, 3)]
+        doc = CarAsyncDocument()
+        with patch('django_elasticsearch_dsl.documents.async_bulk',
+                   side_effect=consume_actions) as mock_bulk:
+            response = asyncio.run(doc.aupdate(cars, refresh=True))
+
+        self.assertEqual(response, (3, []))
+        self.assertTrue(mock_bulk.call_args[1]['refresh'])
+        self.assertEqual(sent[2], {
+            '_op_type': 'index',
+            '_index': 'car_async_index',
+            '_id': 3,
+            '_source': {'name': "Car 3", 'price': 30.0},
+        })
+
+    def test_aupdate_partial_missing_document(self):
+        sent = []
+        responses = [
+            (0, [{'update': {'_id': '1', 'status': 404}}]),
+            (1, []),
+        ]
+
+        async def consume_actions(client, actions, **kwargs):
+            async for action_data in actions:
+                sent.append(action_data)
+            return responses.pop(0)
+
+        car = Car(pk=1, name="Car 1", price=10.0)
+        doc = CarAsyncDocument()
+        with patch('django_elasticsearch_dsl.documents.async_bulk',
+                   side_effect=consume_actions):
+            response = asyncio.run(doc.aupdate(car, update_fields=['price']))
+
+        self.assertEqual(response, (1, []))
+        self.assertEqual([action_data['_op_type'] for action_data in sent],
+                         ['update', 'index'])
+        self.assertEqual(sent[1]['_source'], {'name': "Car 1", 'price': 10.0})
+
+    def test_apopulate(self):
+        async def objects():
+            for pk in (1, 2, 3):
+                yield Car(pk=pk, name="Car {}".format(pk), price=1.0)
+
+        async def streaming_bulk(client, actions, **kwargs):
+            async for action_data in actions:
+                yield action_data['_id'] != 2, {'index': {'_id': action_data['_id']}}
+
+        errors = []
+        doc = CarAsyncDocument()
+        with patch.object(CarAsyncDocument, 'aget_indexing_queryset', return_value=objects()), \
+                patch('django_elasticsearch_dsl.documents.async_streaming_bulk',
+                      side_effect=streaming_bulk) as mock_bulk:
+            response = asyncio.run(doc.apopulate(error_callback=errors.append))
+
+        self.assertEqual(response, (2, []))
+        self.assertEqual(errors, [{'index': {'_id': 2}}])
+        self.assertEqual(mock_bulk.call_args[1]['chunk_size'], 2)
+
+    @override_settings(CACHES=HASH_CACHES, ELASTICSEARCH_DSL_HASH_CACHE='indexing')
+    def test_aupdate_skip_unchanged(self):
+        caches['indexing'].clear()
+        sent = []
+
+        def consume_actions(client, actions, **kwargs):
+            sent.append([action_data['_id'] for action_data in actions])
+            return len(sent[-1]), []
+
+        async def aconsume_actions(client, actions, **kwargs):
+            sent.append([action_data['_id'] async for action_data in actions])
+            return len(sent[-1]), []
+
+        car = Car(pk=1, name="Car 1", price=1.0)
+        doc = CarAsyncDocument()
+        with patch.object(CarAsyncDocument.django, 'skip_unchanged', True), \
+                patch('django_elasticsearch_dsl.documents.bulk',
+                      side_effect=consume_actions), \
+                patch('django_elasticsearch_dsl.documents.async_bulk',
+                      side_effect=aconsume_actions):
+            doc.update(car)
+            car.price = 2.0
+            asyncio.run(doc.aupdate(car))
+            asyncio.run(doc.aupdate(car))
+            car.price = 1.0
+            doc.update(car)
+
+        self.assertEqual(sent, [[1], [1], [], [1]])
+
+    @override_settings(CACHES=HASH_CACHES, ELASTICSEARCH_DSL_HASH_CACHE='indexing')
+    def test_apopulate_stores_hashes(self):
+        caches['indexing'].clear()
+        async def objects():
+            for pk in (1, 2):
+                yield Car(pk=pk, name="Car {}".format(pk), price=1.0)
+
+        async def streaming_bulk(client, actions, **kwargs):
+            async for action_data in actions:
+                yield action_data['_id'] != 2, {'index': {'_id': action_data['_id']}}
+
+        sent = []
+
+        def consume_actions(client, actions, **kwargs):
+            sent.append([action_data['_id'] for action_data in actions])
+            return len(sent[-1]), []
+
+        doc = CarAsyncDocument()
+        with patch.object(CarAsyncDocument.django, 'skip_unchanged', True), \
+                patch.object(CarAsyncDocument, 'aget_indexing_queryset',
+                             return_value=objects()), \
+                patch('django_elasticsearch_dsl.documents.async_streaming_bulk',
+                      side_effect=streaming_bulk), \
+                patch('django_elasticsearch_dsl.documents.bulk',
+                      side_effect=consume_actions):
+            asyncio.run(doc.apopulate(raise_on_error=False))
+            doc.update([Car(pk=pk, name="Car {}".format(pk), price=1.0)
+                        for pk in (1, 2)])
+
+        self.assertEqual(sent, [[2]])
+
+    def _aiterate(self, objects):
+        async def consume():
+            return [object_instance async for object_instance in objects]
+        return asyncio.run(consume())
+
+    def test_aget_indexing_queryset_prefetch_before_django_5(self):
+        cars = [Car(pk=pk) for pk in (1, 2, 3)]
+
+        async def aiterator(chunk_size):
+            for car in cars:
+                yield car
+
+        qs = Mock(_prefetch_related_lookups=('ad_set',))
+        qs.prefetch_related.return_value.aiterator.side_effect = aiterator
+        doc = CarAsyncDocument()
+        with patch.object(CarAsyncDocument, '_get_indexing_base_queryset',
+                          return_value=qs), \
+                patch('django_elasticsearch_dsl.documents.DJANGO_VERSION', (4, 2)), \
+                patch('django_elasticsearch_dsl.documents.prefetch_related_objects') \
+                as mock_prefetch:
+            self.assertEqual(self._aiterate(doc.aget_indexing_queryset()), cars)
+
+        qs.prefetch_related.assert_called_once_with(None)
+        self.assertEqual(mock_prefetch.call_args_list, [
+            ((cars[:2], 'ad_set'),), ((cars[2:], 'ad_set'),),
+        ])
+
+    def test_aget_indexing_queryset_keyset_pagination(self):
+        cars = [Car(pk=pk) for pk in (1, 2, 3)]
+        doc = CarAsyncDocument()
+        with patch.object(CarAsyncDocument.django, 'keyset_pagination', True), \
+                patch.object(CarAsyncDocument, 'get_indexing_chunks',
+                             return_value=iter([(2, cars[:2]), (3, cars[2:])])) \
+                as mock_chunks:
+            self.assertEqual(
+                self._aiterate(doc.aget_indexing_queryset(pk_range=(1, None))), cars
+            )
+        mock_chunks.assert_called_once_with(pk_range=(1, None))
+
+    def test_update_uses_sync_connection(self):
+        doc = CarAsyncDocument()
+        with patch('django_elasticsearch_dsl.documents.bulk') as mock_bulk:
+            doc.update(Car(pk=1, name="Car 1", price=1.0))
+        self.assertIs(
+            mock_bulk.call_args[1]['client'], connections.get_connection()
+        )
+
+    def test_search(self):
+        s = CarAsyncDocument.search()
+        self.assertIsInstance(s, AsyncSearch)
+        self.assertIs(s._model, Car)
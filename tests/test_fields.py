@@ -1,4 +1,7 @@
+from datetime import date, datetime, time
+from decimal import Decimal
 from unittest import TestCase
+from uuid import UUID
 
 import django
 from django.db.models.fields.files import FieldFile
@@ -6,7 +9,8 @@ if django.VERSION < (4, 0):
     from django.utils.translation import ugettext_lazy as _
 else:
     from django.utils.translation import gettext_lazy as _
-from mock import Mock, NonCallableMock
+from elasticsearch.dsl import InnerDoc
+from mock import Mock, NonCallableMock, patch
 from six import string_types
 
 from django_elasticsearch_dsl.exceptions import VariableLookupError
@@ -15,7 +19,8 @@ from django_elasticsearch_dsl.fields import (BooleanField, ByteField, Completion
                                              GeoPointField,
                                              GeoShapeField, IntegerField, IpField, KeywordField,
                                              ListField, LongField,
-                                             NestedField, ObjectField, ScaledFloatField, ShortField, TextField
+                                             NestedField, ObjectField, ScaledFloatField, ShortField, TextField,
+                                             TimeField
                                              )
 from tests import ES_MAJOR_VERSION
 
@@ -72,6 +77,38 @@ class DEDFieldTestCase(TestCase):
         )
         self.assertEqual(field.get_value_from_instance(instance), "foo")
 
+    def test_get_value_from_instance_caches_accessor(self):
+        class Dummy(object):
+            def __init__(self, attr1):
+                self.attr1 = attr1
+
+        field = DEDField(attr='attr1')
+        self.assertEqual(field.get_value_from_instance(Dummy("foo")), "foo")
+        self.assertIn((Dummy, 'attr1'), field._accessors)
+        self.assertEqual(field.get_value_from_instance(Dummy("bar")), "bar")
+
+    def test_get_value_from_instance_accessor_fallback(self):
+        class Dummy(object):
+            pass
+
+        field = DEDField(attr='attr1', required=True)
+        instance = Dummy()
+        instance.attr1 = "foo"
+        self.assertEqual(field.get_value_from_instance(instance), "foo")
+        self.assertRaises(
+            VariableLookupError, field.get_value_from_instance, Dummy()
+        )
+
+    def test_get_value_from_dict_and_list(self):
+        field = DEDField(attr='items.1')
+        self.assertEqual(
+            field.get_value_from_instance({'items': ["foo", "bar"]}), "bar"
+        )
+        self.assertEqual(
+            field.get_value_from_instance({'items': ["baz", "qux"]}), "qux"
+        )
+        self.assertIsNone(field.get_value_from_instance({'other': []}))
+
 
 class ObjectFieldTestCase(TestCase):
     def test_get_mapping(self):
@@ -226,6 +263,36 @@ class ObjectFieldTestCase(TestCase):
             }
         ])
 
+    def test_get_value_from_iterable_with_inner_doc_prepare(self):
+        class PersonInnerDoc(InnerDoc):
+            first_name = TextField()
+            full_name = TextField()
+
+            def prepare_full_name(self, instance):
+                return "{} {}".format(instance.first_name, instance.last_name)
+
+        field = ObjectField(attr='person', doc_class=PersonInnerDoc)
+        instance = NonCallableMock(
+            person=[
+                NonCallableMock(first_name="foo1", last_name="bar1"),
+                NonCallableMock(first_name="foo2", last_name="bar2"),
+            ]
+        )
+
+        with patch.object(
+            PersonInnerDoc, '__init__', autospec=True,
+            side_effect=InnerDoc.__init__
+        ) as mock_init:
+            self.assertEqual(field.get_value_from_instance(instance), [
+                {'first_name': "foo1", 'full_name': "foo1 bar1"},
+                {'first_name': "foo2", 'full_name': "foo2 bar2"},
+            ])
+            self.assertEqual(
+                field.get_value_from_instance(instance)[1]['full_name'],
+                "foo2 bar2"
+            )
+        self.assertEqual(mock_init.call_count, 1)
+
     def test_get_value_from_iterable_without_properties(self):
         field = ObjectField(attr='person')
 
@@ -286,6 +353,46 @@ class DateFieldTestCase(TestCase):
         }, field.to_dict())
 
 
+    def test_json_converter(self):
+        field = DateField()
+        self.assertEqual(
+            field.json_converter(datetime(2010, 9, 9, 12, 30)),
+            '2010-09-09T12:30:00'
+        )
+        self.assertEqual(field.json_converter(date(2010, 9, 9)), '2010-09-09')
+
+    def test_get_json_converter(self):
+        convert = DateField().get_json_converter()
+        self.assertEqual(convert(date(2010, 9, 9)), '2010-09-09')
+        self.assertEqual(
+            convert([date(2010, 9, 9), None]), ['2010-09-09', None]
+        )
+        self.assertEqual(convert((date(2010, 9, 9),)), ('2010-09-09',))
+        self.assertIsNone(BooleanField().get_json_converter())
+
+    def test_list_field_values_converted(self):
+        field = ListField(DateField(attr='dates'))
+        instance = NonCallableMock(dates=[date(2010, 9, 9)])
+        convert = field.get_json_converter()
+        self.assertEqual(
+            convert(field.get_value_from_instance(instance)), ['2010-09-09']
+        )
+
+    def test_inner_doc_prepare_converted(self):
+        class PersonInnerDoc(InnerDoc):
+            birth_date = DateField()
+
+            def prepare_birth_date(self, instance):
+                return instance.born
+
+        field = ObjectField(attr='person', doc_class=PersonInnerDoc)
+        instance = NonCallableMock(person=NonCallableMock(born=date(2010, 9, 9)))
+        self.assertEqual(
+            field.get_value_from_instance(instance),
+            {'birth_date': '2010-09-09'}
+        )
+
+
 class CompletionFieldTestCase(TestCase):
     def test_get_mapping(self):
         field = CompletionField()
@@ -330,6 +437,15 @@ class LongFieldTestCase(TestCase):
             'type': 'long',
         }, field.to_dict())
 
+    def test_json_converter(self):
+        field = LongField()
+        self.assertEqual(field.json_converter(Decimal('3')), 3)
+        self.assertIsInstance(field.json_converter(Decimal('3')), int)
+        self.assertIsNone(field.json_converter(None))
+        self.assertEqual(
+            field.get_json_converter()([Decimal('1'), 2]), [1, 2]
+        )
+
 
 class DoubleFieldTestCase(TestCase):
     def test_get_mapping(self):
@@ -340,6 +456,13 @@ class DoubleFieldTestCase(TestCase):
         }, field.to_dict())
 
 
+    def test_json_converter(self):
+        field = DoubleField()
+        self.assertEqual(field.json_converter(Decimal('1.5')), 1.5)
+        self.assertIsInstance(field.json_converter(Decimal('1.5')), float)
+        self.assertIsNone(field.json_converter(None))
+
+
 class FloatFieldTestCase(TestCase):
     def test_get_mapping(self):
         field = FloatField()
@@ -420,6 +543,23 @@ class FileFieldTestCase(TestCase):
         self.assertEqual(field.get_value_from_instance(instance), 'bar')
 
 
+    def test_get_values_converter(self):
+        model_field = Mock()
+        model_field.storage.url.return_value = '/media/myfile.pdf'
+        convert = FileField(attr='file').get_values_converter(model_field)
+
+        self.assertEqual(convert('myfile.pdf'), '/media/myfile.pdf')
+        model_field.storage.url.assert_called_once_with('myfile.pdf')
+        self.assertEqual(convert(''), '')
+
+
+class TimeFieldTestCase(TestCase):
+    def test_get_values_converter(self):
+        convert = TimeField(attr='time').get_values_converter(Mock())
+        self.assertEqual(convert(time(12, 30)), '12:30:00')
+        self.assertIsNone(convert(None))
+
+
 class TextFieldTestCase(TestCase):
     def test_get_mapping(self):
         field = TextField()
@@ -430,6 +570,12 @@ class TextFieldTestCase(TestCase):
             'type': expected_type,
         }, field.to_dict())
 
+    def test_json_converter(self):
+        field = TextField()
+        self.assertEqual(field.json_converter(_("text")), "text")
+        self.assertIsInstance(field.json_converter(_("text")), str)
+        self.assertEqual(field.json_converter("text"), "text")
+
 
 class KeywordFieldTestCase(TestCase):
     def test_get_mapping(self):
@@ -444,3 +590,10 @@ class KeywordFieldTestCase(TestCase):
             self.assertEqual({
                 'type': 'keyword',
             }, field.to_dict())
+
+    def test_json_converter(self):
+        field = KeywordField()
+        value = UUID('12345678-1234-5678-1234-567812345678')
+        self.assertEqual(field.json_converter(value), str(value))
+        self.assertEqual(field.json_converter(_("keyword")), "keyword")
+        self.assertIsInstance(field.json_converter(_("keyword")), str)
@@ -1,12 +1,13 @@
-from mock import Mock
+from mock import Mock, patch
 from unittest import TestCase
 
 from django.conf import settings
 
-from django_elasticsearch_dsl import Index
+from django_elasticsearch_dsl import Document, Index, fields
 from django_elasticsearch_dsl.registries import DocumentRegistry
 
 from .fixtures import WithFixturesMixin
+from .models import Car, Category
 
 
 class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
@@ -65,6 +66,30 @@ class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
         ModelC = Mock()
         self.assertFalse(self.registry.get_indices([ModelC]))
 
+    def test_register_index_with_same_name(self):
+        index = Index(name='index_1')
+        doc_d1 = self._generate_doc_mock(self.ModelD, index)
+
+        self.assertEqual(len(self.registry._indices), 2)
+        self.assertIn(doc_d1, self.registry._indices[self.index_1])
+        self.assertEqual(self.registry.get_indices([self.ModelD]),
+                         set([self.index_1]))
+
+    def test_get_related_doc(self):
+        doc_d1 = self._generate_doc_mock(
+            self.ModelD, self.index_1,
+            _related_models=[self.ModelE, self.ModelB]
+        )
+        doc_d2 = self._generate_doc_mock(
+            self.ModelD, self.index_1, _related_models=[self.ModelE]
+        )
+
+        self.assertEqual(self.registry._get_related_doc(self.ModelE()),
+                         (doc_d1, doc_d2))
+        self.assertEqual(self.registry._get_related_doc(self.ModelB()),
+                         (doc_d1,))
+        self.assertEqual(self.registry._get_related_doc(self.ModelA()), ())
+
     def test_update_instance(self):
         doc_a3 = self._generate_doc_mock(
             self.ModelA, self.index_1, _ignore_signals=True
@@ -78,6 +103,17 @@ class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
         self.doc_a1.update.assert_called_once_with(instance)
         self.doc_a2.update.assert_called_once_with(instance)
 
+    def test_update_instance_update_fields(self):
+        self.doc_a2.django.partial_updates = True
+
+        instance = self.ModelA()
+        self.registry.update(instance, update_fields=frozenset(['name']))
+
+        self.doc_a1.update.assert_called_once_with(instance)
+        self.doc_a2.update.assert_called_once_with(
+            instance, update_fields=frozenset(['name'])
+        )
+
     def test_update_related_instances(self):
         doc_d1 = self._generate_doc_mock(
             self.ModelD, self.index_1,
@@ -144,3 +180,66 @@ class DocumentRegistryTestCase(WithFixturesMixin, TestCase):
         self.assertFalse(self.doc_a1.update.called)
 
         settings.ELASTICSEARCH_DSL_AUTOSYNC = True
+
+
+class DocumentRegistryM2MTestCase(TestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+
+        @self.registry.register_document
+        class CarCategoriesDocument(Document):
+            categories = fields.NestedField(properties={
+                'title': fields.TextField(),
+            })
+
+            class Django:
+                model = Car
+                fields = ['name']
+
+            class Index:
+                name = 'test_m2m_car_categories'
+
+        @self.registry.register_document
+        class CarNameDocument(Document):
+            class Django:
+                model = Car
+                fields = ['name']
+
+            class Index:
+                name = 'test_m2m_car_names'
+
+        @self.registry.register_document
+        class CategoryDocument(Document):
+            class Django:
+                model = Category
+                fields = ['title']
+
+            class Index:
+                name = 'test_m2m_categories'
+
+        self.car_doc = CarCategoriesDocument
+        self.through = Car.categories.through
+
+    def test_get_m2m_changes(self):
+        car = Car(pk=1)
+        changes = list(self.registry.get_m2m_changes(
+            car, Category, {2, 3}, False, self.through
+        ))
+        self.assertEqual(changes, [(self.car_doc, [car])])
+
+    def test_get_m2m_changes_reverse(self):
+        category = Category(pk=2)
+        changes = list(self.registry.get_m2m_changes(
+            category, Car, {1, 4}, True, self.through
+        ))
+        self.assertEqual(len(changes), 1)
+        doc, objects = changes[0]
+        self.assertEqual(doc, self.car_doc)
+        self.assertEqual(objects.model, Car)
+        self.assertEqual(sorted(objects.query.where.children[0].rhs), [1, 4])
+
+    def test_update_m2m(self):
+        car = Car(pk=1)
+        with patch.object(self.car_doc, 'update') as update:
+            self.registry.update_m2m(car, Category, {2}, False, self.through)
+        update.assert_called_once_with([car])
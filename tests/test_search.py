@@ -0,0 +1,396 @@
+import asyncio
+import datetime
+import time
+from contextlib import asynccontextmanager, contextmanager
+from unittest import TestCase
+
+from django.db.models.query import ModelIterable
+from elasticsearch.dsl import AsyncSearch as DSLAsyncSearch
+from elasticsearch.dsl import AttrDict
+from elasticsearch.dsl import Search as DSLSearch
+from elasticsearch.dsl.response import Response
+from mock import Mock, patch
+
+from django_elasticsearch_dsl import Document, fields
+from django_elasticsearch_dsl.cache import LocalCache, local_search_cache
+from django_elasticsearch_dsl.documents import DocType
+from django_elasticsearch_dsl.exceptions import ReadOnlyInstanceError
+from django_elasticsearch_dsl.registries import DocumentRegistry
+from django_elasticsearch_dsl.search import AsyncSearch, Search
+from django_elasticsearch_dsl.signals import post_index
+
+from .documents import ManufacturerDocument
+from .models import Ad, Car
+
+
+class AsyncSearchTestCase(TestCase):
+    def _hits(self, *pks):
+        return [AttrDict({'meta': {'id': pk}}) for pk in pks]
+
+    def test_clone_keeps_model(self):
+        s = AsyncSearch(model=Car).filter('term', name='Type 57')
+        self.assertIs(s._model, Car)
+
+    def test_ato_queryset(self):
+        async def execute(s):
+            self.assertEqual(s.to_dict()['_source'], {'excludes': ['*']})
+            return self._hits(3, 1)
+
+        with patch.object(AsyncSearch, 'execute', autospec=True, side_effect=execute):
+            qs = asyncio.run(AsyncSearch(model=Car).ato_queryset())
+
+        self.assertEqual(qs.model, Car)
+        sql = str(qs.query)
+        self.assertIn('IN (3, 1)', sql)
+        self.assertIn('ORDER BY CASE', sql)
+
+    def test_afilter_queryset_wrong_model(self):
+        with self.assertRaises(TypeError):
+            asyncio.run(AsyncSearch(model=Car).afilter_queryset(Ad.objects.all()))
+
+    def test_filter_queryset_wrong_model(self):
+        with self.assertRaises(TypeError):
+            Search(model=Car).filter_queryset(Ad.objects.all())
+
+
+class SearchOrderingTestCase(TestCase):
+    def _search(self, *pks):
+        s = Search(model=Car)
+        s._response = [AttrDict({'meta': {'id': str(pk)}}) for pk in pks]
+        return s
+
+    def test_order_by_case(self):
+        qs = self._search(3, 1).to_queryset(keep_order='case')
+        sql = str(qs.query)
+        self.assertIn('IN (3, 1)', sql)
+        self.assertIn('ORDER BY CASE', sql)
+
+    def test_order_by_array_position(self):
+        qs = self._search(3, 1).to_queryset(keep_order='array_position')
+        self.assertIn('ORDER BY array_position([3, 1]::', str(qs.query))
+
+    def test_order_by_field(self):
+        qs = self._search(3, 1).to_queryset(keep_order='field')
+        self.assertIn('ORDER BY FIELD(', str(qs.query))
+
+    def test_order_in_python(self):
+        qs = self._search(3, 1, 2).to_queryset(keep_order='python')
+        self.assertNotIn('ORDER BY', str(qs.query))
+
+        rows = [Car(pk=1), Car(pk=2), Car(pk=3)]
+        with patch.object(ModelIterable, '__iter__', lambda self: iter(rows)):
+            self.assertEqual([car.pk for car in qs], [3, 1, 2])
+
+    def test_order_in_python_sliced(self):
+        qs = self._search(3, 1, 2).to_queryset(keep_order='python')
+        with self.assertRaises(TypeError):
+            list(qs[:2])
+        with self.assertRaises(TypeError):
+            list(qs[1:])
+
+    def test_get_ordering_strategy(self):
+        s = Search(model=Car)
+        qs = Car.objects.all()
+        self.assertEqual(s.get_ordering_strategy(qs, [1, 2]), 'case')
+        self.assertEqual(s.get_ordering_strategy(qs, list(range(1000))), 'case')
+
+        with patch('django_elasticsearch_dsl.search.connections') as connections:
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            self.assertEqual(s.get_ordering_strategy(qs, [1, 2]), 'array_position')
+            connections.__getitem__.return_value.vendor = 'mysql'
+            self.assertEqual(s.get_ordering_strategy(qs, [1, 2]), 'field')
+
+
+class SearchToInstancesTestCase(TestCase):
+    def _search(self, s, *sources):
+        s._response = [
+            AttrDict(dict(source, meta={'id': str(pk)})) for pk, source in sources
+        ]
+        return s
+
+    def test_to_instances(self):
+        s = self._search(
+            Search(model=Car),
+            (3, {'name': 'Type 57', 'launched': '1934-06-01'}),
+            (1, {'name': '2CV', 'launched': '1948-10-07', 'type': 'br'}),
+        )
+        cars = s.to_instances()
+
+        self.assertEqual([car.pk for car in cars], [3, 1])
+        self.assertEqual(cars[0].name, 'Type 57')
+        self.assertEqual(cars[0].launched, datetime.date(1934, 6, 1))
+        self.assertEqual(cars[0].type, 'se')
+        self.assertEqual(cars[1].type, 'br')
+        self.assertIsNone(cars[1].manufacturer_id)
+        self.assertFalse(cars[0]._state.adding)
+
+    def test_to_instances_fallback_to_db(self):
+        s = self._search(Search(model=Car), (3, {'name': 'Type 57'}))
+        car = s.to_instances(fallback_to_db=True)[0]
+        self.assertEqual(car.name, 'Type 57')
+        self.assertEqual(
+            car.get_deferred_fields(), {'launched', 'type', 'manufacturer_id'}
+        )
+
+    def test_to_instances_file_field(self):
+        s = self._search(
+            ManufacturerDocument.search(),
+            (2, {'name': 'Renault', 'logo': '/media/logos/a.png'}),
+        )
+        manufacturer = s.to_instances()[0]
+        self.assertEqual(manufacturer.name, 'Renault')
+        # The url indexed is not the name of the file
+        self.assertFalse(manufacturer.logo)
+
+        manufacturer = s.to_instances(fallback_to_db=True)[0]
+        self.assertIn('logo', manufacturer.get_deferred_fields())
+
+    def test_to_instances_read_only(self):
+        s = self._search(Search(model=Car), (3, {'name': 'Type 57'}))
+        car = s.to_instances()[0]
+        with self.assertRaises(ReadOnlyInstanceError):
+            car.save()
+        with self.assertRaises(ReadOnlyInstanceError):
+            car.delete()
+
+    def test_to_instances_document_fields(self):
+        registry = DocumentRegistry()
+
+        @registry.register_document
+        class CarDocument(Document):
+            model_name = fields.TextField(attr='name')
+            type = fields.TextField()
+
+            class Django:
+                model = Car
+                fields = ['launched']
+
+            class Index:
+                name = 'test_to_instances_cars'
+
+            def prepare_type(self, instance):
+                return instance.get_type_display()
+
+        s = self._search(
+            CarDocument.search(),
+            (3, {'model_name': 'Type 57', 'type': 'Break', 'launched': '1934-06-01'}),
+        )
+        car = s.to_instances()[0]
+        self.assertEqual(car.name, 'Type 57')
+        self.assertEqual(car.type, 'se')
+        self.assertEqual(car.launched, datetime.date(1934, 6, 1))
+
+    def test_ato_instances(self):
+        async def execute(s):
+            return [AttrDict({'meta': {'id': '3'}, 'name': 'Type 57'})]
+
+        with patch.object(AsyncSearch, 'execute', autospec=True, side_effect=execute):
+            cars = asyncio.run(AsyncSearch(model=Car).ato_instances())
+
+        self.assertEqual([(car.pk, car.name) for car in cars], [(3, 'Type 57')])
+
+
+class SearchIterateInstancesTestCase(TestCase):
+    def setUp(self):
+        self.pages = [['3', '1'], ['4', '2'], ['5']]
+        self.searches = []
+
+        def rows(iterable):
+            pks = iterable.queryset.query.where.children[0].rhs
+            return iter([Car(pk=pk) for pk in sorted(pks)])
+
+        patcher = patch.object(ModelIterable, '__iter__', rows)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _page(self, s):
+        self.searches.append(s.to_dict())
+        return [AttrDict({'meta': {'id': pk}}) for pk in self.pages.pop(0)]
+
+    def test_iterate_instances(self):
+        @contextmanager
+        def point_in_time(s, keep_alive):
+            self.assertEqual(keep_alive, '1m')
+            yield s
+
+        with patch.object(Search, 'point_in_time', point_in_time), \
+                patch.object(Search, 'execute', autospec=True, side_effect=self._page), \
+                patch.object(Search, 'search_after', autospec=True, side_effect=lambda s: s):
+            cars = Search(model=Car).iterate_instances(chunk_size=2)
+            self.assertEqual([car.pk for car in cars], [3, 1, 4, 2, 5])
+
+        self.assertEqual(len(self.searches), 3)
+        self.assertEqual(self.searches[0]['size'], 2)
+        self.assertEqual(self.searches[0]['_source'], {'excludes': ['*']})
+
+    def test_iterate_instances_wrong_model(self):
+        with self.assertRaises(TypeError):
+            next(Search(model=Car).iterate_instances(queryset=Ad.objects.all()))
+
+    def test_aiterate_instances(self):
+        @asynccontextmanager
+        async def point_in_time(s, keep_alive):
+            yield s
+
+        async def execute(s):
+            return self._page(s)
+
+        async def collect():
+            return [
+                car.pk async for car in
+                AsyncSearch(model=Car).aiterate_instances(chunk_size=2)
+            ]
+
+        with patch.object(AsyncSearch, 'point_in_time', point_in_time), \
+                patch.object(AsyncSearch, 'execute', autospec=True, side_effect=execute), \
+                patch.object(AsyncSearch, 'search_after', autospec=True,
+                             side_effect=lambda s: s):
+            self.assertEqual(asyncio.run(collect()), [3, 1, 4, 2, 5])
+
+
+class SearchCacheTestCase(TestCase):
+    def setUp(self):
+        self.body = {'hits': {'total': {'value': 1}, 'hits': [
+            {'_index': 'test_search_cache', '_id': '3', '_source': {'name': 'Type 57'}}
+        ]}}
+
+        def execute(s, ignore_cache=False):
+            s._response = Response(s, self.body)
+            return s._response
+
+        patcher = patch.object(DSLSearch, 'execute', autospec=True, side_effect=execute)
+        self.execute = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(local_search_cache.clear)
+
+    def _search(self):
+        return Search(index='test_search_cache', model=Car).query(
+            'match', name='Type 57'
+        )
+
+    def test_cached_response(self):
+        response = self._search().cache().execute()
+        cached = self._search().cache(timeout=30).execute()
+
+        self.assertEqual(self.execute.call_count, 1)
+        self.assertEqual(cached.to_dict(), response.to_dict())
+        self.assertEqual([hit.meta.id for hit in cached], ['3'])
+
+    def test_search_not_cached(self):
+        self._search().execute()
+        self._search().cache().execute()
+        self._search().filter('term', type='se').cache().execute()
+        self.assertEqual(self.execute.call_count, 3)
+
+    def test_cache_invalidated_on_post_index(self):
+        self._search().cache().execute()
+        doc = Mock()
+        doc._index._name = 'test_search_cache'
+        post_index.send(sender=DocType, instance=doc, actions=[], response=(1, []))
+        self._search().cache().execute()
+        self.assertEqual(self.execute.call_count, 2)
+
+    def test_cache_after_post_index_refresh(self):
+        doc = Mock()
+        doc._index._name = 'test_search_cache'
+        post_index.send(sender=DocType, instance=doc, actions=[],
+                        response=(1, []), refresh=True)
+        self._search().cache().execute()
+        self._search().cache().execute()
+        self.assertEqual(self.execute.call_count, 1)
+
+    def test_not_cached_before_refresh(self):
+        doc = Mock()
+        doc._index._name = 'test_search_cache'
+        post_index.send(sender=DocType, instance=doc, actions=[],
+                        response=(1, []), refresh=None)
+        # The indexed documents are searchable after the next refresh
+        self._search().cache().execute()
+        self._search().cache().execute()
+        self.assertEqual(self.execute.call_count, 2)
+
+        with patch('django_elasticsearch_dsl.cache.time.time',
+                   return_value=time.time() + 2):
+            self._search().cache().execute()
+            self._search().cache().execute()
+        self.assertEqual(self.execute.call_count, 3)
+
+    def _post_index(self, index_name):
+        doc = Mock()
+        doc._index._name = index_name
+        post_index.send(sender=DocType, instance=doc, actions=[],
+                        response=(1, []), refresh=True)
+
+    def test_registered_index_invalidation(self):
+        index = Mock()
+        index._name = 'test_search_cache'
+        with patch('django_elasticsearch_dsl.search.registry.get_indices',
+                   return_value={index}):
+            self._search().cache().execute()
+            self._post_index('other_index')
+            self._search().cache().execute()
+            self.assertEqual(self.execute.call_count, 1)
+            self._post_index('test_search_cache')
+            self._search().cache().execute()
+        self.assertEqual(self.execute.call_count, 2)
+
+    def test_wildcard_and_alias_invalidated_by_any_index(self):
+        for index in ('test_search_*', 'test_search_alias', None):
+            self.execute.reset_mock()
+            Search(index=index, model=Car).cache().execute()
+            self._post_index('other_index')
+            Search(index=index, model=Car).cache().execute()
+            self.assertEqual(self.execute.call_count, 2)
+
+    def test_page_search_not_cached(self):
+        s = self._search().cache()._get_page_search(10)
+        self.assertFalse(s._cache_enabled)
+        self.assertFalse(s.extra(size=10)._cache_enabled)
+
+    def test_async_cached_response(self):
+        async def execute(s, ignore_cache=False):
+            s._response = Response(s, self.body)
+            return s._response
+
+        async def search():
+            s = AsyncSearch(index='test_search_cache', model=Car).cache()
+            return await s.execute()
+
+        with patch.object(DSLAsyncSearch, 'execute', autospec=True,
+                          side_effect=execute) as async_execute:
+            asyncio.run(search())
+            response = asyncio.run(search())
+
+        self.assertEqual(async_execute.call_count, 1)
+        self.assertEqual([hit.meta.id for hit in response], ['3'])
+
+    def test_async_cache_api(self):
+        class AsyncOnlyCache(LocalCache):
+            def get(self, key, default=None):
+                raise AssertionError("blocking call")
+
+            get_many = set = get
+
+            async def aget(self, key, default=None):
+                return LocalCache.get(self, key, default)
+
+            async def aget_many(self, keys):
+                return LocalCache.get_many(self, keys)
+
+            async def aset(self, key, value, timeout=None):
+                LocalCache.set_many(self, {key: value}, timeout)
+
+        async def execute(s, ignore_cache=False):
+            s._response = Response(s, self.body)
+            return s._response
+
+        async def search():
+            s = AsyncSearch(index='test_search_cache', model=Car).cache()
+            return await s.execute()
+
+        with patch('django_elasticsearch_dsl.search.get_search_cache',
+                   return_value=AsyncOnlyCache()), \
+                patch.object(DSLAsyncSearch, 'execute', autospec=True,
+                             side_effect=execute) as async_execute:
+            asyncio.run(search())
+        self.assertEqual(async_execute.call_count, 1)
@@ -0,0 +1,52 @@
+from decimal import Decimal
+from unittest import TestCase
+
+import django
+from django.test import override_settings
+if django.VERSION < (4, 0):
+    from django.utils.translation import ugettext_lazy as _
+else:
+    from django.utils.translation import gettext_lazy as _
+
+from django_elasticsearch_dsl.apps import DEDConfig
+from django_elasticsearch_dsl.serializers import DjangoJsonSerializer
+
+
+class DjangoJsonSerializerTestCase(TestCase):
+    def test_dumps(self):
+        serializer = DjangoJsonSerializer()
+        self.assertEqual(
+            serializer.dumps({'title': _("foo"), 'price': Decimal('1.5')}),
+            b'{"title":"foo","price":1.5}'
+        )
+
+
+class ConnectionsSettingsTestCase(TestCase):
+    @override_settings(ELASTICSEARCH_DSL={
+        'default': {'hosts': 'localhost:9200'},
+        'other': {'hosts': 'localhost:9201', 'serializers': {}},
+    })
+    def test_default_serializer(self):
+        self.assertEqual(DEDConfig.connections_settings(), {
+            'default': {'hosts': 'localhost:9200'},
+            'other': {'hosts': 'localhost:9201', 'serializers': {}},
+        })
+
+    @override_settings(
+        ELASTICSEARCH_DSL={
+            'default': {'hosts': 'localhost:9200'},
+            'other': {'hosts': 'localhost:9201', 'serializers': {}},
+        },
+        ELASTICSEARCH_DSL_SERIALIZER=(
+            'django_elasticsearch_dsl.serializers.DjangoJsonSerializer'
+        )
+    )
+    def test_serializer_setting(self):
+        connections_settings = DEDConfig.connections_settings()
+        self.assertIsInstance(
+            connections_settings['default']['serializer'], DjangoJsonSerializer
+        )
+        self.assertEqual(
+            connections_settings['other'],
+            {'hosts': 'localhost:9201', 'serializers': {}}
+        )
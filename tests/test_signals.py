@@ -1,12 +1,24 @@
+import gc
+import threading
+from datetime import date
 from unittest import TestCase
 
-from mock import Mock, patch
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.test import override_settings
+from elasticsearch.dsl.connections import connections
+from mock import Mock, call, patch
 
+from django_elasticsearch_dsl import fields
 from django_elasticsearch_dsl.documents import DocType
-from django_elasticsearch_dsl.registries import registry
-from django_elasticsearch_dsl.signals import post_index
+from django_elasticsearch_dsl.registries import DocumentRegistry, registry
+from django_elasticsearch_dsl.signals import (
+    BatchedCelerySignalProcessor, BatchingSignalProcessor,
+    CelerySignalProcessor, RealTimeSignalProcessor, TransactionSignalProcessor, post_index
+)
 
-from .models import Car
+from .models import Car, Category, Manufacturer
 
 
 class PostIndexSignalTestCase(TestCase):
@@ -41,5 +53,543 @@ class PostIndexSignalTestCase(TestCase):
             sender=CarDocument,
             instance=doc,
             actions=get_actions(),
-            response=(1, [])
+            response=(1, []),
+            refresh=True
         )
+
+    @patch('django_elasticsearch_dsl.documents.DocType._get_actions')
+    @patch('django_elasticsearch_dsl.documents.parallel_bulk')
+    def test_post_index_signal_sent_parallel(self, parallel_bulk, get_actions):
+
+        @registry.register_document
+        class CarDocument(DocType):
+            class Django:
+                fields = ['name']
+                model = Car
+
+        parallel_bulk.return_value = iter([(True, {'index': {'_id': 51}})])
+
+        mock_receiver = Mock()
+        post_index.connect(mock_receiver)
+        self.addCleanup(post_index.disconnect, mock_receiver)
+
+        doc = CarDocument()
+        doc.update(Car(pk=51, name="Type 57"), parallel=True)
+
+        mock_receiver.assert_called_once_with(
+            signal=post_index,
+            sender=CarDocument,
+            instance=doc,
+            actions=get_actions(),
+            response=(1, []),
+            refresh=True
+        )
+
+
+class RealTimeSignalProcessorTestCase(TestCase):
+    def test_connect_registered_models(self):
+        registry = DocumentRegistry()
+        with patch('django_elasticsearch_dsl.signals.registry', registry):
+            processor = RealTimeSignalProcessor(connections)
+            self.addCleanup(processor.teardown)
+            self.assertEqual(processor._senders, set())
+
+            @registry.register_document
+            class ManufacturerDocument(DocType):
+                class Django:
+                    model = Manufacturer
+                    fields = ['name']
+
+                class Index:
+                    name = 'test_realtime_manufacturers'
+
+            self.assertEqual(processor._senders, {Manufacturer})
+
+            @registry.register_document
+            class CarDocument(DocType):
+                class Django:
+                    model = Car
+                    fields = ['name']
+                    related_models = [Manufacturer, Category]
+
+                class Index:
+                    name = 'test_realtime_cars'
+
+            self.assertEqual(
+                processor._senders,
+                {Manufacturer, Car, Category, Car.categories.through}
+            )
+
+        processor.teardown()
+        self.assertEqual(processor._senders, set())
+
+
+def _delete_manufacturers():
+    with override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False):
+        Manufacturer.objects.filter(pk__in=[1, 2]).delete()
+
+
+def _create_manufacturers(test_case):
+    Manufacturer.objects.bulk_create([
+        Manufacturer(pk=pk, name=name, country_code='FR', created=date(2010, 9, 9))
+        for pk, name in ((1, "Bugatti"), (2, "Renault"))
+    ])
+    test_case.addCleanup(_delete_manufacturers)
+
+
+class TransactionSignalProcessorTestCase(TestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+        patcher = patch('django_elasticsearch_dsl.signals.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @self.registry.register_document
+        class ManufacturerDocument(DocType):
+            class Django:
+                model = Manufacturer
+                fields = ['name']
+
+            class Index:
+                name = 'test_transaction_manufacturers'
+
+        self.doc = ManufacturerDocument
+        self.doc.update = Mock()
+        self.processor = TransactionSignalProcessor(connections)
+        # Call the handlers directly rather than through the model signals
+        self.processor.teardown()
+
+    def _indexed_pks(self, call):
+        return sorted(obj.pk for obj in call[0][0])
+
+    def test_changes_sent_on_commit(self):
+        manufacturer1 = Manufacturer(pk=1, name="Bugatti")
+        manufacturer2 = Manufacturer(pk=2, name="Renault")
+        with transaction.atomic():
+            self.processor.handle_save(Manufacturer, manufacturer1)
+            self.processor.handle_save(Manufacturer, manufacturer2)
+            self.processor.handle_save(Manufacturer, manufacturer1)
+            self.assertFalse(self.doc.update.called)
+
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [1, 2])
+
+    def test_savepoint_rollback(self):
+        manufacturer1 = Manufacturer(pk=1, name="Bugatti")
+        manufacturer2 = Manufacturer(pk=2, name="Renault")
+        manufacturer3 = Manufacturer(pk=3, name="Peugeot")
+        with transaction.atomic():
+            with transaction.atomic():
+                self.processor.handle_save(Manufacturer, manufacturer1)
+            try:
+                with transaction.atomic():
+                    self.processor.handle_save(Manufacturer, manufacturer2)
+                    raise ValueError
+            except ValueError:
+                pass
+            self.processor.handle_delete(Manufacturer, manufacturer3)
+
+        self.assertEqual(self.doc.update.call_count, 2)
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args_list[0]), [1])
+        self.doc.update.assert_called_with(
+            [manufacturer3], action='delete', raise_on_error=False
+        )
+
+    def test_objects_out_of_queryset_indexed(self):
+        _create_manufacturers(self)
+        self.doc.get_queryset = Mock(
+            return_value=Manufacturer.objects.filter(name="Bugatti")
+        )
+        bugatti = Manufacturer(pk=1, name="Bugatti")
+        renault = Manufacturer(pk=2, name="Renault")
+        with transaction.atomic():
+            self.processor.handle_save(Manufacturer, bugatti)
+            self.processor.handle_save(Manufacturer, renault)
+
+        objects = self.doc.update.call_args[0][0]
+        self.assertEqual([obj.pk for obj in objects], [1, 2])
+        # Read from the database, and indexed from the saved instance
+        self.assertIsNot(objects[0], bugatti)
+        self.assertIs(objects[1], renault)
+
+    def test_sibling_savepoints(self):
+        with transaction.atomic():
+            with transaction.atomic():
+                self.processor.handle_save(Manufacturer, Manufacturer(pk=1))
+            with transaction.atomic():
+                self.processor.handle_save(Manufacturer, Manufacturer(pk=2))
+
+        self.assertEqual(self.doc.update.call_count, 2)
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args_list[0]), [1])
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args_list[1]), [2])
+
+    def test_savepoint_rollback_keeps_previous_change(self):
+        manufacturer = Manufacturer(pk=1, name="Bugatti")
+        with transaction.atomic():
+            self.processor.handle_save(Manufacturer, manufacturer)
+            try:
+                with transaction.atomic():
+                    self.processor.handle_delete(Manufacturer, manufacturer)
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [1])
+
+    def test_transaction_rollback(self):
+        try:
+            with transaction.atomic():
+                self.processor.handle_save(Manufacturer, Manufacturer(pk=1))
+                raise ValueError
+        except ValueError:
+            pass
+
+        with transaction.atomic():
+            self.processor.handle_save(Manufacturer, Manufacturer(pk=2))
+
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [2])
+
+    def test_rolled_back_changes_forgotten(self):
+        for pk in (1, 2):
+            try:
+                with transaction.atomic():
+                    with transaction.atomic():
+                        self.processor.handle_save(Manufacturer, Manufacturer(pk=pk))
+                    self.processor.handle_save(Manufacturer, Manufacturer(pk=pk))
+                    raise ValueError
+            except ValueError:
+                pass
+
+        gc.collect()
+        pending = self.processor._local.pending['default']
+        self.assertEqual(pending.committed, [])
+        # The last dead reference is pruned by the next change
+        self.assertEqual([ref() for ref in pending.uncovered], [None])
+
+        with transaction.atomic():
+            self.processor.handle_save(Manufacturer, Manufacturer(pk=3))
+
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [3])
+        self.assertEqual(pending.committed, [])
+
+    def test_autocommit(self):
+        manufacturer = Manufacturer(pk=1, name="Bugatti")
+        self.processor.handle_save(Manufacturer, manufacturer)
+        self.doc.update.assert_called_once_with(manufacturer)
+
+
+class BatchingSignalProcessorTestCase(TestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+        patcher = patch('django_elasticsearch_dsl.signals.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @self.registry.register_document
+        class ManufacturerDocument(DocType):
+            class Django:
+                model = Manufacturer
+                fields = ['name']
+
+            class Index:
+                name = 'test_batching_manufacturers'
+
+        self.doc = ManufacturerDocument
+        self.doc.update = Mock()
+
+    def get_processor(self, **settings):
+        settings = dict({
+            'ELASTICSEARCH_DSL_BATCH_SIZE': 500,
+            'ELASTICSEARCH_DSL_BATCH_INTERVAL': 60,
+            'ELASTICSEARCH_DSL_BATCH_QUEUE_SIZE': 100,
+        }, **settings)
+        with override_settings(**settings):
+            processor = BatchingSignalProcessor(connections)
+        # Call the handlers directly rather than through the model signals
+        super(BatchingSignalProcessor, processor).teardown()
+        self.addCleanup(processor.stop)
+        return processor
+
+    def _indexed_pks(self, call):
+        return sorted(obj.pk for obj in call[0][0])
+
+    def test_changes_coalesced(self):
+        processor = self.get_processor()
+        manufacturer1 = Manufacturer(pk=1, name="Bugatti")
+        manufacturer2 = Manufacturer(pk=2, name="Renault")
+        manufacturer3 = Manufacturer(pk=3, name="Peugeot")
+        processor.handle_save(Manufacturer, manufacturer1)
+        processor.handle_save(Manufacturer, manufacturer2)
+        processor.handle_save(Manufacturer, manufacturer1)
+        processor.handle_delete(Manufacturer, manufacturer3)
+        self.assertFalse(self.doc.update.called)
+
+        processor.flush()
+        self.assertEqual(self.doc.update.call_count, 2)
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args_list[0]), [1, 2])
+        self.doc.update.assert_called_with(
+            [manufacturer3], action='delete', raise_on_error=False
+        )
+
+    def test_flush_on_batch_size(self):
+        sent = threading.Event()
+        self.doc.update.side_effect = lambda *args, **kwargs: sent.set()
+        processor = self.get_processor(ELASTICSEARCH_DSL_BATCH_SIZE=2)
+        processor.handle_save(Manufacturer, Manufacturer(pk=1))
+        processor.handle_save(Manufacturer, Manufacturer(pk=2))
+
+        self.assertTrue(sent.wait(5))
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [1, 2])
+
+    def test_flush_on_interval(self):
+        sent = threading.Event()
+        self.doc.update.side_effect = lambda *args, **kwargs: sent.set()
+        processor = self.get_processor(ELASTICSEARCH_DSL_BATCH_INTERVAL=0.01)
+        processor.handle_save(Manufacturer, Manufacturer(pk=1))
+
+        self.assertTrue(sent.wait(5))
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [1])
+
+    def test_stop_sends_queued_changes(self):
+        processor = self.get_processor()
+        processor.handle_save(Manufacturer, Manufacturer(pk=1))
+        processor.stop()
+
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [1])
+
+    @patch.object(BatchingSignalProcessor, '_start')
+    def test_queue_full_sync(self, start):
+        processor = self.get_processor(
+            ELASTICSEARCH_DSL_BATCH_QUEUE_SIZE=1,
+            ELASTICSEARCH_DSL_BATCH_QUEUE_FULL='sync',
+        )
+        processor.handle_save(Manufacturer, Manufacturer(pk=1))
+        self.assertFalse(self.doc.update.called)
+        processor.handle_save(Manufacturer, Manufacturer(pk=2))
+
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [2])
+
+    def test_queue_full_spill(self):
+        processor = self.get_processor(
+            ELASTICSEARCH_DSL_BATCH_QUEUE_SIZE=1,
+            ELASTICSEARCH_DSL_BATCH_QUEUE_FULL='spill',
+        )
+        with patch.object(processor, '_start'):
+            processor.handle_save(Manufacturer, Manufacturer(pk=1))
+            processor.handle_save(Manufacturer, Manufacturer(pk=2))
+            processor.handle_save(Manufacturer, Manufacturer(pk=2))
+        self.assertEqual(len(processor._spilled), 1)
+        self.assertFalse(self.doc.update.called)
+
+        processor._start()
+        processor.flush()
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [1, 2])
+
+    def test_queue_full_spill_bounded(self):
+        processor = self.get_processor(
+            ELASTICSEARCH_DSL_BATCH_QUEUE_SIZE=1,
+            ELASTICSEARCH_DSL_BATCH_QUEUE_FULL='spill',
+        )
+        with patch.object(processor, '_start'):
+            processor.handle_save(Manufacturer, Manufacturer(pk=1))
+            processor.handle_save(Manufacturer, Manufacturer(pk=2))
+            processor.handle_save(Manufacturer, Manufacturer(pk=3))
+            processor.handle_save(Manufacturer, Manufacturer(pk=2))
+        self.assertEqual(len(processor._spilled), 1)
+        self.doc.update.assert_called_once()
+        self.assertEqual(self._indexed_pks(self.doc.update.call_args), [3])
+
+    def test_queue_full_block_from_background_thread(self):
+        processor = self.get_processor(
+            ELASTICSEARCH_DSL_BATCH_QUEUE_SIZE=1,
+            ELASTICSEARCH_DSL_BATCH_QUEUE_FULL='block',
+        )
+        done = threading.Event()
+        sent = []
+
+        def update(objects, **kwargs):
+            sent.append(sorted(obj.pk for obj in objects))
+            if len(sent) == 1:
+                # Like a post_index receiver saving models
+                processor.handle_save(Manufacturer, Manufacturer(pk=2))
+                processor.handle_save(Manufacturer, Manufacturer(pk=3))
+                done.set()
+
+        self.doc.update.side_effect = update
+        processor.handle_save(Manufacturer, Manufacturer(pk=1))
+        processor.flush()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(sent, [[1], [3]])
+        processor.flush()
+        self.assertEqual(sent, [[1], [3], [2]])
+
+    def test_invalid_queue_full_policy(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_processor(ELASTICSEARCH_DSL_BATCH_QUEUE_FULL='drop')
+
+
+class M2MSignalProcessorTestCase(TestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+        patcher = patch('django_elasticsearch_dsl.signals.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @self.registry.register_document
+        class CategoryCarsDocument(DocType):
+            car_set = fields.NestedField(properties={
+                'name': fields.TextField(),
+            })
+
+            class Django:
+                model = Category
+                fields = ['title']
+
+            class Index:
+                name = 'test_m2m_signal_categories'
+
+        self.doc = CategoryCarsDocument
+        self.doc.update = Mock()
+        self.through = Car.categories.through
+
+        Category.objects.bulk_create([Category(pk=1, title="Sport", slug="sport")])
+        Car.objects.bulk_create([Car(pk=1, name="Megane", launched=date(2010, 9, 9))])
+        self.addCleanup(self._delete_rows)
+        self.car = Car.objects.get(pk=1)
+        with override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False):
+            self.car.categories.add(1)
+
+    def _delete_rows(self):
+        with override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False):
+            Car.objects.filter(pk=1).delete()
+            Category.objects.filter(pk=1).delete()
+
+    def test_post_remove_indexes_the_reverse_side(self):
+        processor = RealTimeSignalProcessor(connections)
+        processor.teardown()
+        with override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False):
+            self.car.categories.remove(1)
+
+        processor.handle_m2m_changed(
+            self.through, self.car, 'post_remove', model=Category,
+            pk_set={1}, reverse=False, using='default'
+        )
+
+        self.doc.update.assert_called_once()
+        categories = list(self.doc.update.call_args[0][0])
+        self.assertEqual([category.pk for category in categories], [1])
+        self.assertEqual(self.doc().prepare(categories[0])['car_set'], [])
+
+    @patch.object(CelerySignalProcessor, 'registry_update_m2m_task')
+    def test_celery_sends_the_pk_set(self, task):
+        processor = CelerySignalProcessor(connections)
+        processor.teardown()
+
+        processor.handle_m2m_changed(
+            self.through, self.car, 'post_remove', model=Category,
+            pk_set={1}, reverse=False, using='default'
+        )
+
+        task.delay.assert_called_once_with(
+            1, 'tests', 'Car', [1], 'tests', 'Category', False,
+            'tests', self.through.__name__
+        )
+
+    def test_celery_task_updates_the_m2m_changes(self):
+        with override_settings(ELASTICSEARCH_DSL_AUTOSYNC=False):
+            self.car.categories.remove(1)
+
+        CelerySignalProcessor.registry_update_m2m_task(
+            1, 'tests', 'Car', [1], 'tests', 'Category', False,
+            'tests', self.through.__name__
+        )
+
+        self.doc.update.assert_called_once()
+        categories = list(self.doc.update.call_args[0][0])
+        self.assertEqual([category.pk for category in categories], [1])
+
+
+class BatchedCelerySignalProcessorTestCase(TestCase):
+    def setUp(self):
+        self.registry = DocumentRegistry()
+        patcher = patch('django_elasticsearch_dsl.signals.registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        @self.registry.register_document
+        class ManufacturerDocument(DocType):
+            class Django:
+                model = Manufacturer
+                fields = ['name']
+
+            class Index:
+                name = 'test_batched_celery_manufacturers'
+
+        self.doc = ManufacturerDocument
+        self.doc.update = Mock()
+        self.processor = BatchedCelerySignalProcessor(connections)
+        # Call the handlers directly rather than through the model signals
+        self.processor.teardown()
+
+    @patch.object(BatchedCelerySignalProcessor, 'registry_update_batch_task')
+    def test_autocommit_save(self, task):
+        self.processor.handle_save(Manufacturer, Manufacturer(pk=1))
+        task.delay.assert_called_once_with([1], 'tests', 'Manufacturer')
+
+    @patch.object(BatchedCelerySignalProcessor, 'registry_update_batch_task')
+    def test_transaction_saves(self, task):
+        manufacturer1 = Manufacturer(pk=1, name="Bugatti")
+        manufacturer2 = Manufacturer(pk=2, name="Renault")
+        manufacturer3 = Manufacturer(pk=3, name="Peugeot")
+        with transaction.atomic():
+            self.processor.handle_save(Manufacturer, manufacturer1)
+            self.processor.handle_save(Manufacturer, manufacturer2)
+            self.processor.handle_save(Manufacturer, manufacturer1)
+            self.processor.handle_delete(Manufacturer, manufacturer3)
+            self.assertFalse(task.delay.called)
+
+        task.delay.assert_called_once()
+        pks, app_label, model_name = task.delay.call_args[0]
+        self.assertEqual(sorted(pks), [1, 2])
+        self.assertEqual((app_label, model_name), ('tests', 'Manufacturer'))
+        self.doc.update.assert_called_once_with(
+            [manufacturer3], action='delete', raise_on_error=False
+        )
+
+    @override_settings(ELASTICSEARCH_DSL_CELERY_LOCK_CACHE='default')
+    def test_queued_objects_deduplicated(self):
+        self.addCleanup(caches['default'].clear)
+        with patch.object(
+            BatchedCelerySignalProcessor, 'registry_update_batch_task'
+        ) as task:
+            self.processor.handle_save(Manufacturer, Manufacturer(pk=1))
+            self.processor.handle_save(Manufacturer, Manufacturer(pk=1))
+            self.processor.queue_updates({Manufacturer: {1, 2}})
+        self.assertEqual(task.delay.call_args_list, [
+            call([1], 'tests', 'Manufacturer'),
+            call([2], 'tests', 'Manufacturer'),
+        ])
+
+        BatchedCelerySignalProcessor.registry_update_batch_task(
+            [1, 2], 'tests', 'Manufacturer'
+        )
+        self.assertEqual(caches['default'].get_many([
+            'ded:queued:tests.Manufacturer:1', 'ded:queued:tests.Manufacturer:2'
+        ]), {})
+
+    def test_update_batch_task(self):
+        _create_manufacturers(self)
+        BatchedCelerySignalProcessor.registry_update_batch_task(
+            [1, 2], 'tests', 'Manufacturer'
+        )
+
+        self.doc.update.assert_called_once()
+        objects = self.doc.update.call_args[0][0]
+        self.assertEqual(sorted(obj.pk for obj in objects), [1, 2])